@@ -0,0 +1,435 @@
+import time
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Union, Any, Callable
+from datetime import datetime
+from IndicatorCache import IndicatorCache
+from MarketDataManager import timeframe_to_ms
+from PortfolioLedger import PortfolioLedger
+from StrategyCompiler import compiler, strategy_namespace
+
+DAY_MS = 24 * 60 * 60 * 1000
+COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+
+class Abandoned(Exception):
+    """Бэктест прерван: просадка превысила abandon_drawdown_pct"""
+
+
+class BacktestEngine:
+    """
+    Однопроходный событийный движок бэктестинга стратегий.
+
+    Каждая серия (exchange, symbol, timeframe) загружается один раз, код
+    стратегии компилируется один раз, затем свечи всех серий обходятся одним
+    проходом в порядке времени.
+
+    Поддерживаются три вида стратегий:
+      - векторная с функцией vector_signals(df, market): вызывается один раз на
+        серию и возвращает колонки сигналов на весь DataFrame (см. target_position);
+        сделки получаются из изменений целевой позиции средствами NumPy;
+      - с обработчиком on_bar(bar): код стратегии выполняется один раз как
+        инициализация, затем on_bar вызывается для каждой свечи периода;
+      - обычный скрипт (без on_bar): скомпилированный код выполняется раз в
+        день на срезах уже загруженных данных (последние strategy.limit свечей).
+
+    Свеча доступна стратегии только после своего закрытия (timestamp +
+    длительность таймфрейма): свечи всех серий обходятся в порядке времени
+    закрытия, при равном времени сначала меньший таймфрейм. Сигналы add_signal
+    получают время закрытия текущей свечи; если цена не указана, используется
+    последняя цена закрытия уже закрытых свечей. Сделки учитываются в
+    PortfolioLedger с комиссией и проскальзыванием, кривая капитала строится
+    на каждом закрытии свечи по уже известным ценам закрытия.
+    """
+
+    def __init__(self, strategy, series: Dict[str, np.ndarray], params: Optional[Dict] = None,
+                 initial_balance: float = 10000.0, fee_pct: float = 0.0, slippage_pct: float = 0.0,
+                 abandon_drawdown_pct: Optional[float] = None):
+        """
+        Args:
+            strategy: Стратегия (Strategy)
+            series: Серии свечей {"<exchange>_<symbol>_<timeframe>": массив (n, 6)}
+            params: Параметры стратегии с учетом переопределений
+            initial_balance: Начальный баланс
+            fee_pct: Комиссия в процентах от объема сделки
+            slippage_pct: Проскальзывание в процентах от цены
+            abandon_drawdown_pct: Прервать бэктест, если просадка превысит этот процент
+        """
+        self.strategy = strategy
+        self.params = params if params is not None else {**strategy.parameters}
+        self.initial_balance = initial_balance
+        self.fee_pct = fee_pct
+        self.slippage_pct = slippage_pct
+        self.abandon_drawdown_pct = abandon_drawdown_pct
+        self.series = {}
+        self.meta = {}
+        self.tf_ms = {}
+        self.close_ts = {}
+        for exchange in strategy.exchanges:
+            for symbol in strategy.symbols:
+                for timeframe in strategy.timeframes:
+                    key = f"{exchange}_{symbol}_{timeframe}"
+                    if key in series:
+                        self.series[key] = np.asarray(series[key], dtype=float).reshape(-1, 6)
+                        self.meta[key] = (exchange, symbol, timeframe)
+                        self.tf_ms[key] = timeframe_to_ms(timeframe)
+                        # Время закрытия свечи: с этого момента ее close известен
+                        self.close_ts[key] = self.series[key][:, 0] + self.tf_ms[key]
+        self.compiled = compiler.compile(strategy.code, strategy.name)
+        self.code = self.compiled.code
+        self.indicators = IndicatorCache()
+        self.logs = []
+        self.stats = {}
+
+    @staticmethod
+    def target_position(result, n: int, size: float = 1.0) -> np.ndarray:
+        """
+        Переводит результат vector_signals в целевую позицию на каждой свече
+
+        Args:
+            result: Колонка float (целевой размер позиции) либо словарь
+                {"entries": bool, "exits": bool, "size": float (необязательно)}
+            n: Количество свечей
+            size: Размер позиции по умолчанию для entries/exits
+
+        Returns:
+            Массив целевой позиции длиной n
+        """
+        if isinstance(result, dict):
+            entries = np.asarray(result.get("entries", np.zeros(n)), dtype=bool)
+            exits = np.asarray(result.get("exits", np.zeros(n)), dtype=bool)
+            state = np.full(n, np.nan)
+            state[exits] = 0.0
+            state[entries] = 1.0
+            # Протягиваем последнее состояние вперед без цикла
+            idx = np.where(np.isnan(state), 0, np.arange(n))
+            np.maximum.accumulate(idx, out=idx)
+            position = np.nan_to_num(state[idx])
+            return position * np.nan_to_num(np.asarray(result.get("size", size), dtype=float))
+        return np.nan_to_num(np.asarray(result, dtype=float)).reshape(n)
+
+    @staticmethod
+    def load_series(mdm, strategy, start_ts: int, end_ts: int) -> Dict[str, np.ndarray]:
+        """
+        Загружает все серии стратегии один раз, вместе с strategy.limit свечами
+        прогрева перед start_ts
+
+        Returns:
+            {"<exchange>_<symbol>_<timeframe>": массив (n, 6)}
+        """
+        series = {}
+        for exchange in strategy.exchanges:
+            for symbol in strategy.symbols:
+                for timeframe in strategy.timeframes:
+                    warmup_ts = start_ts - strategy.limit * timeframe_to_ms(timeframe)
+                    try:
+                        mdm.download_ohlcv(exchange, symbol, timeframe, warmup_ts, end_ts)
+                    except Exception as e:
+                        print(f"Ошибка при загрузке OHLCV для {symbol} с биржи {exchange}: {str(e)}")
+                    rows = [row for chunk in mdm.iter_ohlcv(exchange, symbol, timeframe, warmup_ts, end_ts) for row in chunk]
+                    series[f"{exchange}_{symbol}_{timeframe}"] = np.asarray(rows, dtype=float).reshape(-1, 6)
+        return series
+
+    def _frames(self) -> Dict[str, pd.DataFrame]:
+        frames = {}
+        for key, array in self.series.items():
+            df = pd.DataFrame(array, columns=COLUMNS)
+            df['timestamp'] = df['timestamp'].astype('int64')
+            df['datetime'] = pd.to_datetime(df['timestamp'], unit='ms')
+            frames[key] = df
+        return frames
+
+    def _namespace(self, data: Dict, signals: List) -> Dict:
+        """Глобальные переменные, доступные коду стратегии"""
+        indicators = self.indicators
+
+        def indicator(exchange, symbol, timeframe, name, **params):
+            key = f"{exchange}_{symbol}_{timeframe}"
+            return indicators.get((exchange, symbol, timeframe), 0, data[key], name, params)
+
+        return strategy_namespace(f"strategy_{self.strategy.id}", self.params, data, signals, self.logs, indicator)
+
+    def run(self, start_ts: int, end_ts: int) -> Dict:
+        """
+        Выполняет бэктест на периоде [start_ts, end_ts]
+
+        Returns:
+            {"portfolio": Dict, "logs": List[str], "stats": Dict}
+        """
+        started = time.perf_counter()
+        self.ledger = PortfolioLedger(self.initial_balance, self.fee_pct, self.slippage_pct)
+        self.last_price = {}
+        self._peak = self.initial_balance
+        self._last_ts = start_ts
+        abandoned = False
+        bars = 0
+        try:
+            if self.compiled.mode == "vector":
+                bars = self._run_vector(start_ts, end_ts)
+            elif self.compiled.mode == "callbacks":
+                bars = self._run_callbacks(start_ts, end_ts)
+            else:
+                bars = self._run_script(start_ts, end_ts)
+        except Abandoned:
+            abandoned = True
+        # Кривая капитала до последней обработанной свечи
+        timestamps, closes = self._bar_closes(start_ts, self._last_ts if abandoned else end_ts)
+        self.ledger.finalize(timestamps, self.ledger.equity_curve(timestamps, closes))
+        self.stats = {
+            "bars": bars,
+            "abandoned": abandoned,
+            "series": len(self.series),
+            "fees": self.ledger.fees_paid,
+            "run_seconds": time.perf_counter() - started,
+            "compile_seconds": self.compiled.compile_seconds
+        }
+        return {"portfolio": self.ledger.portfolio, "logs": self.logs, "stats": self.stats}
+
+    def _closed(self, key: str, timestamp) -> Union[int, np.ndarray]:
+        """Количество свечей серии, закрытых к моменту timestamp"""
+        return np.searchsorted(self.close_ts[key], timestamp, "right")
+
+    def _bar_closes(self, start_ts: int, end_ts: int):
+        """
+        Время закрытия всех свечей периода и цены закрытия каждой пары на эти моменты
+
+        Цена пары берется из серии с наименьшим таймфреймом и протягивается
+        вперед до закрытия следующей свечи этой серии.
+        """
+        finest = {}
+        for key, (exchange, symbol, timeframe) in self.meta.items():
+            pair = (exchange, symbol)
+            if pair not in finest or self.tf_ms[key] < self.tf_ms[finest[pair]]:
+                finest[pair] = key
+        parts = []
+        for close_ts in self.close_ts.values():
+            parts.append(close_ts[np.searchsorted(close_ts, start_ts, "left"):np.searchsorted(close_ts, end_ts, "right")])
+        timestamps = np.unique(np.concatenate(parts)) if parts else np.array([], dtype=float)
+        closes = {}
+        for pair, key in finest.items():
+            array = self.series[key]
+            idx = self._closed(key, timestamps) - 1
+            closes[pair] = np.where(idx >= 0, array[np.maximum(idx, 0), 4], np.nan) if len(array) else np.full(len(timestamps), np.nan)
+        return timestamps, closes
+
+    def _merged_order(self, start_ts: int, end_ts: int):
+        """
+        Порядок обхода свечей всех серий по времени закрытия (при равном времени
+        сначала меньший таймфрейм): массивы (время закрытия, номер серии, индекс свечи)
+        """
+        keys = list(self.series.keys())
+        ts_parts, tf_parts, key_parts, idx_parts = [], [], [], []
+        for k, key in enumerate(keys):
+            close_ts = self.close_ts[key]
+            lo = np.searchsorted(close_ts, start_ts, "left")
+            hi = np.searchsorted(close_ts, end_ts, "right")
+            ts_parts.append(close_ts[lo:hi])
+            tf_parts.append(np.full(hi - lo, self.tf_ms[key]))
+            key_parts.append(np.full(hi - lo, k))
+            idx_parts.append(np.arange(lo, hi))
+        if not keys:
+            return keys, np.array([]), np.array([], dtype=int), np.array([], dtype=int)
+        ts = np.concatenate(ts_parts)
+        key_idx = np.concatenate(key_parts)
+        bar_idx = np.concatenate(idx_parts)
+        order = np.lexsort((key_idx, np.concatenate(tf_parts), ts))
+        return keys, ts[order], key_idx[order], bar_idx[order]
+
+    def _apply_signals(self, signals: List, timestamp: int):
+        filled = False
+        for signal in signals:
+            if signal["timestamp"] is None:
+                signal["timestamp"] = timestamp / 1000
+            if signal["price"] is None:
+                signal["price"] = self.last_price.get((signal["exchange"], signal["symbol"]), 0)
+            filled = self.ledger.execute(signal, timestamp) or filled
+        signals.clear()
+        if filled:
+            self._mark(timestamp)
+
+    def _mark(self, timestamp: int):
+        """Проверяет просадку по последним ценам загруженных свечей"""
+        self._last_ts = timestamp
+        if self.abandon_drawdown_pct is None:
+            return
+        value = self.ledger.equity(self.last_price)
+        self._peak = max(self._peak, value)
+        if value < self._peak * (1 - self.abandon_drawdown_pct / 100):
+            raise Abandoned()
+
+    def _run_callbacks(self, start_ts: int, end_ts: int) -> int:
+        signals = []
+        data = self._frames()
+        namespace = self._namespace(data, signals)
+        exec(self.code, namespace)
+        on_bar = namespace["on_bar"]
+        signals.clear()
+
+        keys, order_ts, order_key, order_idx = self._merged_order(start_ts, end_ts)
+        mark_ts = start_ts
+        for ts, k, i in zip(order_ts.tolist(), order_key.tolist(), order_idx.tolist()):
+            while ts > mark_ts:
+                self._mark(mark_ts)
+                mark_ts += DAY_MS
+            key = keys[k]
+            exchange, symbol, timeframe = self.meta[key]
+            row = self.series[key][i]
+            self.last_price[(exchange, symbol)] = row[4]
+            on_bar({
+                "key": key,
+                "exchange": exchange,
+                "symbol": symbol,
+                "timeframe": timeframe,
+                "index": i,
+                "timestamp": int(row[0]),
+                "open": row[1],
+                "high": row[2],
+                "low": row[3],
+                "close": row[4],
+                "volume": row[5]
+            })
+            if signals:
+                self._apply_signals(signals, int(ts))
+        while mark_ts <= end_ts:
+            self._mark(mark_ts)
+            mark_ts += DAY_MS
+        return len(order_ts)
+
+    def _update_prices(self, timestamp: int):
+        """Обновляет последние цены всех серий по свечам, закрытым к моменту timestamp"""
+        for key, array in self.series.items():
+            hi = int(self._closed(key, timestamp))
+            if hi > 0:
+                exchange, symbol, _ = self.meta[key]
+                self.last_price[(exchange, symbol)] = array[hi - 1, 4]
+
+    def _run_vector(self, start_ts: int, end_ts: int) -> int:
+        signals = []
+        data = self._frames()
+        namespace = self._namespace(data, signals)
+        exec(self.code, namespace)
+        vector_signals = namespace["vector_signals"]
+        size = float(self.params.get("position_size", 1.0))
+
+        keys = list(self.series.keys())
+        ts_parts, key_parts, idx_parts, delta_parts = [], [], [], []
+        bars = 0
+        for k, key in enumerate(keys):
+            exchange, symbol, timeframe = self.meta[key]
+            array = self.series[key]
+            n = len(array)
+            target = self.target_position(
+                vector_signals(data[key], {"exchange": exchange, "symbol": symbol, "timeframe": timeframe}), n, size)
+            close_ts = self.close_ts[key]
+            lo = int(np.searchsorted(close_ts, start_ts, "left"))
+            hi = int(np.searchsorted(close_ts, end_ts, "right"))
+            bars += hi - lo
+            # Позиция не переносится из периода прогрева; сигнал свечи исполняется
+            # по ее цене закрытия в момент закрытия
+            delta = np.diff(target[lo:hi], prepend=0.0)
+            nz = np.flatnonzero(delta)
+            ts_parts.append(close_ts[lo + nz])
+            key_parts.append(np.full(len(nz), k))
+            idx_parts.append(lo + nz)
+            delta_parts.append(delta[nz])
+
+        if keys:
+            ts = np.concatenate(ts_parts)
+            order = np.lexsort((np.concatenate(key_parts), ts))
+            events = zip(ts[order].tolist(), np.concatenate(key_parts)[order].tolist(),
+                         np.concatenate(idx_parts)[order].tolist(), np.concatenate(delta_parts)[order].tolist())
+        else:
+            events = []
+
+        mark_ts = start_ts
+        for ts, k, i, delta in events:
+            while ts > mark_ts:
+                self._update_prices(mark_ts)
+                self._mark(mark_ts)
+                mark_ts += DAY_MS
+            key = keys[k]
+            exchange, symbol, timeframe = self.meta[key]
+            price = self.series[key][i, 4]
+            self.last_price[(exchange, symbol)] = price
+            signals.append({
+                "exchange": exchange,
+                "symbol": symbol,
+                "side": "buy" if delta > 0 else "sell",
+                "price": price,
+                "amount": abs(delta),
+                "reason": "vector",
+                "timeframe": timeframe,
+                "timestamp": None
+            })
+            self._apply_signals(signals, int(ts))
+        while mark_ts <= end_ts:
+            self._update_prices(mark_ts)
+            self._mark(mark_ts)
+            mark_ts += DAY_MS
+        return bars
+
+    def _run_script(self, start_ts: int, end_ts: int) -> int:
+        frames = self._frames()
+        limit = self.strategy.limit
+        steps = 0
+        current_ts = start_ts
+        while current_ts <= end_ts:
+            # Срезы уже загруженных данных вместо повторной загрузки: только
+            # свечи, закрытые к current_ts
+            data = {}
+            for key, df in frames.items():
+                hi = int(self._closed(key, current_ts))
+                data[key] = df.iloc[max(0, hi - limit):hi]
+                if hi > 0:
+                    exchange, symbol, _ = self.meta[key]
+                    self.last_price[(exchange, symbol)] = self.series[key][hi - 1, 4]
+            signals = []
+            try:
+                exec(self.code, self._namespace(data, signals))
+            except Exception as e:
+                self.logs.append(f"Ошибка при выполнении стратегии: {str(e)}")
+            self._apply_signals(signals, current_ts)
+            self._mark(current_ts)
+            steps += 1
+            current_ts += DAY_MS
+        return steps
+
+
+def main():
+    # Синтетический бенчмарк: год часовых свечей по нескольким символам
+    from StrategyManager import Strategy
+    symbols = ["BTCUSDT", "ETHUSDT", "SOLUSDT", "XRPUSDT", "DOGEUSDT"]
+    strategy = Strategy("benchmark")
+    strategy.set_markets(["binance"], symbols, ["1h"])
+    strategy.set_code("""
+position = {}
+def on_bar(bar):
+    key = bar["key"]
+    close = data[key]["close"].to_numpy()
+    i = bar["index"]
+    if i < 50:
+        return
+    fast = close[i - 10:i + 1].mean()
+    slow = close[i - 50:i + 1].mean()
+    held = position.get(key, 0)
+    if fast > slow and not held:
+        add_signal(bar["exchange"], bar["symbol"], "buy", None, 1)
+        position[key] = 1
+    elif fast < slow and held:
+        add_signal(bar["exchange"], bar["symbol"], "sell", None, 1)
+        position[key] = 0
+""")
+    start_ts = int(datetime(2024, 1, 1).timestamp() * 1000)
+    end_ts = start_ts + 365 * DAY_MS
+    rng = np.random.default_rng(0)
+    series = {}
+    for symbol in symbols:
+        ts = np.arange(start_ts - 100 * 3600000, end_ts + 1, 3600000)
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(ts))))
+        series[f"binance_{symbol}_1h"] = np.column_stack([ts, close, close, close, close, np.ones(len(ts))])
+    engine = BacktestEngine(strategy, series)
+    result = engine.run(start_ts, end_ts)
+    print(f"bars: {result['stats']['bars']}, seconds: {result['stats']['run_seconds']:.2f}")
+
+if __name__ == '__main__':
+    main()
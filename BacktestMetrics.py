@@ -0,0 +1,130 @@
+import numpy as np
+from typing import Dict, List, Optional, Union, Any
+
+DAY_MS = 24 * 60 * 60 * 1000
+YEAR_MS = 365 * DAY_MS
+
+EMPTY_METRICS = {
+    "total_return_pct": 0,
+    "annualized_return_pct": 0,
+    "max_drawdown_pct": 0,
+    "max_drawdown_days": 0,
+    "sharpe_ratio": 0,
+    "sortino_ratio": 0,
+    "calmar_ratio": 0,
+    "volatility_pct": 0,
+    "exposure_pct": 0,
+    "turnover": 0,
+    "fees": 0,
+    "win_rate_pct": 0,
+    "profit_factor": 0,
+    "total_trades": 0,
+    "attribution": {}
+}
+
+
+def calculate_metrics(equity: Dict[str, np.ndarray], fills: Dict[str, np.ndarray], initial_balance: float,
+                      start_ts: int, end_ts: int, unrealized: Optional[Dict[str, float]] = None) -> Dict:
+    """
+    Метрики бэктеста по массивам NumPy за один проход, без DataFrame
+
+    Годовые величины считаются на базе 365 дней (крипторынок работает без
+    выходных), количество свечей в году определяется по медианному интервалу
+    кривой капитала, поэтому метрики корректны на любом таймфрейме.
+
+    Args:
+        equity: {"timestamp", "value", "exposure"} - кривая капитала на каждой свече
+            и стоимость открытых позиций (см. PortfolioLedger.finalize)
+        fills: {"timestamp", "pair", "side", "notional", "fee", "pnl"} - журнал исполнений
+        initial_balance: Начальный баланс
+        start_ts: Начало периода (мс)
+        end_ts: Конец периода (мс)
+        unrealized: Нереализованный результат открытых позиций {pair: value}
+
+    Returns:
+        Dict с метриками; attribution - вклад каждой пары в результат
+    """
+    ts = np.asarray(equity.get("timestamp", []), dtype=float)
+    value = np.asarray(equity.get("value", []), dtype=float)
+    if len(value) == 0:
+        return {**EMPTY_METRICS, "attribution": {}}
+
+    # Доходность
+    total_return = value[-1] / initial_balance - 1
+    span_ms = end_ts - start_ts
+    if span_ms <= 0:
+        annualized_return = 0
+    elif total_return <= -1:
+        annualized_return = -1.0
+    else:
+        annualized_return = (1 + total_return) ** (YEAR_MS / span_ms) - 1
+
+    # Просадка и ее длительность: время от последнего максимума
+    peak = np.maximum.accumulate(value)
+    drawdown = value / peak - 1
+    max_drawdown = drawdown.min()
+    at_peak = np.where(value >= peak, np.arange(len(value)), 0)
+    np.maximum.accumulate(at_peak, out=at_peak)
+    max_drawdown_days = float((ts - ts[at_peak]).max()) / DAY_MS
+
+    # Доходности по свечам
+    if len(value) > 1:
+        returns = np.diff(value) / value[:-1]
+        bars_per_year = YEAR_MS / max(float(np.median(np.diff(ts))), 1.0)
+        mean = returns.mean()
+        std = returns.std(ddof=1) if len(returns) > 1 else 0.0
+        downside = np.sqrt(np.mean(np.minimum(returns, 0.0) ** 2))
+        sharpe_ratio = mean / std * np.sqrt(bars_per_year) if std > 0 else 0
+        sortino_ratio = mean / downside * np.sqrt(bars_per_year) if downside > 0 else 0
+        volatility = std * np.sqrt(bars_per_year)
+    else:
+        sharpe_ratio = sortino_ratio = volatility = 0
+    calmar_ratio = annualized_return / -max_drawdown if max_drawdown < 0 else 0
+
+    # Время в позиции и оборот
+    exposure = np.asarray(equity.get("exposure", np.zeros(len(value))), dtype=float)
+    exposure_pct = float(np.count_nonzero(exposure > 0)) / len(value) * 100
+    notional = np.asarray(fills.get("notional", []), dtype=float)
+    turnover = notional.sum() / value.mean() if value.mean() > 0 else 0
+
+    # Сделки: выигрышные считаются среди закрывающих (продаж)
+    side = np.asarray(fills.get("side", []))
+    pnl = np.asarray(fills.get("pnl", []), dtype=float)
+    fee = np.asarray(fills.get("fee", []), dtype=float)
+    closed = pnl[side < 0]
+    if len(closed):
+        win_rate = np.count_nonzero(closed > 0) / len(closed)
+        gross_profit = closed[closed > 0].sum()
+        gross_loss = -closed[closed < 0].sum()
+        profit_factor = gross_profit / gross_loss if gross_loss > 0 else float('inf')
+    else:
+        win_rate = 0
+        profit_factor = 0
+
+    # Вклад пар: реализованный PnL (с комиссией продажи) - комиссии покупок + нереализованный
+    attribution = {}
+    pairs = np.asarray(fills.get("pair", []), dtype=object)
+    if len(pairs):
+        names, codes = np.unique(pairs.astype(str), return_inverse=True)
+        realized = np.bincount(codes, weights=np.where(side < 0, pnl, -fee), minlength=len(names))
+        attribution = {str(name): float(realized[i]) for i, name in enumerate(names)}
+    for pair, amount in (unrealized or {}).items():
+        attribution[pair] = attribution.get(pair, 0.0) + float(amount)
+
+    return {
+        "total_return_pct": float(total_return * 100),
+        "annualized_return_pct": float(annualized_return * 100),
+        "max_drawdown_pct": float(max_drawdown * 100),
+        "max_drawdown_days": max_drawdown_days,
+        "sharpe_ratio": float(sharpe_ratio),
+        "sortino_ratio": float(sortino_ratio),
+        "calmar_ratio": float(calmar_ratio),
+        "volatility_pct": float(volatility * 100),
+        "exposure_pct": exposure_pct,
+        "turnover": float(turnover),
+        "fees": float(fee.sum()),
+        "win_rate_pct": float(win_rate * 100),
+        "profit_factor": float(profit_factor),
+        "total_trades": len(side),
+        "attribution": attribution
+    }
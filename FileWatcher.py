@@ -0,0 +1,174 @@
+"""
+FileWatcher reports changes in a set of directories, so PBRun only reacts when something actually changed.
+
+On Linux it uses inotify (through ctypes, no extra package needed). Everywhere else, or when inotify is not available,
+it falls back to polling: the watched directories are scanned at the end of each wait and compared with the last scan.
+Both modes return the same thing, a set of Paths that changed (the directory itself and the changed entries in it).
+"""
+import os
+import select
+import struct
+import ctypes
+import ctypes.util
+from pathlib import Path
+from time import sleep
+from datetime import datetime
+
+# inotify event masks (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+              IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct('iIII')
+
+class FileWatcher():
+    """Watches directories (not recursive) and returns the changed paths from wait()."""
+    def __init__(self, polling: bool = False):
+        """polling (bool): Force polling, even if inotify is available."""
+        self.dirs = {}
+        self.wds = {}
+        self.fd = None
+        self._libc = None
+        if not polling:
+            self._init_inotify()
+        self.polling = self.fd is None
+
+    def _init_inotify(self):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (OSError, AttributeError, TypeError):
+            return
+        if fd < 0:
+            print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Warning: inotify not available ({os.strerror(ctypes.get_errno())}), using polling')
+            return
+        self._libc = libc
+        self.fd = fd
+
+    def watch(self, path):
+        """Add a directory to the watch list. Missing directories are ignored."""
+        path = Path(path)
+        if path in self.dirs or not path.is_dir():
+            return
+        if self.polling:
+            self.dirs[path] = self._scan(path)
+            return
+        wd = self._libc.inotify_add_watch(self.fd, str(path).encode(), WATCH_MASK)
+        if wd < 0:
+            # Out of watches (fs.inotify.max_user_watches) or no access: this directory is polled
+            print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Warning: Can not watch {path} ({os.strerror(ctypes.get_errno())}), using polling')
+            self.dirs[path] = self._scan(path)
+            return
+        self.dirs[path] = wd
+        self.wds[wd] = path
+
+    def unwatch(self, path):
+        """Remove a directory from the watch list."""
+        path = Path(path)
+        wd = self.dirs.pop(path, None)
+        if isinstance(wd, int):
+            self.wds.pop(wd, None)
+            self._libc.inotify_rm_watch(self.fd, wd)
+
+    def sync(self, paths: list):
+        """Watch exactly the given directories."""
+        paths = set(Path(p) for p in paths)
+        for path in list(self.dirs):
+            if path not in paths:
+                self.unwatch(path)
+        for path in paths:
+            self.watch(path)
+
+    def wait(self, timeout: float, settle: float = 0.2):
+        """Wait up to timeout seconds for changes and return the set of changed Paths.
+
+        With inotify it returns as soon as something changes, after collecting further events for settle seconds
+        so that a burst of writes is handled once. With polling it sleeps for timeout and then scans.
+        """
+        changed = set()
+        if self.fd is not None:
+            readable, _, _ = select.select([self.fd], [], [], max(timeout, 0))
+            if readable:
+                self._read(changed)
+                if settle:
+                    sleep(settle)
+                    self._read(changed)
+        else:
+            sleep(max(timeout, 0))
+        self._poll(changed)
+        return changed
+
+    def _read(self, changed: set):
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0').decode(errors='replace')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost, report every watched directory as changed
+                changed.update(self.dirs)
+                continue
+            path = self.wds.get(wd)
+            if path is None:
+                continue
+            changed.add(path)
+            if name:
+                changed.add(path / name)
+            if mask & IN_IGNORED:
+                # Directory was removed or moved away, the kernel dropped the watch
+                self.wds.pop(wd, None)
+                self.dirs.pop(path, None)
+
+    @staticmethod
+    def _scan(path: Path):
+        entries = {}
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    entries[entry.name] = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+        return entries
+
+    def _poll(self, changed: set):
+        """Compare polled directories with their last scan."""
+        for path, last in list(self.dirs.items()):
+            if isinstance(last, int):
+                continue
+            current = self._scan(path)
+            if current is None:
+                changed.add(path)
+                del self.dirs[path]
+                continue
+            if current != last:
+                changed.add(path)
+                for name in current.keys() | last.keys():
+                    if current.get(name) != last.get(name):
+                        changed.add(path / name)
+                self.dirs[path] = current
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
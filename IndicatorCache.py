@@ -0,0 +1,172 @@
+import threading
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from typing import Dict, List, Optional, Union, Any, Callable, Tuple
+
+try:
+    from talib import abstract as talib_abstract
+except ImportError:
+    talib_abstract = None
+
+
+def _sma(inputs: Dict[str, np.ndarray], timeperiod: int = 30) -> np.ndarray:
+    return pd.Series(inputs["close"]).rolling(window=int(timeperiod)).mean().to_numpy()
+
+def _ema(inputs: Dict[str, np.ndarray], timeperiod: int = 30) -> np.ndarray:
+    return pd.Series(inputs["close"]).ewm(span=int(timeperiod), adjust=False).mean().to_numpy()
+
+# Индикаторы без talib: имя -> (функция, число баров прогрева на единицу периода)
+BUILTIN_INDICATORS: Dict[str, Tuple[Callable, int]] = {
+    "SMA": (_sma, 1),
+    "EMA": (_ema, 10),
+}
+
+
+class _Entry:
+    """Закэшированные значения индикатора для одной серии"""
+
+    def __init__(self, version: int, timestamps: np.ndarray, closes: np.ndarray, values: List[np.ndarray]):
+        self.version = version
+        self.timestamps = timestamps
+        self.closes = closes
+        self.values = values
+
+
+class IndicatorCache:
+    """
+    Кэш технических индикаторов по ключу
+    (exchange, symbol, timeframe, indicator, params) с проверкой версии серии.
+
+    Если серия не изменилась, значения отдаются из кэша. Если добавились новые
+    свечи, пересчитывается только хвост: последние бары кэша плюс прогрев
+    (warmup) для рекурсивных индикаторов вроде EMA/RSI. Для рекурсивных
+    индикаторов хвост приближенный: влияние отброшенной истории затухает за
+    прогрев, но не исчезает полностью. Последний бар кэша всегда
+    пересчитывается, так как он мог быть еще не закрыт. Закэшированные
+    значения переиспользуются, только если совпадают и время, и цены закрытия
+    свечей; исправленная история (INSERT OR REPLACE) пересчитывается целиком.
+
+    Индикаторы считаются через talib.abstract, если talib установлен, иначе
+    доступны BUILTIN_INDICATORS и зарегистрированные через register().
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._custom: Dict[str, Tuple[Callable, int]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "partial": 0, "misses": 0}
+
+    def register(self, name: str, func: Callable, warmup_factor: int = 1):
+        """
+        Регистрирует пользовательский индикатор.
+        func(inputs, **params) получает словарь массивов open/high/low/close/volume
+        и возвращает массив или кортеж массивов той же длины.
+        """
+        self._custom[name.upper()] = (func, warmup_factor)
+
+    def _resolve(self, name: str) -> Tuple[Callable, int]:
+        name = name.upper()
+        if name in self._custom:
+            return self._custom[name]
+        if talib_abstract is not None:
+            function = talib_abstract.Function(name)
+            # Рекурсивные индикаторы talib требуют длинного прогрева
+            return (lambda inputs, **params: function(inputs, **params)), 10
+        if name in BUILTIN_INDICATORS:
+            return BUILTIN_INDICATORS[name]
+        raise ValueError(f"Индикатор {name} не найден")
+
+    @staticmethod
+    def _warmup(params: Dict, factor: int) -> int:
+        periods = [int(v) for v in params.values() if isinstance(v, (int, float)) and not isinstance(v, bool)]
+        return max(periods, default=30) * factor
+
+    @staticmethod
+    def _compute(func: Callable, inputs: Dict[str, np.ndarray], params: Dict) -> List[np.ndarray]:
+        result = func(inputs, **params)
+        if isinstance(result, (list, tuple)):
+            return [np.asarray(r, dtype=float) for r in result]
+        return [np.asarray(result, dtype=float)]
+
+    @staticmethod
+    def to_inputs(ohlcv: Union[List, pd.DataFrame]) -> Dict[str, np.ndarray]:
+        """Преобразует список свечей или DataFrame в словарь массивов"""
+        if isinstance(ohlcv, pd.DataFrame):
+            return {c: ohlcv[c].to_numpy(dtype=float) for c in ["timestamp", "open", "high", "low", "close", "volume"]}
+        array = np.asarray(ohlcv, dtype=float).reshape(-1, 6)
+        return {c: array[:, i] for i, c in enumerate(["timestamp", "open", "high", "low", "close", "volume"])}
+
+    def get(self, key: tuple, version: int, ohlcv: Union[List, pd.DataFrame],
+            indicator: str, params: Optional[Dict] = None) -> Union[np.ndarray, Tuple[np.ndarray, ...]]:
+        """
+        Возвращает значения индикатора, выровненные по свечам ohlcv
+
+        Args:
+            key: (exchange, symbol, timeframe)
+            version: Версия серии из MarketDataManager.series_version
+            ohlcv: Свечи серии (список или DataFrame), отсортированные по времени
+            indicator: Имя индикатора (SMA, EMA, RSI, MACD ...)
+            params: Параметры индикатора
+
+        Returns:
+            Массив значений или кортеж массивов для индикаторов с несколькими выходами
+        """
+        params = params or {}
+        func, factor = self._resolve(indicator)
+        inputs = self.to_inputs(ohlcv)
+        timestamps = inputs["timestamp"]
+        cache_key = (*key, indicator.upper(), tuple(sorted(params.items())))
+
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                self._entries.move_to_end(cache_key)
+
+        values = None
+        if entry is not None and len(timestamps) and len(entry.timestamps):
+            same_range = (len(entry.timestamps) == len(timestamps)
+                          and entry.timestamps[0] == timestamps[0] and entry.timestamps[-1] == timestamps[-1])
+            if same_range and entry.version == version:
+                with self._lock:
+                    self.stats["hits"] += 1
+                return self._result(entry.values)
+            # Ищем пересечение новой серии с закэшированной
+            offset = int(np.searchsorted(entry.timestamps, timestamps[0]))
+            reuse = int(np.searchsorted(timestamps, entry.timestamps[-1]))
+            if (offset < len(entry.timestamps) and entry.timestamps[offset] == timestamps[0]
+                    and reuse < len(timestamps) and reuse > 0
+                    and np.array_equal(entry.timestamps[offset:offset + reuse], timestamps[:reuse])
+                    and np.array_equal(entry.closes[offset:offset + reuse], inputs["close"][:reuse])):
+                start = max(0, reuse - self._warmup(params, factor))
+                tail = self._compute(func, {c: a[start:] for c, a in inputs.items()}, params)
+                values = [np.concatenate([cached[offset:offset + reuse], fresh[reuse - start:]])
+                          for cached, fresh in zip(entry.values, tail)]
+                with self._lock:
+                    self.stats["partial"] += 1
+
+        if values is None:
+            values = self._compute(func, inputs, params)
+            with self._lock:
+                self.stats["misses"] += 1
+
+        with self._lock:
+            self._entries[cache_key] = _Entry(version, timestamps.copy(), inputs["close"].copy(), values)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return self._result(values)
+
+    @staticmethod
+    def _result(values: List[np.ndarray]):
+        return values[0] if len(values) == 1 else tuple(values)
+
+    def invalidate(self, key: Optional[tuple] = None):
+        """Удаляет записи серии key (exchange, symbol, timeframe) или весь кэш"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                return
+            for cache_key in [k for k in self._entries if k[:3] == key]:
+                del self._entries[cache_key]
@@ -0,0 +1,345 @@
+import sys
+import threading
+import time
+import numpy as np
+import pandas as pd
+from collections import deque
+from typing import Dict, List, Optional, Union, Any, Callable
+from datetime import datetime
+from IndicatorCache import IndicatorCache
+from MarketDataManager import timeframe_to_ms
+from StrategyCompiler import compiler, strategy_namespace
+
+COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+
+class _Rolling:
+    """
+    Окно последних limit значений с добавлением за O(1) (амортизированно).
+    Буфер вдвое больше окна; при заполнении последние limit строк
+    переносятся в начало. view() возвращает срез без копирования.
+    """
+
+    def __init__(self, limit: int, width: int = 0):
+        self.limit = limit
+        shape = (2 * limit, width) if width else (2 * limit,)
+        self._buffer = np.full(shape, np.nan)
+        self._end = 0
+        self.count = 0
+
+    def append(self, value):
+        if self._end == len(self._buffer):
+            self._buffer[:self.limit - 1] = self._buffer[self._end - self.limit + 1:self._end]
+            self._end = self.limit - 1
+        self._buffer[self._end] = value
+        self._end += 1
+        self.count += 1
+
+    def view(self) -> np.ndarray:
+        return self._buffer[max(0, self._end - self.limit):self._end]
+
+    def __len__(self):
+        return min(self._end, self.limit)
+
+
+class _SMA:
+    def __init__(self, timeperiod: int = 30):
+        self.period = int(timeperiod)
+        self._window = deque()
+        self._sum = 0.0
+
+    def update(self, bar: np.ndarray) -> float:
+        self._window.append(bar[4])
+        self._sum += bar[4]
+        if len(self._window) > self.period:
+            self._sum -= self._window.popleft()
+        return self._sum / self.period if len(self._window) == self.period else np.nan
+
+
+class _EMA:
+    """EMA с затравкой SMA первых timeperiod значений, как в talib"""
+
+    def __init__(self, timeperiod: int = 30):
+        self.period = int(timeperiod)
+        self.alpha = 2 / (self.period + 1)
+        self._count = 0
+        self._value = 0.0
+
+    def update(self, bar: np.ndarray) -> float:
+        close = bar[4]
+        self._count += 1
+        if self._count <= self.period:
+            self._value += close / self.period
+            return self._value if self._count == self.period else np.nan
+        self._value += self.alpha * (close - self._value)
+        return self._value
+
+
+class _RSI:
+    """RSI Уайлдера, как в talib"""
+
+    def __init__(self, timeperiod: int = 14):
+        self.period = int(timeperiod)
+        self._prev = None
+        self._count = 0
+        self._gain = 0.0
+        self._loss = 0.0
+
+    def update(self, bar: np.ndarray) -> float:
+        close = bar[4]
+        if self._prev is None:
+            self._prev = close
+            return np.nan
+        change = close - self._prev
+        self._prev = close
+        gain, loss = max(change, 0.0), max(-change, 0.0)
+        self._count += 1
+        if self._count <= self.period:
+            self._gain += gain / self.period
+            self._loss += loss / self.period
+            if self._count < self.period:
+                return np.nan
+        else:
+            self._gain = (self._gain * (self.period - 1) + gain) / self.period
+            self._loss = (self._loss * (self.period - 1) + loss) / self.period
+        return 100.0 if self._loss == 0 else 100 - 100 / (1 + self._gain / self._loss)
+
+
+# Индикаторы с пошаговым обновлением состояния; вызовы с другими параметрами,
+# кроме timeperiod, считаются через IndicatorCache
+INCREMENTAL_PARAMS = {"timeperiod"}
+INCREMENTAL_INDICATORS = {
+    "SMA": _SMA,
+    "EMA": _EMA,
+    "RSI": _RSI,
+}
+
+
+class _LiveFrames(dict):
+    """
+    data стратегии: DataFrame серии строится только при обращении и только
+    если с прошлого обращения пришла новая свеча
+    """
+
+    def __init__(self, series: Dict[str, _Rolling]):
+        super().__init__()
+        self._series = series
+        self._built = {}
+        for key in series:
+            super().__setitem__(key, None)
+
+    def __getitem__(self, key) -> pd.DataFrame:
+        series = self._series[key]
+        version = series.count
+        frame = dict.__getitem__(self, key)
+        if frame is None or self._built.get(key) != version:
+            frame = pd.DataFrame(series.view(), columns=COLUMNS)
+            frame['timestamp'] = frame['timestamp'].astype('int64')
+            frame['datetime'] = pd.to_datetime(frame['timestamp'], unit='ms')
+            super().__setitem__(key, frame)
+            self._built[key] = version
+        return frame
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def values(self):
+        return [self[key] for key in self.keys()]
+
+
+class LiveSignalRunner:
+    """
+    Долгоживущее выполнение стратегии на новых закрытых свечах.
+
+    При запуске загружается последние strategy.limit свечей каждой серии и код
+    стратегии выполняется один раз; затем runner подписывается на закрытие
+    свечей через MarketDataManager.subscribe_bars и на каждой новой свече:
+      - добавляет ее в окно серии (без повторной загрузки истории);
+      - обновляет состояние инкрементальных индикаторов (SMA, EMA, RSI) за O(1),
+        indicator() возвращает срез окна значений без копирования;
+      - вызывает on_bar(bar) для стратегий с обработчиком. Векторные стратегии
+        и обычные скрипты пересчитываются на окне последних strategy.limit свечей.
+
+    Остальные индикаторы (и SMA/EMA/RSI с параметрами кроме timeperiod)
+    считаются через IndicatorCache на окне серии.
+    DataFrame серии (data[key]) строится только при обращении к нему;
+    переменные df_<key> содержат данные на момент запуска.
+    """
+
+    def __init__(self, sm, strategy, params: Optional[Dict] = None, on_signal: Optional[Callable] = None,
+                 max_signals: int = 1000):
+        """
+        Args:
+            sm: StrategyManager
+            strategy: Стратегия
+            params: Параметры для переопределения
+            on_signal: Обработчик сигнала on_signal(signal)
+            max_signals: Сколько последних сигналов хранить в self.signals
+        """
+        self.sm = sm
+        self.mdm = sm.mdm
+        self.strategy = strategy
+        self.params = {**strategy.parameters, **(params or {})}
+        self.on_signal = on_signal
+        self.signals = deque(maxlen=max_signals)
+        self.logs = deque(maxlen=max_signals)
+        self.series: Dict[str, _Rolling] = {}
+        self.meta: Dict[str, tuple] = {}
+        self._indicators: Dict[tuple, tuple] = {}
+        self._fallback = IndicatorCache()
+        self._pending = []
+        self._tokens = []
+        self._lock = threading.Lock()
+        self._target = {}
+        self.stats = {"bars": 0, "signals": 0, "last_latency": 0.0, "max_latency": 0.0,
+                      "last_eval_seconds": 0.0, "max_eval_seconds": 0.0}
+
+    def start(self):
+        """Загружает окно истории, выполняет код стратегии и подписывается на новые свечи"""
+        self.compiled = compiler.compile(self.strategy.code, self.strategy.name)
+        now_ms = int(time.time() * 1000)
+        limit = self.strategy.limit
+        for exchange in self.strategy.exchanges:
+            for symbol in self.strategy.symbols:
+                for timeframe in self.strategy.timeframes:
+                    key = f"{exchange}_{symbol}_{timeframe}"
+                    tf_ms = timeframe_to_ms(timeframe)
+                    # Незакрытая свеча в окно не попадает
+                    rows = [row for row in self.mdm.get_ohlcv(exchange, symbol, timeframe, limit + 1, force_update=True)
+                            if row[0] + tf_ms <= now_ms][-limit:]
+                    series = _Rolling(limit, 6)
+                    for row in rows:
+                        series.append(row)
+                    self.series[key] = series
+                    self.meta[key] = (exchange, symbol, timeframe)
+        self.data = _LiveFrames(self.series)
+        self.namespace = strategy_namespace(f"strategy_{self.strategy.id}", self.params, self.data,
+                                            self._pending, self.logs, self._indicator,
+                                            lambda: datetime.now().timestamp())
+        exec(self.compiled.code, self.namespace)
+        self._pending.clear()
+        if self.compiled.mode == "vector":
+            for key in self.series:
+                self._target[key] = self._vector_target(key)
+        for key, (exchange, symbol, timeframe) in self.meta.items():
+            view = self.series[key].view()
+            last_ts = int(view[-1, 0]) if len(view) else None
+            self._tokens.append(self.mdm.subscribe_bars(exchange, symbol, timeframe, self._on_bar, last_ts))
+        return self
+
+    def stop(self):
+        for token in self._tokens:
+            self.mdm.unsubscribe_bars(token)
+        self._tokens = []
+
+    def _indicator(self, exchange, symbol, timeframe, name, **params):
+        key = f"{exchange}_{symbol}_{timeframe}"
+        series = self.series[key]
+        factory = INCREMENTAL_INDICATORS.get(name.upper())
+        if factory is None or not INCREMENTAL_PARAMS.issuperset(params):
+            view = series.view()
+            version = int(view[-1, 0]) if len(view) else 0
+            return self._fallback.get((exchange, symbol, timeframe), version, view, name, params)
+        cache_key = (key, name.upper(), tuple(sorted(params.items())))
+        if cache_key not in self._indicators:
+            # Первое обращение: прогрев состояния на окне истории
+            state = factory(**params)
+            values = _Rolling(series.limit)
+            for row in series.view():
+                values.append(state.update(row))
+            self._indicators[cache_key] = (state, values)
+        return self._indicators[cache_key][1].view()
+
+    def _vector_target(self, key: str) -> np.ndarray:
+        exchange, symbol, timeframe = self.meta[key]
+        df = self.data[key]
+        size = float(self.params.get("position_size", 1.0))
+        from BacktestEngine import BacktestEngine
+        return BacktestEngine.target_position(
+            self.namespace["vector_signals"](df, {"exchange": exchange, "symbol": symbol, "timeframe": timeframe}),
+            len(df), size)
+
+    def _on_bar(self, exchange: str, symbol: str, timeframe: str, candle: List):
+        key = f"{exchange}_{symbol}_{timeframe}"
+        with self._lock:
+            started = time.perf_counter()
+            row = np.asarray(candle, dtype=float)
+            series = self.series[key]
+            series.append(row)
+            for (indicator_key, _, _), (state, values) in self._indicators.items():
+                if indicator_key == key:
+                    values.append(state.update(row))
+            try:
+                self._evaluate(key, row)
+            except Exception as e:
+                self.logs.append(f"Ошибка при выполнении стратегии: {str(e)}")
+            for signal in self._pending:
+                if signal["price"] is None:
+                    signal["price"] = float(row[4])
+                if not signal.get("timeframe"):
+                    signal["timeframe"] = timeframe
+                self.signals.append(signal)
+                self.stats["signals"] += 1
+                if self.on_signal:
+                    self.on_signal(signal)
+            self._pending.clear()
+            eval_seconds = time.perf_counter() - started
+            latency = time.time() - (row[0] + timeframe_to_ms(timeframe)) / 1000
+            self.stats["bars"] += 1
+            self.stats["last_eval_seconds"] = eval_seconds
+            self.stats["max_eval_seconds"] = max(self.stats["max_eval_seconds"], eval_seconds)
+            self.stats["last_latency"] = latency
+            self.stats["max_latency"] = max(self.stats["max_latency"], latency)
+
+    def _evaluate(self, key: str, row: np.ndarray):
+        exchange, symbol, timeframe = self.meta[key]
+        mode = self.compiled.mode
+        if mode == "callbacks":
+            self.namespace["on_bar"]({
+                "key": key, "exchange": exchange, "symbol": symbol, "timeframe": timeframe,
+                "index": len(self.series[key]) - 1, "timestamp": int(row[0]),
+                "open": row[1], "high": row[2], "low": row[3], "close": row[4], "volume": row[5]
+            })
+        elif mode == "vector":
+            target = self._vector_target(key)
+            previous = self._target.get(key)
+            delta = target[-1] - (previous[-1] if previous is not None and len(previous) else 0.0)
+            self._target[key] = target
+            if delta != 0:
+                self._pending.append({
+                    "exchange": exchange, "symbol": symbol, "side": "buy" if delta > 0 else "sell",
+                    "price": float(row[4]), "amount": abs(float(delta)), "reason": "vector",
+                    "timeframe": timeframe, "timestamp": datetime.now().timestamp()
+                })
+        else:
+            for data_key in self.series:
+                self.namespace[f"df_{data_key}".replace("-", "_").replace(".", "_")] = self.data[data_key]
+            exec(self.compiled.code, self.namespace)
+
+
+def main():
+    # Запуск сохраненной стратегии: python LiveSignalRunner.py <strategy_id>
+    from MarketDataManager import MarketDataManager
+    from StrategyManager import StrategyManager
+    if len(sys.argv) < 2:
+        print("Использование: LiveSignalRunner.py <strategy_id>")
+        return
+    sm = StrategyManager(MarketDataManager())
+    strategy = sm.get_strategy(sys.argv[1])
+    if strategy is None:
+        print(f"Стратегия {sys.argv[1]} не найдена")
+        return
+    runner = LiveSignalRunner(sm, strategy, on_signal=lambda signal: print(signal)).start()
+    print(f"Стратегия {strategy.name}: ожидание новых свечей")
+    try:
+        while True:
+            time.sleep(60)
+            print(runner.stats)
+    except KeyboardInterrupt:
+        runner.stop()
+
+if __name__ == '__main__':
+    main()
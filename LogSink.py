@@ -0,0 +1,154 @@
+"""
+LogSink writes the output of a passivbot process to its passivbot.log and rotates the log without copying it.
+
+PBRun starts LogSink together with the bot, the bot writes to a pipe and LogSink is the only writer of passivbot.log:
+    python LogSink.py <logfile> [max_bytes] [compress] [keep]
+When passivbot.log reaches max_bytes, LogSink closes it, renames it to passivbot.log.old and opens a new passivbot.log.
+With compress, the previous passivbot.log.old is gzipped to passivbot.log.old.<timestamp>.gz in a background thread
+and only the newest keep archives are kept. SIGHUP reopens passivbot.log, so an external logrotate can rename it too.
+LogSink exits when the bot closes its output.
+"""
+import os
+import sys
+import gzip
+import signal
+import threading
+import subprocess
+import platform
+from pathlib import Path, PurePath
+from shutil import copyfileobj
+from datetime import datetime
+from pbgui_purefunc import load_ini
+
+DEFAULTS = {
+    "log_size": 10485760,
+    "log_compress": False,
+    "log_keep": 5,
+}
+
+def log_settings():
+    """Rotation settings from [pbrun] in pbgui.ini"""
+    log_size = load_ini("pbrun", "log_size")
+    log_compress = load_ini("pbrun", "log_compress")
+    log_keep = load_ini("pbrun", "log_keep")
+    return (
+        int(log_size) if log_size != "" else DEFAULTS["log_size"],
+        log_compress.lower() in ("1", "true", "yes") if log_compress != "" else DEFAULTS["log_compress"],
+        int(log_keep) if log_keep != "" else DEFAULTS["log_keep"],
+    )
+
+def start_log_sink(logfile: Path, process_table=None):
+    """Start a LogSink for logfile and return the write end of its pipe for the bot's stdout and stderr.
+
+    The caller passes the fd to the bot and closes it afterwards. With process_table the sink is registered as
+    ("sink", logfile) so PBRun knows this log is rotated by LogSink.
+    """
+    log_size, log_compress, log_keep = log_settings()
+    read_fd, write_fd = os.pipe()
+    cmd = [sys.executable, '-u', PurePath(f'{Path(__file__).parent}/LogSink.py'), str(logfile), str(log_size), str(log_compress), str(log_keep)]
+    kwargs = dict(stdin=read_fd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=Path.cwd())
+    if platform.system() == "Windows":
+        kwargs["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NO_WINDOW
+    else:
+        kwargs["start_new_session"] = True
+    try:
+        if process_table is not None:
+            process_table.spawn("sink", os.path.normpath(str(logfile)), cmd, **kwargs)
+        else:
+            subprocess.Popen(cmd, **kwargs)
+    except Exception:
+        os.close(write_fd)
+        raise
+    finally:
+        os.close(read_fd)
+    return write_fd
+
+class LogSink():
+    def __init__(self, logfile: str, max_bytes: int, compress: bool, keep: int):
+        self.logfile = Path(logfile)
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.keep = keep
+        self.file = None
+        self.size = 0
+        self.reopen = False
+        self.compressing = None
+        self.open()
+
+    def open(self):
+        if self.file:
+            self.file.close()
+        self.file = open(self.logfile, "ab")
+        self.size = self.file.tell()
+        self.reopen = False
+
+    def rotate(self):
+        """Rename passivbot.log to passivbot.log.old and open a new one"""
+        old = Path(f'{self.logfile}.old')
+        self.file.close()
+        self.file = None
+        try:
+            if self.compress and old.exists():
+                if self.compressing is not None:
+                    self.compressing.join()
+                archive = Path(f'{old}.{datetime.now().strftime("%Y%m%d%H%M%S%f")}')
+                old.replace(archive)
+                self.compressing = threading.Thread(target=self.compress_segment, args=(archive,), daemon=True)
+                self.compressing.start()
+            self.logfile.replace(old)
+        except OSError as e:
+            # On Windows a reader can block the rename, try again with the next write
+            print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Warning: Can not rotate {self.logfile}: {e}', file=sys.stderr)
+        self.open()
+
+    def compress_segment(self, segment: Path):
+        try:
+            with open(segment, "rb") as f_in, gzip.open(f'{segment}.gz', "wb") as f_out:
+                copyfileobj(f_in, f_out)
+            segment.unlink()
+            archives = sorted(segment.parent.glob(f'{self.logfile.name}.old.*.gz'))
+            for archive in archives[:-self.keep] if self.keep > 0 else archives:
+                archive.unlink(missing_ok=True)
+        except OSError as e:
+            print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Warning: Can not compress {segment}: {e}', file=sys.stderr)
+
+    def run(self):
+        stdin = sys.stdin.buffer
+        while True:
+            data = stdin.read1(65536)
+            if not data:
+                break
+            if self.reopen:
+                self.open()
+            if self.size + len(data) >= self.max_bytes:
+                # Rotate at the end of a line, so no line is split between two files
+                cut = data.rfind(b'\n') + 1
+                if cut > 0:
+                    self.file.write(data[:cut])
+                    self.rotate()
+                    data = data[cut:]
+            self.file.write(data)
+            self.file.flush()
+            self.size += len(data)
+        self.file.close()
+        if self.compressing is not None:
+            self.compressing.join()
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: LogSink.py <logfile> [max_bytes] [compress] [keep]")
+        exit(1)
+    max_bytes = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULTS["log_size"]
+    compress = sys.argv[3] == "True" if len(sys.argv) > 3 else DEFAULTS["log_compress"]
+    keep = int(sys.argv[4]) if len(sys.argv) > 4 else DEFAULTS["log_keep"]
+    sink = LogSink(sys.argv[1], max_bytes, compress, keep)
+    if hasattr(signal, "SIGHUP"):
+        def reopen(signum, frame):
+            sink.reopen = True
+        signal.signal(signal.SIGHUP, reopen)
+    # The bot exits on its own when PBRun stops it, LogSink follows on EOF
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    sink.run()
+
+if __name__ == '__main__':
+    main()
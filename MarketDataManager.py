@@ -3,27 +3,548 @@ import json
 import os
 import time
 import sqlite3
+import threading
 import pandas as pd
+from collections import OrderedDict
+from collections.abc import Mapping
 from pathlib import Path
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Union, Any
+from typing import Dict, List, Optional, Union, Any, Callable
 from Exchange import Exchange, Exchanges
 from User import User, Users
 from pbgui_func import PBGDIR
+from pbgui_purefunc import load_ini
+from IndicatorCache import IndicatorCache
+
+# Общие для всего процесса клиенты бирж и метаданные рынков.
+# Ключ клиента: (ccxt_id, имя пользователя, api key), ключ рынков: ccxt_id
+_exchange_pool: Dict[tuple, Exchange] = {}
+_markets_cache: Dict[str, tuple] = {}
+_initialized_dbs = set()
+_pool_lock = threading.Lock()
+
+
+def timeframe_to_ms(timeframe: str) -> int:
+    """Переводит таймфрейм ccxt (1m, 4h, 1d, 1w, 1M) в миллисекунды"""
+    units = {'m': 60, 'h': 60 * 60, 'd': 24 * 60 * 60, 'w': 7 * 24 * 60 * 60, 'M': 30 * 24 * 60 * 60}
+    return int(timeframe[:-1]) * units[timeframe[-1]] * 1000
+
+
+class LazyExchanges(Mapping):
+    """
+    Словарь бирж, который создает экземпляр Exchange только при первом обращении.
+    Итерация идет по всем поддерживаемым биржам, как и у обычного словаря.
+    Биржа, экземпляр которой создать не удалось, считается отсутствующей:
+    `in` возвращает False, get() - None, [] - KeyError, items() и values()
+    ее пропускают.
+    """
+
+    def __init__(self, mdm: 'MarketDataManager'):
+        self._mdm = mdm
+        self._loaded = {}
+
+    def __getitem__(self, exchange_name: str) -> Exchange:
+        if exchange_name not in self._mdm.supported_exchanges:
+            raise KeyError(exchange_name)
+        if exchange_name not in self._loaded:
+            exchange = self._mdm._create_exchange(exchange_name)
+            if exchange is None:
+                raise KeyError(exchange_name)
+            self._loaded[exchange_name] = exchange
+        return self._loaded[exchange_name]
+
+    def __iter__(self):
+        return iter(self._mdm.supported_exchanges)
+
+    def __len__(self) -> int:
+        return len(self._mdm.supported_exchanges)
+
+    def __contains__(self, exchange_name) -> bool:
+        return self.get(exchange_name) is not None
+
+    def items(self) -> List[tuple]:
+        items = []
+        for exchange_name in self:
+            exchange = self.get(exchange_name)
+            if exchange is not None:
+                items.append((exchange_name, exchange))
+        return items
+
+    def values(self) -> List[Exchange]:
+        return [exchange for _, exchange in self.items()]
+
+    def loaded(self) -> Dict[str, Exchange]:
+        """Возвращает только уже созданные экземпляры бирж"""
+        return dict(self._loaded)
+
+    def clear(self):
+        self._loaded.clear()
+
+
+class _Flight:
+    """Запрос к источнику данных, который сейчас выполняется для одного ключа"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class TickerCache:
+    """
+    Потокобезопасный LRU кэш тикеров в памяти процесса с ограниченным временем жизни.
+    Одновременные запросы одного ключа объединяются: источник вызывается один раз,
+    остальные потоки ждут и получают тот же результат.
+    """
+
+    def __init__(self, maxsize: int = 2048, ttl: float = 30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _get_locked(self, key) -> Optional[Dict]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires, ticker = item
+        if expires < time.time():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return ticker
+
+    def get(self, key) -> Optional[Dict]:
+        with self._lock:
+            return self._get_locked(key)
+
+    def put(self, key, ticker: Dict, timestamp: Optional[float] = None):
+        """Сохраняет тикер; timestamp (секунды) - время получения данных, по умолчанию сейчас"""
+        expires = (timestamp if timestamp is not None else time.time()) + self.ttl
+        with self._lock:
+            self._data[key] = (expires, ticker)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_load(self, key, loader: Callable[[], Optional[Dict]], use_cache: bool = True) -> Optional[Dict]:
+        """
+        Возвращает тикер из кэша или загружает его через loader.
+        loader должен сам положить результат в кэш через put().
+        Запрос с use_cache=False (force_update) присоединяется только к такому же
+        принудительному запросу, а не к загрузке, которая может вернуть данные из кэша.
+        """
+        with self._lock:
+            if use_cache:
+                ticker = self._get_locked(key)
+                if ticker is not None:
+                    return ticker
+            # Обычный запрос может получить и результат принудительного
+            flight = self._inflight.get((key, False))
+            if flight is None and use_cache:
+                flight = self._inflight.get((key, True))
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                flight_key = (key, use_cache)
+                self._inflight[flight_key] = flight
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = loader()
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[flight_key]
+            flight.event.set()
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# Кэш тикеров общий для всех MarketDataManager процесса
+_ticker_cache = TickerCache()
+# Версии OHLCV серий (exchange, symbol, timeframe) -> счетчик записей в базу
+_series_versions: Dict[tuple, int] = {}
+_indicator_cache = IndicatorCache()
+# Фоновые потоки обслуживания базы, по одному на файл базы
+_retention_threads: Dict[str, 'MarketDataRetention'] = {}
+
+
+class MarketDataRetention:
+    """
+    Политика хранения данных в market_data.db.
+    
+    Внутридневные свечи (таймфрейм меньше downsample_timeframe) хранятся в полном
+    разрешении raw_days дней, более старые агрегируются в downsample_timeframe и
+    удаляются. Свечи старше ohlcv_days, тикеры старше ticker_days и корреляции
+    старше correlation_days удаляются (0 - хранить всегда). Все изменения идут
+    короткими транзакциями по batch_size строк, база работает в режиме WAL, поэтому
+    читатели не блокируются. Освободившиеся страницы возвращаются через
+    incremental_vacuum порциями по vacuum_pages. Новая база создается в режиме
+    auto_vacuum=INCREMENTAL, старая переводится в него только вручную
+    (convert_incremental, полный VACUUM); до этого только удаление и агрегация.
+    Граница удаленных свечей каждой серии записывается в ohlcv_pruned, чтобы
+    download_ohlcv не загружал их снова; версии измененных серий увеличиваются,
+    а их индикаторы удаляются из кэша.
+    
+    Настройки берутся из секции [market_data] файла pbgui.ini.
+    """
+
+    DEFAULTS = {
+        "retention_enabled": False,
+        "retention_interval": 3600,
+        "raw_days": 30,
+        "downsample_timeframe": "1h",
+        "ohlcv_days": 0,
+        "ticker_days": 1,
+        "correlation_days": 90,
+        "batch_size": 5000,
+        "vacuum_pages": 1000
+    }
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self.last_run = None
+        self._stop = threading.Event()
+        self._thread = None
+        self.load()
+
+    def load(self):
+        """Загружает настройки из pbgui.ini"""
+        for key, default in self.DEFAULTS.items():
+            value = load_ini("market_data", key)
+            if value == "":
+                value = default
+            elif isinstance(default, bool):
+                value = value.lower() in ("true", "1", "yes")
+            elif isinstance(default, int):
+                value = int(value)
+            setattr(self, key, value)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def run_once(self) -> Dict:
+        """Выполняет один проход обслуживания и возвращает статистику"""
+        start = time.perf_counter()
+        now_ms = int(time.time() * 1000)
+        day_ms = 24 * 60 * 60 * 1000
+        stats = {"downsampled": 0, "ohlcv_deleted": 0, "tickers_deleted": 0, "correlations_deleted": 0}
+        conn = self._connect()
+        try:
+            if self.raw_days > 0:
+                stats["downsampled"] = self._downsample(conn, now_ms - self.raw_days * day_ms)
+            if self.ohlcv_days > 0:
+                cutoff = now_ms - self.ohlcv_days * day_ms
+                series = conn.execute(
+                    "SELECT DISTINCT exchange, symbol, timeframe FROM ohlcv WHERE timestamp < ?", (cutoff,)
+                ).fetchall()
+                stats["ohlcv_deleted"] = self._delete_older(conn, "ohlcv", cutoff)
+                self._pruned(conn, series, cutoff)
+            if self.ticker_days > 0:
+                stats["tickers_deleted"] = self._delete_older(conn, "tickers", now_ms - self.ticker_days * day_ms)
+            if self.correlation_days > 0:
+                stats["correlations_deleted"] = self._delete_older(conn, "correlations", now_ms - self.correlation_days * day_ms)
+            stats["pages_freed"] = self._compact(conn)
+        finally:
+            conn.close()
+        stats["seconds"] = time.perf_counter() - start
+        self.last_run = stats
+        return stats
+
+    def _delete_older(self, conn: sqlite3.Connection, table: str, cutoff: int) -> int:
+        """Удаляет строки старше cutoff порциями по batch_size"""
+        deleted = 0
+        while not self._stop.is_set():
+            cursor = conn.execute(
+                f"DELETE FROM {table} WHERE id IN (SELECT id FROM {table} WHERE timestamp < ? LIMIT ?)",
+                (cutoff, self.batch_size)
+            )
+            conn.commit()
+            deleted += cursor.rowcount
+            if cursor.rowcount < self.batch_size:
+                break
+        return deleted
+
+    def _pruned(self, conn: sqlite3.Connection, series: List[tuple], cutoff: int, changed: Optional[List[tuple]] = None):
+        """
+        Записывает, что свечи series старше cutoff удалены политикой хранения,
+        и сбрасывает версии и индикаторы серий series и changed
+        """
+        if series:
+            conn.executemany(
+                "INSERT INTO ohlcv_pruned (exchange, symbol, timeframe, pruned_before) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(exchange, symbol, timeframe) DO UPDATE SET pruned_before = MAX(pruned_before, excluded.pruned_before)",
+                [(*key, cutoff) for key in series]
+            )
+            conn.commit()
+        for key in set(series) | set(changed or []):
+            key = tuple(key)
+            with _pool_lock:
+                _series_versions[key] = _series_versions.get(key, 0) + 1
+            _indicator_cache.invalidate(key)
+
+    def _downsample(self, conn: sqlite3.Connection, cutoff: int) -> int:
+        """Агрегирует внутридневные свечи старше cutoff в downsample_timeframe"""
+        target = self.downsample_timeframe
+        target_ms = timeframe_to_ms(target)
+        # Граница по целому бакету, чтобы не агрегировать неполные интервалы
+        cutoff = cutoff - cutoff % target_ms
+        series = conn.execute(
+            "SELECT DISTINCT exchange, symbol, timeframe FROM ohlcv WHERE timestamp < ?", (cutoff,)
+        ).fetchall()
+        processed = 0
+        pruned = []
+        for exchange, symbol, timeframe in series:
+            try:
+                source_ms = timeframe_to_ms(timeframe)
+            except (KeyError, ValueError):
+                continue
+            if source_ms >= target_ms:
+                continue
+            limit = max(self.batch_size, 2 * target_ms // source_ms)
+            while not self._stop.is_set():
+                rows = conn.execute(
+                    "SELECT timestamp, open, high, low, close, volume FROM ohlcv "
+                    "WHERE exchange = ? AND symbol = ? AND timeframe = ? AND timestamp < ? "
+                    "ORDER BY timestamp LIMIT ?",
+                    (exchange, symbol, timeframe, cutoff, limit)
+                ).fetchall()
+                if not rows:
+                    break
+                if len(rows) == limit:
+                    # Последний бакет может продолжаться в следующей порции
+                    last_bucket = rows[-1][0] - rows[-1][0] % target_ms
+                    rows = [row for row in rows if row[0] < last_bucket]
+                buckets = {}
+                for timestamp, open_price, high, low, close, volume in rows:
+                    bucket = timestamp - timestamp % target_ms
+                    candle = buckets.get(bucket)
+                    if candle is None:
+                        buckets[bucket] = [open_price, high, low, close, volume]
+                    else:
+                        candle[1] = max(candle[1], high)
+                        candle[2] = min(candle[2], low)
+                        candle[3] = close
+                        candle[4] += volume
+                # Свечи целевого таймфрейма, загруженные с биржи, не перезаписываем
+                conn.executemany(
+                    "INSERT OR IGNORE INTO ohlcv (exchange, symbol, timeframe, timestamp, open, high, low, close, volume) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(exchange, symbol, target, bucket, *candle) for bucket, candle in buckets.items()]
+                )
+                conn.execute(
+                    "DELETE FROM ohlcv WHERE exchange = ? AND symbol = ? AND timeframe = ? AND timestamp <= ?",
+                    (exchange, symbol, timeframe, rows[-1][0])
+                )
+                conn.commit()
+                processed += len(rows)
+                pruned.append((exchange, symbol, timeframe))
+        pruned = list(dict.fromkeys(pruned))
+        self._pruned(conn, pruned, cutoff, [(exchange, symbol, target) for exchange, symbol, _ in pruned])
+        return processed
+
+    def is_incremental(self, conn: sqlite3.Connection) -> bool:
+        return conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+    def _compact(self, conn: sqlite3.Connection) -> int:
+        """Возвращает свободные страницы файловой системе без полной блокировки базы"""
+        if not self.is_incremental(conn):
+            # Старая база без INCREMENTAL: освободившиеся страницы используются повторно,
+            # переключение выполняется только вручную через convert_incremental
+            conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+            return 0
+        free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        conn.execute(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)})")
+        conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+        free_after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return free_before - free_after
+
+    def convert_incremental(self) -> Dict:
+        """
+        Переводит старую базу в режим auto_vacuum=INCREMENTAL.
+        Выполняет полный VACUUM: база переписывается целиком под эксклюзивной блокировкой
+        и временно требует примерно вдвое больше места на диске. Запускается только вручную.
+        """
+        start = time.perf_counter()
+        conn = self._connect()
+        try:
+            if self.is_incremental(conn):
+                return {"converted": False, "seconds": time.perf_counter() - start}
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            converted = self.is_incremental(conn)
+        finally:
+            conn.close()
+        return {"converted": converted, "seconds": time.perf_counter() - start}
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Ошибка при обслуживании базы рыночных данных: {str(e)}")
+            self._stop.wait(self.retention_interval)
+
+    def start(self):
+        """Запускает фоновое обслуживание базы"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="MarketDataRetention", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+class BarFeed:
+    """
+    Подписка на закрытие новых свечей.
+
+    Один фоновый поток на менеджер: для каждой серии (exchange, symbol,
+    timeframe) запрос к бирже выполняется только после закрытия следующей
+    свечи (через DELAY секунд), и только за свечи после последней
+    полученной. Новые закрытые свечи сохраняются в базу через get_ohlcv и
+    передаются всем подписчикам серии: callback(exchange, symbol, timeframe, candle).
+    """
+
+    # Задержка после закрытия свечи перед запросом, секунды
+    DELAY = 2.0
+
+    def __init__(self, mdm: 'MarketDataManager'):
+        self.mdm = mdm
+        self._subscribers: Dict[int, tuple] = {}
+        self._last: Dict[tuple, int] = {}
+        self._retry: Dict[tuple, float] = {}
+        self._next_token = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(self, exchange: str, symbol: str, timeframe: str, callback: Callable,
+                  last_ts: Optional[int] = None) -> int:
+        """
+        Подписывает callback на новые закрытые свечи серии
+
+        Args:
+            last_ts: Время последней уже полученной свечи; по умолчанию -
+                последняя закрытая на текущий момент
+
+        Returns:
+            Идентификатор подписки для unsubscribe
+        """
+        key = (exchange, symbol, timeframe)
+        tf_ms = timeframe_to_ms(timeframe)
+        with self._lock:
+            self._next_token += 1
+            token = self._next_token
+            self._subscribers[token] = (key, callback)
+            if key not in self._last:
+                self._last[key] = last_ts if last_ts is not None else (int(time.time() * 1000) // tf_ms - 1) * tf_ms
+        self._start()
+        self._wake.set()
+        return token
+
+    def unsubscribe(self, token: int):
+        with self._lock:
+            item = self._subscribers.pop(token, None)
+            if item and not any(key == item[0] for key, _ in self._subscribers.values()):
+                self._last.pop(item[0], None)
+                self._retry.pop(item[0], None)
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="BarFeed", daemon=True)
+        self._thread.start()
+
+    def _due(self, key: tuple) -> float:
+        """Время (с) следующего запроса серии: закрытие следующей свечи + DELAY"""
+        if key in self._retry:
+            return self._retry[key]
+        return (self._last[key] + 2 * timeframe_to_ms(key[2])) / 1000 + self.DELAY
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._lock:
+                due = {key: self._due(key) for key in self._last}
+            now = time.time()
+            for key, when in due.items():
+                if when <= now:
+                    self._poll(key)
+            with self._lock:
+                pending = [self._due(key) for key in self._last]
+            timeout = min(pending, default=now + 60) - time.time()
+            self._wake.wait(max(0.0, min(timeout, 60)))
+            self._wake.clear()
+
+    def _poll(self, key: tuple):
+        exchange, symbol, timeframe = key
+        tf_ms = timeframe_to_ms(timeframe)
+        with self._lock:
+            last = self._last.get(key)
+        if last is None:
+            return
+        now_ms = int(time.time() * 1000)
+        limit = min(1000, max(2, (now_ms - last) // tf_ms + 1))
+        candles = self.mdm.get_ohlcv(exchange, symbol, timeframe, limit, since=last + tf_ms)
+        closed = [c for c in candles or [] if c[0] > last and c[0] + tf_ms <= now_ms]
+        with self._lock:
+            if key not in self._last:
+                return
+            if not closed:
+                # Биржа еще не отдала закрытую свечу
+                self._retry[key] = time.time() + self.DELAY
+                return
+            self._retry.pop(key, None)
+            self._last[key] = closed[-1][0]
+            callbacks = [callback for k, callback in self._subscribers.values() if k == key]
+        for candle in closed:
+            for callback in callbacks:
+                try:
+                    callback(exchange, symbol, timeframe, candle)
+                except Exception as e:
+                    print(f"Ошибка в обработчике свечи {symbol} {timeframe} ({exchange}): {str(e)}")
+
 
 class MarketDataManager:
     """
     Универсальный менеджер для работы с рыночными данными различных бирж.
     Поддерживает: binance, bingx, bitget, blofin, bybit, gate, htx, kucoin, lbank, mexc, okx
     """
+
+    # Допустимое время создания менеджера в секундах
+    STARTUP_BUDGET = 0.5
+    # Время жизни кэша метаданных рынков в секундах
+    MARKETS_TTL = 3600
     
     def __init__(self):
+        start = time.perf_counter()
         self.db_path = Path(f'{PBGDIR}/data/market_data.db')
         self.cache_dir = Path(f'{PBGDIR}/data/market_cache')
         if not self.cache_dir.exists():
             self.cache_dir.mkdir(parents=True, exist_ok=True)
-        self.users = Users()
-        self.exchanges = {}
+        self._users = None
+        self.exchanges = LazyExchanges(self)
+        self.ticker_cache = _ticker_cache
+        self.indicators = _indicator_cache
+        self.last_export_stats = None
         self.supported_exchanges = {
             'binance': 'binance',
             'bingx': 'bingx',
@@ -38,12 +559,36 @@ class MarketDataManager:
             'okx': 'okx'
         }
         self._initialize_db()
-        self._load_exchanges()
+        with _pool_lock:
+            self.retention = _retention_threads.get(str(self.db_path))
+            if self.retention is None:
+                self.retention = MarketDataRetention(self.db_path)
+                _retention_threads[str(self.db_path)] = self.retention
+        if self.retention.retention_enabled:
+            self.retention.start()
+        self._bar_feed = None
+        self.startup_time = time.perf_counter() - start
+        if self.startup_time > self.STARTUP_BUDGET:
+            print(f"MarketDataManager: инициализация заняла {self.startup_time:.3f}s (бюджет {self.STARTUP_BUDGET}s)")
+
+    @property
+    def users(self) -> Users:
+        """Пользователи загружаются при первом обращении"""
+        if self._users is None:
+            self._users = Users()
+        return self._users
     
     def _initialize_db(self):
         """Инициализация базы данных для хранения рыночных данных"""
+        # Схема создается один раз на процесс для каждого файла базы
+        if str(self.db_path) in _initialized_dbs:
+            return
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
+        # Действует только для новой базы (до создания таблиц), старую базу переводит convert_database
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        # WAL позволяет читать базу во время фонового обслуживания
+        cursor.execute("PRAGMA journal_mode=WAL")
         
         # Создаем таблицу для тикеров (текущие цены)
         cursor.execute('''
@@ -112,31 +657,131 @@ class MarketDataManager:
         )
         ''')
         
+        # Граница свечей, удаленных политикой хранения (MarketDataRetention)
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ohlcv_pruned (
+            exchange TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            timeframe TEXT NOT NULL,
+            pruned_before INTEGER NOT NULL,
+            PRIMARY KEY(exchange, symbol, timeframe)
+        )
+        ''')
+        
         conn.commit()
         conn.close()
+        _initialized_dbs.add(str(self.db_path))
     
-    def _load_exchanges(self):
-        """Загружает экземпляры бирж на основе доступных пользователей"""
-        self.users.load()
-        
-        # Создаем экземпляры для всех поддерживаемых бирж
-        for exchange_name, ccxt_id in self.supported_exchanges.items():
-            # Найдем пользователя для этой биржи, если он существует
-            user = None
-            for u in self.users:
-                if u.exchange.lower() == exchange_name.lower():
-                    user = u
-                    break
+    def _create_exchange(self, exchange_name: str) -> Optional[Exchange]:
+        """Создает экземпляр биржи или берет его из общего пула процесса"""
+        ccxt_id = self.supported_exchanges[exchange_name]
+        # Найдем пользователя для этой биржи, если он существует
+        user = None
+        for u in self.users:
+            if u.exchange.lower() == exchange_name.lower():
+                user = u
+                break
+        key = (ccxt_id, user.name if user else None, user.key if user else None)
+        with _pool_lock:
+            exchange = _exchange_pool.get(key)
+            if exchange is None:
+                try:
+                    # Создаем экземпляр биржи с пользователем или без
+                    exchange = Exchange(ccxt_id, user)
+                except Exception as e:
+                    print(f"Ошибка при инициализации биржи {exchange_name}: {str(e)}")
+                    return None
+                _exchange_pool[key] = exchange
+        return exchange
+
+    def get_markets(self, exchange_name: str, force_update: bool = False) -> Dict:
+        """
+        Возвращает метаданные рынков биржи, общие для всех менеджеров процесса
+        
+        Args:
+            exchange_name: Название биржи
+            force_update: Принудительно загрузить рынки с биржи
             
-            try:
-                # Создаем экземпляр биржи с пользователем или без
-                self.exchanges[exchange_name] = Exchange(ccxt_id, user)
-            except Exception as e:
-                print(f"Ошибка при инициализации биржи {exchange_name}: {str(e)}")
+        Returns:
+            Словарь рынков в формате ccxt
+        """
+        exchange = self.exchanges[exchange_name]
+        with _pool_lock:
+            cached = _markets_cache.get(exchange.id)
+        if cached and not force_update and time.time() - cached[0] < self.MARKETS_TTL:
+            # Рынки передаются и в экземпляр ccxt, иначе его методы загрузят их повторно
+            if not exchange.instance:
+                exchange.connect()
+            if not exchange.instance.markets:
+                exchange.instance.set_markets(cached[1])
+            exchange._markets = exchange.instance.markets
+            return cached[1]
+        markets = exchange.load_market()
+        with _pool_lock:
+            _markets_cache[exchange.id] = (time.time(), markets)
+        return markets
     
+    def subscribe_bars(self, exchange: str, symbol: str, timeframe: str, callback: Callable,
+                       last_ts: Optional[int] = None) -> int:
+        """
+        Подписывает callback(exchange, symbol, timeframe, candle) на новые закрытые свечи
+
+        Returns:
+            Идентификатор подписки для unsubscribe_bars
+        """
+        if self._bar_feed is None:
+            self._bar_feed = BarFeed(self)
+        return self._bar_feed.subscribe(exchange, symbol, timeframe, callback, last_ts)
+
+    def unsubscribe_bars(self, token: int):
+        if self._bar_feed is not None:
+            self._bar_feed.unsubscribe(token)
+
+    def apply_retention(self) -> Dict:
+        """Выполняет обслуживание базы по политике хранения и возвращает статистику"""
+        self.retention.load()
+        return self.retention.run_once()
+
+    def convert_database(self) -> Dict:
+        """Переводит старую базу в режим инкрементального сжатия (полный VACUUM, выполняется вручную)"""
+        return self.retention.convert_incremental()
+
+    def series_version(self, exchange: str, symbol: str, timeframe: str) -> int:
+        """Возвращает версию OHLCV серии, которая растет при каждой записи свечей"""
+        return _series_versions.get((exchange, symbol, timeframe), 0)
+
+    def _bump_series_version(self, exchange: str, symbol: str, timeframe: str):
+        key = (exchange, symbol, timeframe)
+        with _pool_lock:
+            _series_versions[key] = _series_versions.get(key, 0) + 1
+
+    def get_indicator(self, exchange: str, symbol: str, timeframe: str, indicator: str,
+                      params: Optional[Dict] = None, ohlcv: Optional[Union[List, pd.DataFrame]] = None,
+                      limit: int = 100):
+        """
+        Возвращает значения индикатора из кэша, пересчитывая только новые свечи
+        
+        Args:
+            exchange: Название биржи
+            symbol: Символ (криптовалютная пара)
+            timeframe: Временной интервал
+            indicator: Имя индикатора talib (SMA, EMA, RSI, MACD ...)
+            params: Параметры индикатора, например {"timeperiod": 14}
+            ohlcv: Уже загруженные свечи (список или DataFrame); если None, загружаются limit свечей
+            limit: Количество свечей для загрузки
+            
+        Returns:
+            Массив значений, выровненный по свечам, или кортеж массивов
+        """
+        if ohlcv is None:
+            ohlcv = self.get_ohlcv(exchange, symbol, timeframe, limit)
+        version = self.series_version(exchange, symbol, timeframe)
+        return self.indicators.get((exchange, symbol, timeframe), version, ohlcv, indicator, params)
+
     def refresh_exchanges(self):
         """Обновляет экземпляры бирж на случай изменения пользователей"""
-        self._load_exchanges()
+        self._users = None
+        self.exchanges.clear()
     
     def get_ticker(self, exchange: str, symbol: str, force_update: bool = False) -> Dict:
         """
@@ -152,53 +797,66 @@ class MarketDataManager:
         """
         if exchange not in self.supported_exchanges:
             raise ValueError(f"Биржа {exchange} не поддерживается")
-            
+        
+        # Уровни кэша: память процесса -> таблица tickers -> биржа.
+        # Одновременные запросы одного тикера выполняют только один запрос к бирже
+        key = (exchange, symbol)
+        try:
+            return self.ticker_cache.get_or_load(
+                key,
+                lambda: self._load_ticker(exchange, symbol, force_update),
+                use_cache=not force_update
+            )
+        except Exception as e:
+            print(f"Ошибка при получении тикера {symbol} с биржи {exchange}: {str(e)}")
+            return None
+
+    def _load_ticker(self, exchange: str, symbol: str, force_update: bool) -> Dict:
+        """Загружает тикер из базы или с биржи и кладет его в кэш в памяти"""
+        key = (exchange, symbol)
         if not force_update:
-            # Проверяем есть ли свежие данные в базе (не старше 30 секунд)
+            # Проверяем есть ли свежие данные в базе (не старше времени жизни кэша)
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             cursor.execute(
-                "SELECT * FROM tickers WHERE exchange = ? AND symbol = ? AND timestamp > ?",
-                (exchange, symbol, int(time.time() * 1000) - 30000)
+                "SELECT timestamp, raw_data FROM tickers WHERE exchange = ? AND symbol = ? AND timestamp > ?",
+                (exchange, symbol, int((time.time() - self.ticker_cache.ttl) * 1000))
             )
             result = cursor.fetchone()
             conn.close()
             
             if result:
-                return json.loads(result[8])  # raw_data
+                ticker = json.loads(result[1])
+                self.ticker_cache.put(key, ticker, result[0] / 1000)
+                return ticker
         
         # Если нет свежих данных или требуется принудительное обновление
-        try:
-            # Получаем данные с биржи
-            exchange_instance = self.exchanges[exchange]
-            market_type = "swap"  # По умолчанию используем futures/swap
-            ticker = exchange_instance.fetch_price(symbol, market_type)
-            
-            # Сохраняем в базу
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                "INSERT OR REPLACE INTO tickers (exchange, symbol, timestamp, bid, ask, last, volume, raw_data) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                (
-                    exchange,
-                    symbol,
-                    ticker['timestamp'],
-                    ticker.get('bid'),
-                    ticker.get('ask'),
-                    ticker.get('last'),
-                    ticker.get('volume'),
-                    json.dumps(ticker)
-                )
+        exchange_instance = self.exchanges[exchange]
+        market_type = "swap"  # По умолчанию используем futures/swap
+        ticker = exchange_instance.fetch_price(symbol, market_type)
+        timestamp = ticker.get('timestamp') or int(time.time() * 1000)
+        self.ticker_cache.put(key, ticker)
+        
+        # Сохраняем в базу
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT OR REPLACE INTO tickers (exchange, symbol, timestamp, bid, ask, last, volume, raw_data) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                exchange,
+                symbol,
+                timestamp,
+                ticker.get('bid'),
+                ticker.get('ask'),
+                ticker.get('last'),
+                ticker.get('volume'),
+                json.dumps(ticker)
             )
-            
-            conn.commit()
-            conn.close()
-            
-            return ticker
-        except Exception as e:
-            print(f"Ошибка при получении тикера {symbol} с биржи {exchange}: {str(e)}")
-            return None
+        )
+        conn.commit()
+        conn.close()
+        
+        return ticker
     
     def get_ohlcv(self, exchange: str, symbol: str, timeframe: str = '1h', 
                  limit: int = 100, since: Optional[int] = None, 
@@ -257,6 +915,7 @@ class MarketDataManager:
                     )
                 
                 conn.commit()
+                self._bump_series_version(exchange, symbol, timeframe)
                 conn.close()
             
             return ohlcv
@@ -359,17 +1018,17 @@ class MarketDataManager:
         results = {}
         
         for exchange_name in exchanges:
-            if exchange_name not in self.exchanges:
-                results[exchange_name] = {"status": "error", "message": "Биржа не поддерживается"}
+            exchange = self.exchanges.get(exchange_name)
+            if exchange is None:
+                results[exchange_name] = {"status": "error", "message": "Биржа не поддерживается или недоступна"}
                 continue
-            
-            exchange = self.exchanges[exchange_name]
+
             exchange_symbols = []
             
             if symbols is None:
                 # Если символы не указаны, получаем их с биржи
                 try:
-                    exchange.load_market()
+                    self.get_markets(exchange_name)
                     if exchange.market_type == "swap":
                         exchange_symbols = exchange.swap
                     else:
@@ -420,7 +1079,7 @@ class MarketDataManager:
         
         for exchange_name, exchange in self.exchanges.items():
             try:
-                exchange.load_market()
+                self.get_markets(exchange_name)
                 symbols = [s for s in exchange.swap if s.endswith(quote_currency)]
                 all_symbols[exchange_name] = symbols
             except Exception:
@@ -468,6 +1127,140 @@ class MarketDataManager:
         
         return sorted(opportunities, key=lambda x: x['difference_percent'], reverse=True)
     
+    def download_ohlcv(self, exchange: str, symbol: str, timeframe: str,
+                       start_ts: int, end_ts: Optional[int] = None, page_size: int = 1000) -> int:
+        """
+        Постранично загружает OHLCV данные с биржи в базу за указанный период.
+        Загружаются только недостающие диапазоны: начало периода до первой сохраненной свечи,
+        пропуски между свечами и хвост после последней. Поэтому прерванную загрузку можно
+        повторить без повторного скачивания, а данные, сохраненные только частично
+        (например, последние свечи из get_ohlcv), дополняются до полного периода.
+        Свечи старше границы, удаленной политикой хранения (ohlcv_pruned), не загружаются.
+        
+        Args:
+            exchange: Название биржи
+            symbol: Символ (криптовалютная пара)
+            timeframe: Временной интервал
+            start_ts: Начало периода в миллисекундах
+            end_ts: Конец периода в миллисекундах (если None, текущее время)
+            page_size: Количество свечей в одном запросе
+            
+        Returns:
+            Количество сохраненных свечей
+        """
+        if exchange not in self.supported_exchanges:
+            raise ValueError(f"Биржа {exchange} не поддерживается")
+        if end_ts is None:
+            end_ts = int(time.time() * 1000)
+        tf_ms = timeframe_to_ms(timeframe)
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT pruned_before FROM ohlcv_pruned WHERE exchange = ? AND symbol = ? AND timeframe = ?",
+                (exchange, symbol, timeframe)
+            )
+            pruned = cursor.fetchone()
+            if pruned:
+                start_ts = max(start_ts, pruned[0])
+            if start_ts > end_ts:
+                return 0
+            ranges = self._missing_ohlcv_ranges(cursor, exchange, symbol, timeframe, start_ts, end_ts, tf_ms)
+
+            exchange_instance = self.exchanges[exchange] if ranges else None
+            stored = 0
+            for range_start, range_end in ranges:
+                since = range_start
+                while since <= range_end:
+                    ohlcv = exchange_instance.fetch_ohlcv(symbol, "swap", timeframe, page_size, since)
+                    ohlcv = [candle for candle in ohlcv if since <= candle[0] <= range_end] if ohlcv else []
+                    if not ohlcv:
+                        break
+                    cursor.executemany(
+                        "INSERT OR REPLACE INTO ohlcv (exchange, symbol, timeframe, timestamp, open, high, low, close, volume) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        [(exchange, symbol, timeframe, *candle[:6]) for candle in ohlcv]
+                    )
+                    conn.commit()
+                    self._bump_series_version(exchange, symbol, timeframe)
+                    stored += len(ohlcv)
+                    since = ohlcv[-1][0] + tf_ms
+        finally:
+            conn.close()
+        return stored
+
+    @staticmethod
+    def _missing_ohlcv_ranges(cursor, exchange: str, symbol: str, timeframe: str,
+                              start_ts: int, end_ts: int, tf_ms: int, chunk_size: int = 10000) -> List[tuple]:
+        """
+        Возвращает диапазоны [from, to] внутри периода, для которых в базе нет свечей.
+        Если сохраненные свечи идут без пропусков от начала периода, остается только хвост
+        после последней свечи. Иначе свечи просматриваются постранично и находятся все пропуски.
+        """
+        cursor.execute(
+            "SELECT COUNT(*), MIN(timestamp), MAX(timestamp) FROM ohlcv "
+            "WHERE exchange = ? AND symbol = ? AND timeframe = ? AND timestamp >= ? AND timestamp <= ?",
+            (exchange, symbol, timeframe, start_ts, end_ts)
+        )
+        count, first_ts, last_ts = cursor.fetchone()
+        if not count:
+            return [(start_ts, end_ts)]
+        if first_ts - start_ts < tf_ms and count == (last_ts - first_ts) // tf_ms + 1:
+            return [(last_ts + tf_ms, end_ts)] if last_ts + tf_ms <= end_ts else []
+
+        ranges = []
+        expected = start_ts
+        after_ts = start_ts - 1
+        while True:
+            cursor.execute(
+                "SELECT timestamp FROM ohlcv "
+                "WHERE exchange = ? AND symbol = ? AND timeframe = ? AND timestamp > ? AND timestamp <= ? "
+                "ORDER BY timestamp LIMIT ?",
+                (exchange, symbol, timeframe, after_ts, end_ts, chunk_size)
+            )
+            rows = cursor.fetchall()
+            for (ts,) in rows:
+                if ts - expected >= tf_ms:
+                    ranges.append((expected, ts - 1))
+                expected = ts + tf_ms
+            if len(rows) < chunk_size:
+                break
+            after_ts = rows[-1][0]
+        if expected <= end_ts:
+            ranges.append((expected, end_ts))
+        return ranges
+
+    def iter_ohlcv(self, exchange: str, symbol: str, timeframe: str, start_ts: int,
+                   end_ts: Optional[int] = None, chunk_size: int = 10000):
+        """
+        Потоково читает OHLCV данные из базы в порядке времени.
+        Каждый шаг выдает не более chunk_size строк [timestamp, open, high, low, close, volume].
+        """
+        if end_ts is None:
+            end_ts = int(time.time() * 1000)
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            last_ts = start_ts - 1
+            while True:
+                # Постраничная выборка по ключу, а не по OFFSET: каждая страница стоит O(chunk_size)
+                cursor.execute(
+                    "SELECT timestamp, open, high, low, close, volume FROM ohlcv "
+                    "WHERE exchange = ? AND symbol = ? AND timeframe = ? AND timestamp > ? AND timestamp <= ? "
+                    "ORDER BY timestamp LIMIT ?",
+                    (exchange, symbol, timeframe, last_ts, end_ts, chunk_size)
+                )
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                yield [list(row) for row in rows]
+                last_ts = rows[-1][0]
+                if len(rows) < chunk_size:
+                    break
+        finally:
+            conn.close()
+
     def get_all_data_for_symbol(self, symbol: str, timeframe: str = '1d', days: int = 30) -> Dict:
         """
         Получает все доступные данные по символу со всех бирж
@@ -481,13 +1274,13 @@ class MarketDataManager:
             Словарь с данными со всех бирж
         """
         since = int((datetime.now() - timedelta(days=days)).timestamp() * 1000)
-        limit = days * 24 // int(timeframe[0]) if timeframe.endswith('h') else days
         
         result = {}
         
         for exchange_name in self.exchanges:
             try:
-                data = self.get_ohlcv(exchange_name, symbol, timeframe, limit, since, force_update=True)
+                self.download_ohlcv(exchange_name, symbol, timeframe, since)
+                data = [candle for chunk in self.iter_ohlcv(exchange_name, symbol, timeframe, since) for candle in chunk]
                 if data:
                     result[exchange_name] = {
                         "ohlcv": data,
@@ -499,6 +1292,114 @@ class MarketDataManager:
                 result[exchange_name] = {"error": str(e)}
         
         return result
+
+    def export_data(self, exchange: str, symbol: str, timeframe: str, days: int = 30,
+                    filename: Optional[str] = None, file_format: str = "csv",
+                    resume: bool = True, chunk_size: int = 50000) -> str:
+        """
+        Экспортирует OHLCV данные в CSV или Parquet файл потоково, с ограниченным
+        расходом памяти: данные догружаются в базу постранично, затем читаются
+        из базы порциями по chunk_size строк и дописываются в файл.
+        
+        Оба формата пишутся во временный файл <имя>.part, который заменяет
+        <имя> только если записана хотя бы одна свеча. Прерванный CSV экспорт
+        продолжается в <имя>.part с последней записанной свечи (прогресс
+        хранится в файле <имя>.progress).
+        Статистика последнего экспорта (строки, секунды, строк в секунду)
+        сохраняется в self.last_export_stats.
+        
+        Args:
+            exchange: Название биржи
+            symbol: Символ (криптовалютная пара)
+            timeframe: Временной интервал
+            days: Количество дней для экспорта
+            filename: Имя файла (если None, генерируется автоматически)
+            file_format: "csv" или "parquet"
+            resume: Продолжить прерванный экспорт в тот же файл
+            chunk_size: Количество строк в одной порции
+            
+        Returns:
+            Путь к созданному файлу
+        """
+        if file_format not in ("csv", "parquet"):
+            raise ValueError(f"Формат {file_format} не поддерживается")
+        start = time.perf_counter()
+        end_ts = int(time.time() * 1000)
+        since = int((datetime.now() - timedelta(days=days)).timestamp() * 1000)
+
+        if filename is None:
+            filename = f"{exchange}_{symbol}_{timeframe}_{datetime.now().strftime('%Y%m%d')}.{file_format}"
+        filepath = os.path.join(self.cache_dir, filename)
+        # Экспорт пишется во временный файл и заменяет filepath только при успехе,
+        # чтобы прерванный или пустой экспорт не затирал предыдущий
+        tmp_path = f"{filepath}.part"
+        progress_path = Path(f"{filepath}.progress")
+
+        self.download_ohlcv(exchange, symbol, timeframe, since, end_ts)
+
+        # Продолжаем прерванный CSV экспорт с последней записанной свечи
+        rows = 0
+        header = True
+        if file_format == "csv" and resume and progress_path.exists() and Path(tmp_path).exists():
+            try:
+                with open(progress_path, "r") as f:
+                    progress = json.load(f)
+                since = max(since, progress["last_timestamp"] + 1)
+                rows = progress["rows"]
+                header = False
+            except Exception:
+                rows = 0
+        columns = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+        if file_format == "csv":
+            with open(tmp_path, "w" if header else "a", newline="") as f:
+                for chunk in self.iter_ohlcv(exchange, symbol, timeframe, since, end_ts, chunk_size):
+                    df = pd.DataFrame(chunk, columns=columns)
+                    df['datetime'] = pd.to_datetime(df['timestamp'], unit='ms')
+                    df.to_csv(f, index=False, header=header)
+                    f.flush()
+                    header = False
+                    rows += len(chunk)
+                    with open(progress_path, "w") as pf:
+                        json.dump({"last_timestamp": chunk[-1][0], "rows": rows}, pf)
+            if rows > 0:
+                os.replace(tmp_path, filepath)
+            else:
+                os.remove(tmp_path)
+        else:
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise ValueError("Для экспорта в Parquet требуется пакет pyarrow")
+            writer = None
+            try:
+                for chunk in self.iter_ohlcv(exchange, symbol, timeframe, since, end_ts, chunk_size):
+                    df = pd.DataFrame(chunk, columns=columns)
+                    df['datetime'] = pd.to_datetime(df['timestamp'], unit='ms')
+                    table = pa.Table.from_pandas(df, preserve_index=False)
+                    if writer is None:
+                        writer = pq.ParquetWriter(tmp_path, table.schema)
+                    writer.write_table(table)
+                    rows += len(chunk)
+            finally:
+                if writer is not None:
+                    writer.close()
+            if writer is not None:
+                os.replace(tmp_path, filepath)
+
+        if rows == 0:
+            raise ValueError(f"Данные не найдены для {symbol} на бирже {exchange}")
+        if progress_path.exists():
+            progress_path.unlink()
+
+        seconds = time.perf_counter() - start
+        self.last_export_stats = {
+            "rows": rows,
+            "seconds": seconds,
+            "rows_per_sec": rows / seconds if seconds > 0 else 0
+        }
+        return filepath
     
     def export_data_to_csv(self, exchange: str, symbol: str, timeframe: str, 
                          days: int = 30, filename: Optional[str] = None) -> str:
@@ -515,21 +1416,4 @@ class MarketDataManager:
         Returns:
             Путь к созданному CSV файлу
         """
-        since = int((datetime.now() - timedelta(days=days)).timestamp() * 1000)
-        limit = days * 24 // int(timeframe[0]) if timeframe.endswith('h') else days
-        
-        data = self.get_ohlcv(exchange, symbol, timeframe, limit, since, force_update=True)
-        
-        if not data:
-            raise ValueError(f"Данные не найдены для {symbol} на бирже {exchange}")
-        
-        if filename is None:
-            filename = f"{exchange}_{symbol}_{timeframe}_{datetime.now().strftime('%Y%m%d')}.csv"
-        
-        filepath = os.path.join(self.cache_dir, filename)
-        
-        df = pd.DataFrame(data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-        df['datetime'] = pd.to_datetime(df['timestamp'], unit='ms')
-        df.to_csv(filepath, index=False)
-        
-        return filepath 
\ No newline at end of file
+        return self.export_data(exchange, symbol, timeframe, days, filename, "csv")
@@ -137,7 +137,8 @@ class Monitor():
                             'Errors Yesterday': monitor["ey"],
                             'Last Traceback': monitor["t"],
                             'Tracebacks Today': monitor["tt"],
-                            'Tracebacks Yesterday': monitor["ty"]
+                            'Tracebacks Yesterday': monitor["ty"],
+                            'Resources': monitor.get("r", [])
                         })
                         if info["PB Version"] == "7":
                             self.d_v7.append(info)
@@ -156,6 +157,7 @@ class Monitor():
             "Last Traceback": None,
             "Memory": st.column_config.NumberColumn(format="%.2f MB"),
             "CPU": st.column_config.NumberColumn(format="%.2f %%"),
+            "Resources": None,
         }
 
         if self.d_v7:
@@ -180,6 +182,7 @@ class Monitor():
                     st.markdown(f":green[Last Info: ] :blue[{self.d_v7[row]['Last Info']}]")
                     st.markdown(f":orange[Last Error: ] :blue[{self.d_v7[row]['Last Error']}]")
                     st.markdown(f":red[Last Traceback: ] :blue[{self.d_v7[row]['Last Traceback']}]")
+                    self.view_resources(self.d_v7[row])
                     if st.button("Restart", key=f"restart_{self.d_v7[row]['Name']}"):
                         v7_instances = st.session_state.v7_instances
                         version = v7_instances.fetch_instance_version(self.d_v7[row]['Name']) + 1
@@ -221,6 +224,7 @@ class Monitor():
                     st.markdown(f":green[Last Info: ] :blue[{self.d_multi[row]['Last Info']}]")
                     st.markdown(f":orange[Last Error: ] :blue[{self.d_multi[row]['Last Error']}]")
                     st.markdown(f":red[Last Traceback: ] :blue[{self.d_multi[row]['Last Traceback']}]")
+                    self.view_resources(self.d_multi[row])
 
         if self.d_single:
             st.subheader(f"Running Single Instances ({len(self.d_single)})")
@@ -244,6 +248,25 @@ class Monitor():
                     st.markdown(f":green[Last Info: ] :blue[{self.d_single[row]['Last Info']}]")
                     st.markdown(f":orange[Last Error: ] :blue[{self.d_single[row]['Last Error']}]")
                     st.markdown(f":red[Last Traceback: ] :blue[{self.d_single[row]['Last Traceback']}]")
+                    self.view_resources(self.d_single[row])
+
+    def view_resources(self, info: dict):
+        """CPU, memory, open files and threads of one instance over the last samples from PBRun"""
+        if not info["Resources"]:
+            return
+        df = pd.DataFrame(info["Resources"], columns=["Time", "CPU", "Memory", "Files", "Threads"])
+        df["Time"] = pd.to_datetime(df["Time"], unit="s")
+        df["Memory"] = df["Memory"]/1024/1024
+        df = df.set_index("Time")
+        col_1, col_2 = st.columns([1,1])
+        with col_1:
+            st.markdown("CPU %")
+            st.line_chart(df["CPU"], height=200)
+            st.markdown("Open Files / Threads")
+            st.line_chart(df[["Files", "Threads"]], height=200)
+        with col_2:
+            st.markdown("Memory MB")
+            st.line_chart(df["Memory"], height=200)
 
     def edit_monitor_config(self):
         # Load config
@@ -667,6 +667,118 @@ class CoinData:
                 ignored_coins.append(symbol)
         return approved_coins, ignored_coins
 
+class CoinSnapshot:
+    """Immutable view of the CoinMarketCap data for all exchanges, shared by every DynamicIgnore of a process.
+
+    It is built once when coindata.json, metadata.json or pbgui.ini change. Every symbol of every exchange is matched
+    to its coin once. After that, approved/ignored lists for a filter are one pass over the precomputed rows, memoized
+    per filter, so instances with the same settings share the result.
+    """
+    _shared = None
+
+    def __init__(self, data: dict, metadata: dict, exchange_symbols: dict, stamp: tuple = None):
+        self.stamp = stamp
+        # exchange -> tuple of (symbol, market_cap, vol/mcap, tags)
+        self.rows = {}
+        # exchange -> frozenset of copy trading symbols / symbols with notice
+        self.cpt = {}
+        self.notices = {}
+        self._filters = {}
+        if not (data and "data" in data and metadata and "data" in metadata):
+            # Like CoinData.list_symbols: without coindata and metadata there are no lists
+            data, metadata, exchange_symbols = {"data": []}, {"data": {}}, {}
+        coins = data["data"]
+        notices = metadata["data"]
+        by_symbol = {}
+        for index, coin in enumerate(coins):
+            by_symbol.setdefault(coin["symbol"], []).append(coin)
+            if coin["id"] == 32461:
+                neiro = by_symbol.setdefault("NEIROETH", [])
+                if coin not in neiro:
+                    neiro.append(coin)
+        # Same coin selection as CoinData.list_symbols: first coin with a (self reported) market cap
+        matched = {}
+        for symbol in set(s for symbols, _ in exchange_symbols.values() for s in symbols):
+            sym = symbol[0:-4]
+            if sym in SYMBOLMAP:
+                sym = SYMBOLMAP[sym]
+            for coin in by_symbol.get(sym, []):
+                if coin["quote"]["USD"]["market_cap"]:
+                    matched[symbol] = (coin, coin["quote"]["USD"]["market_cap"])
+                    break
+                elif coin["self_reported_market_cap"]:
+                    matched[symbol] = (coin, coin["self_reported_market_cap"])
+                    break
+        for exchange, (symbols, symbols_cpt) in exchange_symbols.items():
+            rows = []
+            symbols_notice = []
+            for symbol in symbols:
+                if symbol in matched:
+                    coin, market_cap = matched[symbol]
+                    if notices.get(str(coin["id"]), {}).get("notice"):
+                        symbols_notice.append(symbol)
+                    rows.append((symbol, market_cap, coin["quote"]["USD"]["volume_24h"]/market_cap, frozenset(coin["tags"])))
+                else:
+                    rows.append((symbol, 0, 0, frozenset()))
+            self.rows[exchange] = tuple(rows)
+            self.cpt[exchange] = frozenset(symbols_cpt)
+            self.notices[exchange] = frozenset(symbols_notice)
+
+    @classmethod
+    def load(cls):
+        """Build a snapshot from data/coindata and the exchange symbols in pbgui.ini"""
+        coindata = CoinData()
+        coindata.load_data()
+        coindata.load_metadata()
+        pb_config = configparser.ConfigParser()
+        pb_config.read('pbgui.ini')
+        exchange_symbols = {}
+        for exchange in Exchanges.list():
+            ini_exchange = "kucoinfutures" if exchange == "kucoin" else exchange
+            symbols = []
+            if pb_config.has_option("exchanges", f'{ini_exchange}.swap'):
+                symbols = eval(pb_config.get("exchanges", f'{ini_exchange}.swap'))
+            symbols_cpt = symbols
+            if exchange in ["binance", "bybit", "bitget"] and pb_config.has_option("exchanges", f'{ini_exchange}.cpt'):
+                symbols_cpt = eval(pb_config.get("exchanges", f'{ini_exchange}.cpt'))
+            exchange_symbols[exchange] = (tuple(symbols), tuple(symbols_cpt))
+        return cls(coindata.data, coindata.metadata, exchange_symbols, cls.source_stamp())
+
+    @staticmethod
+    def source_stamp():
+        stamp = []
+        for file in [Path(f'{Path.cwd()}/data/coindata/coindata.json'), Path(f'{Path.cwd()}/data/coindata/metadata.json'), Path('pbgui.ini')]:
+            try:
+                stamp.append(file.stat().st_mtime)
+            except OSError:
+                stamp.append(0)
+        return tuple(stamp)
+
+    @classmethod
+    def shared(cls):
+        """The snapshot of this process, rebuilt only when the source files changed"""
+        if cls._shared is None or cls._shared.stamp != cls.source_stamp():
+            cls._shared = cls.load()
+        return cls._shared
+
+    def filter(self, exchange: str, market_cap: float = 0, vol_mcap: float = 10.0, only_cpt: bool = False, notices_ignore: bool = False, tags: list = None):
+        """Return (approved_coins, ignored_coins) as sorted tuples, with the same rules as CoinData.list_symbols"""
+        tags = frozenset(tags or [])
+        key = (exchange, market_cap, vol_mcap, only_cpt, notices_ignore, tags)
+        if key not in self._filters:
+            approved = []
+            ignored = []
+            cpt = self.cpt.get(exchange, frozenset())
+            notices = self.notices.get(exchange, frozenset())
+            for symbol, mcap, ratio, symbol_tags in self.rows.get(exchange, ()):
+                if ((not only_cpt or symbol in cpt) and not (notices_ignore and symbol in notices)
+                        and mcap >= market_cap*1000000 and ratio < vol_mcap and (not tags or tags & symbol_tags)):
+                    approved.append(symbol)
+                else:
+                    ignored.append(symbol)
+            self._filters[key] = (tuple(sorted(approved)), tuple(sorted(ignored)))
+        return self._filters[key]
+
 def main():
     pbgdir = Path.cwd()
     dest = Path(f'{pbgdir}/data/logs')
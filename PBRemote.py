@@ -877,9 +877,9 @@ class PBRemote():
         timestamp = round(datetime.now().timestamp())
         if timestamp - self.systemts > 3600:
             self.local_run.load_versions()
-            self.local_run.load_git_commits()
-            self.local_run.has_upgrades()
             self.local_run.has_reboot()
+            # git and apt-get run in the background, the next alive file picks up the result
+            self.local_run.load_system_info_background()
             self.systemts = timestamp
         if timestamp - self.alivets < 60:
             return
@@ -11,7 +11,7 @@ import configparser
 import shlex
 import sys
 from pathlib import Path, PurePath
-from time import sleep, mktime
+from time import sleep, mktime, monotonic
 import glob
 import json
 import hjson
@@ -22,20 +22,399 @@ from shutil import copy, copytree, rmtree
 import os
 import traceback
 import uuid
+import hashlib
+import threading
+from contextlib import contextmanager
 from Status import InstanceStatus, InstancesStatus
-from PBCoinData import CoinData
+from PBCoinData import CoinSnapshot
+from FileWatcher import FileWatcher
+from LogSink import start_log_sink
+from WriteCoalescer import coalescer
+from pbgui_purefunc import load_ini
 import re
 
+class ProcessTable():
+    """One snapshot of the running passivbot processes, shared by all instances.
+
+    PBRun refreshes the snapshot once per tick with a single pass over the process table and indexes it by
+    (user, symbol) for single, by user for multi and v7 and by log file for LogSink. Bots spawned by PBRun itself are kept as
+    psutil.Popen handles and verified with poll(), without reading the process table at all. The handle of a process
+    stays the same object for its whole life, so ResourceSampler can measure CPU usage between two samples.
+    """
+    MAX_AGE = 5
+
+    def __init__(self):
+        self.snapshot_ts = None
+        self.processes = {"single": {}, "multi": {}, "v7": {}, "sink": {}}
+        self.spawned = {}
+
+    @staticmethod
+    def config_owner(path: str):
+        """Name of the instance directory of a config path (works for / and \\ separators)"""
+        parts = re.split(r'[\\/]', str(path))
+        return parts[-2] if len(parts) > 1 else None
+
+    def refresh(self):
+        processes = {"single": {}, "multi": {}, "v7": {}, "sink": {}}
+        # Keep the handles of known processes, cpu_percent() measures from the previous call on the same handle
+        previous = {process.pid: process for kind in self.processes.values() for process in kind.values()}
+        for process in psutil.process_iter(['cmdline']):
+            cmdline = process.info['cmdline']
+            if not cmdline or len(cmdline) < 3:
+                continue
+            if previous.get(process.pid) == process:
+                process = previous[process.pid]
+            if any("LogSink.py" in sub for sub in cmdline):
+                sink = [index for index, sub in enumerate(cmdline) if "LogSink.py" in sub][0]
+                if sink + 1 < len(cmdline):
+                    processes["sink"][os.path.normpath(cmdline[sink + 1])] = process
+            elif any("passivbot_multi.py" in sub for sub in cmdline):
+                processes["multi"][self.config_owner(cmdline[-1])] = process
+            elif any("passivbot.py" in sub for sub in cmdline):
+                processes["single"][(cmdline[-3], cmdline[-2])] = process
+            elif any("main.py" in sub for sub in cmdline) and cmdline[-1].endswith("config_run.json"):
+                processes["v7"][self.config_owner(cmdline[-1])] = process
+        self.processes = processes
+        self.snapshot_ts = monotonic()
+
+    def spawn(self, kind: str, key, cmd: list, **kwargs):
+        """Start a bot and remember its handle"""
+        # The bot reads its config and coin lists on start, write what is still pending in this batch first
+        coalescer.flush()
+        process = psutil.Popen(cmd, **kwargs)
+        self.spawned[(kind, key)] = process
+        return process
+
+    def find(self, kind: str, key):
+        """Return the running process of an instance or None"""
+        process = self.spawned.get((kind, key))
+        if process is not None:
+            if process.poll() is None:
+                return process
+            del self.spawned[(kind, key)]
+        if self.snapshot_ts is None or monotonic() - self.snapshot_ts > self.MAX_AGE:
+            self.refresh()
+        process = self.processes[kind].get(key)
+        if process is not None:
+            try:
+                if process.is_running() and process.status() != psutil.STATUS_ZOMBIE:
+                    return process
+            except psutil.Error:
+                pass
+            self.processes[kind].pop(key, None)
+        return None
+
+    def forget(self, kind: str, key):
+        """Drop a stopped instance from the snapshot"""
+        self.spawned.pop((kind, key), None)
+        self.processes[kind].pop(key, None)
+
+process_table = ProcessTable()
+
+class StartScheduler():
+    """Starts bots in the background instead of one after the other with a blocking wait.
+
+    start() of an instance only queues it, step() is called on every pass of the PBRun loop and launches queued bots:
+    at most start_concurrency bots are starting at the same time and bots on the same exchange are launched at least
+    start_spacing seconds apart. A bot counts as starting until it has been running for start_confirm seconds. A bot
+    that exits before is launched again later, with a delay that doubles on every failure.
+    Settings are read from [pbrun] in pbgui.ini.
+    """
+    DEFAULTS = {
+        "start_concurrency": 3,
+        "start_spacing": 10,
+        "start_confirm": 10,
+    }
+    MAX_BACKOFF = 300
+
+    def __init__(self):
+        self.queue = {}
+        self.starting = {}
+        self.retry = {}
+        self.last_launch = {}
+        self.api_keys = {}
+        self.concurrency = None
+        self.spacing = None
+        self.confirm = None
+
+    def load_settings(self):
+        settings = {}
+        for key, default in self.DEFAULTS.items():
+            value = load_ini("pbrun", key)
+            settings[key] = int(value) if value != "" else default
+        self.concurrency = max(settings["start_concurrency"], 1)
+        self.spacing = max(settings["start_spacing"], 0)
+        self.confirm = max(settings["start_confirm"], 1)
+
+    def request(self, kind: str, key, instance):
+        """Queue an instance for start. A newer instance object for the same bot replaces the queued one."""
+        if (kind, key) in self.starting:
+            return
+        self.queue[(kind, key)] = instance
+
+    def cancel(self, kind: str, key):
+        """Forget a queued start, used when an instance is stopped or removed before it was launched"""
+        self.queue.pop((kind, key), None)
+        self.starting.pop((kind, key), None)
+        self.retry.pop((kind, key), None)
+
+    def pending(self, kind: str, key):
+        return (kind, key) in self.queue
+
+    def busy(self):
+        """True while bots are queued or starting, PBRun then checks again within a second"""
+        return bool(self.queue or self.starting)
+
+    def exchange(self, instance):
+        """Exchange of the instance user from api-keys.json, or the user if it is not known"""
+        api_path = Path(f'{instance.pbdir}/api-keys.json')
+        try:
+            mtime = api_path.stat().st_mtime_ns
+        except OSError:
+            return instance.user
+        cached = self.api_keys.get(api_path)
+        if cached is None or cached[0] != mtime:
+            try:
+                with open(api_path, "r", encoding='utf-8') as f:
+                    api_keys = json.load(f)
+                cached = (mtime, {user: keys.get("exchange") for user, keys in api_keys.items() if isinstance(keys, dict)})
+            except (OSError, ValueError):
+                cached = (mtime, {})
+            self.api_keys[api_path] = cached
+        return cached[1].get(instance.user) or instance.user
+
+    def step(self):
+        if self.concurrency is None:
+            self.load_settings()
+        now = monotonic()
+        # Confirm bots that are starting
+        for (kind, key), (instance, launched) in list(self.starting.items()):
+            if process_table.find(kind, key):
+                if now - launched >= self.confirm:
+                    del self.starting[(kind, key)]
+                    self.retry.pop((kind, key), None)
+                continue
+            del self.starting[(kind, key)]
+            failures = self.retry.get((kind, key), (0, 0))[0] + 1
+            delay = min(max(self.spacing, 1) * 2 ** failures, self.MAX_BACKOFF)
+            self.retry[(kind, key)] = (failures, now + delay)
+            print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Warning: {instance.path} exited while starting, next start in {delay}s')
+        # Launch queued bots
+        for (kind, key), instance in list(self.queue.items()):
+            if len(self.starting) >= self.concurrency:
+                break
+            if self.retry.get((kind, key), (0, 0))[1] > now:
+                continue
+            exchange = self.exchange(instance)
+            if exchange in self.last_launch and now - self.last_launch[exchange] < self.spacing:
+                continue
+            del self.queue[(kind, key)]
+            try:
+                instance.launch()
+            except Exception as e:
+                print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: Can not start {instance.path} {e}')
+                traceback.print_exc()
+                failures = self.retry.get((kind, key), (0, 0))[0] + 1
+                self.retry[(kind, key)] = (failures, now + min(max(self.spacing, 1) * 2 ** failures, self.MAX_BACKOFF))
+                continue
+            self.last_launch[exchange] = monotonic()
+            self.starting[(kind, key)] = (instance, monotonic())
+
+start_scheduler = StartScheduler()
+
+class ResourceSampler():
+    """Samples CPU, memory, open files and threads of every running bot at a fixed cadence.
+
+    Every sample_interval seconds each bot is sampled through its ProcessTable handle and the sample is added to the
+    rolling time series of its Monitor (the last sample_keep samples, saved as "r" in monitor.json). The handle of a
+    new bot is primed on the next tick, so its first sample already has a real cpu_percent() instead of 0.
+    Settings are read from [pbrun] in pbgui.ini.
+    """
+    DEFAULTS = {
+        "sample_interval": 60,
+        "sample_keep": 60,
+    }
+
+    def __init__(self):
+        self.handles = {}
+        self.next_sample = 0
+        self.interval = None
+        self.keep = None
+
+    def load_settings(self):
+        interval = load_ini("pbrun", "sample_interval")
+        keep = load_ini("pbrun", "sample_keep")
+        self.interval = max(int(interval) if interval != "" else self.DEFAULTS["sample_interval"], 5)
+        self.keep = max(int(keep) if keep != "" else self.DEFAULTS["sample_keep"], 1)
+
+    @staticmethod
+    def sample(process):
+        with process.oneshot():
+            cpu = process.cpu_percent()
+            memory = process.memory_info()
+            files = process.num_handles() if platform.system() == "Windows" else process.num_fds()
+            threads = process.num_threads()
+        return cpu, memory, files, threads
+
+    def step(self, instances: list):
+        if self.interval is None:
+            self.load_settings()
+        now = monotonic()
+        due = now >= self.next_sample
+        if due:
+            self.next_sample = now + self.interval
+        ts = int(datetime.now().timestamp())
+        handles = {}
+        for instance in instances:
+            process = instance.pid()
+            if not process:
+                continue
+            handles[instance.path] = process
+            try:
+                if self.handles.get(instance.path) is not process:
+                    # New handle: cpu_percent() starts measuring here, the memory is already valid
+                    process.cpu_percent()
+                    instance.monitor.memory = process.memory_info()
+                elif due:
+                    instance.monitor.add_sample(ts, *self.sample(process), self.keep)
+            except psutil.Error:
+                handles.pop(instance.path)
+        self.handles = handles
+
+resource_sampler = ResourceSampler()
+
+class LoopTimer():
+    """Measures the phases of every pass of the PBRun loop and exports them to a metrics file.
+
+    Each phase (activate, status, watch, log, clean) is summed up over one pass and compared with its budget in
+    seconds. A phase over budget is logged when the pass ends. The watchdog thread also logs a phase that is still
+    running after its budget, with the stack of the main thread, so a hung psutil or file call can be found.
+    The metrics file is written once a minute and after every pass with a phase over budget.
+    """
+    BUDGETS = {
+        "activate": 2.0,
+        "status": 10.0,
+        "watch": 2.0,
+        "log": 2.0,
+        "clean": 1.0,
+    }
+    SAVE_INTERVAL = 60
+
+    def __init__(self, metrics_file: Path):
+        self.metrics_file = metrics_file
+        self.stats = {name: {"last": 0.0, "max": 0.0, "total": 0.0, "count": 0, "over": 0} for name in self.BUDGETS}
+        self.pass_stats = {"last": 0.0, "max": 0.0, "count": 0}
+        self.current = None
+        self.reported = None
+        self.pass_phases = {}
+        self.pass_start = None
+        self.next_save = 0
+        self.watchdog = None
+
+    def begin(self):
+        self.pass_phases = {}
+        self.pass_start = monotonic()
+
+    @contextmanager
+    def phase(self, name: str):
+        started = monotonic()
+        self.current = (name, started)
+        try:
+            yield
+        finally:
+            self.current = None
+            self.pass_phases[name] = self.pass_phases.get(name, 0.0) + monotonic() - started
+
+    def end(self):
+        if self.pass_start is None:
+            return
+        over = []
+        for name, seconds in self.pass_phases.items():
+            stats = self.stats[name]
+            stats["last"] = seconds
+            stats["max"] = max(stats["max"], seconds)
+            stats["total"] += seconds
+            stats["count"] += 1
+            if seconds > self.BUDGETS[name]:
+                stats["over"] += 1
+                over.append(f'{name} {seconds:.2f}s')
+        seconds = monotonic() - self.pass_start
+        self.pass_stats["last"] = seconds
+        self.pass_stats["max"] = max(self.pass_stats["max"], seconds)
+        self.pass_stats["count"] += 1
+        self.pass_start = None
+        if over:
+            print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Warning: PBRun loop over budget: {", ".join(over)}')
+        if over or monotonic() >= self.next_save:
+            self.save()
+
+    def save(self):
+        self.next_save = monotonic() + self.SAVE_INTERVAL
+        phases = {}
+        for name, stats in self.stats.items():
+            phases[name] = {
+                "budget": self.BUDGETS[name],
+                "last": round(stats["last"], 4),
+                "avg": round(stats["total"] / stats["count"], 4) if stats["count"] else 0.0,
+                "max": round(stats["max"], 4),
+                "count": stats["count"],
+                "over": stats["over"],
+            }
+        metrics = {
+            "ts": int(datetime.now().timestamp()),
+            "pass": {
+                "last": round(self.pass_stats["last"], 4),
+                "max": round(self.pass_stats["max"], 4),
+                "count": self.pass_stats["count"],
+            },
+            "phases": phases,
+        }
+        coalescer.write_json(self.metrics_file, metrics, indent=4)
+
+    def start_watchdog(self):
+        self.watchdog = threading.Thread(target=self.watch, daemon=True)
+        self.watchdog.start()
+
+    def watch(self):
+        main_thread = threading.main_thread()
+        while True:
+            sleep(1)
+            current = self.current
+            if current is None or current == self.reported:
+                continue
+            name, started = current
+            running = monotonic() - started
+            if running > self.BUDGETS[name]:
+                self.reported = current
+                frame = sys._current_frames().get(main_thread.ident)
+                stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+                print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Warning: PBRun phase {name} still running after {running:.1f}s\n{stack}', end="")
+
+# passivbot log line with timestamp and level: "2024-11-20T10:00:00 INFO     message"
+LOG_LINE = re.compile(r'\s*(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)\s+(?:ERROR|INFO)(?:\s|$)')
+
 class Monitor():
+    """Parse passivbot.log incrementally and save the counters to monitor.json.
+
+    The log is read in chunks of CHUNK_SIZE, at most MAX_READ bytes per call, a partial last line is left for the
+    next call. The position and inode of the log are saved in monitor.json together with the counters, so after a
+    restart parsing continues where it stopped. Without a saved position the start of yesterday is found by bisection.
+    When the inode changes, the rest of the rotated passivbot.log.old is read before the new log.
+    """
+    CHUNK_SIZE = 1048576
+    MAX_READ = 16777216
+
     def __init__(self):
         self.path = None
         self.user = None
         self.version = None
         self.pb_version = None
         self.log_lp = None
+        self.log_inode = None
         self.start_time = 0
         self.memory = 0
         self.cpu = 0
+        self.resources = []
         self.log_error = None
         self.log_info = None
         self.log_traceback = None
@@ -54,106 +433,237 @@ class Monitor():
         self.pnl_counter_today = 0
         self.pnl_counter_yesterday = 0
         self.init_found = False
+        self.tb_found = False
+        self.yesterday = True
+
+    def load_monitor(self):
+        """Restore counters and log position from monitor.json. Returns False if there is nothing to restore."""
+        monitor_file = Path(f'{self.path}/monitor.json')
+        if not monitor_file.exists():
+            return False
+        try:
+            with open(monitor_file, "r", encoding='utf-8') as f:
+                monitor = json.load(f)
+            if "lp" not in monitor:
+                return False
+            self.log_info = monitor["i"]
+            self.infos_today = monitor["it"]
+            self.infos_yesterday = monitor["iy"]
+            self.log_error = monitor["e"]
+            self.errors_today = monitor["et"]
+            self.errors_yesterday = monitor["ey"]
+            self.log_traceback = monitor["t"]
+            self.tracebacks_today = monitor["tt"]
+            self.tracebacks_yesterday = monitor["ty"]
+            self.pnl_today = monitor["pt"]
+            self.pnl_yesterday = monitor["py"]
+            self.pnl_counter_today = monitor["ct"]
+            self.pnl_counter_yesterday = monitor["cy"]
+            self.log_lp = monitor["lp"]
+            self.log_inode = monitor["li"]
+            self.log_watch_ts = monitor["lw"]
+            if "r" in monitor:
+                # Samples taken since PBRun started are newer than the saved ones
+                since = self.resources[0][0] if self.resources else None
+                self.resources = [sample for sample in monitor["r"] if since is None or sample[0] < since] + self.resources
+            return True
+        except Exception as e:
+            print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Warning: Can not restore {monitor_file}: {e}')
+            return False
+
+    def add_sample(self, ts: int, cpu: float, memory, files: int, threads: int, keep: int):
+        """Add one resource sample, keep the last keep samples"""
+        self.cpu = cpu
+        self.memory = memory
+        self.resources.append([ts, round(cpu, 1), memory[0], files, threads])
+        del self.resources[:-keep]
+
+    @staticmethod
+    def first_timestamp(f, offset: int):
+        """Timestamp of the first log line starting at or after offset"""
+        f.seek(offset)
+        if offset > 0:
+            f.readline()
+        for _ in range(1000):
+            line = f.readline()
+            if not line:
+                return None
+            match = LOG_LINE.match(line.decode('utf-8', errors='replace'))
+            if match:
+                return match.group(1)
+        return None
+
+    def find_offset(self, f, size: int, since: str):
+        """Bisect the log for a line start shortly before the first line with timestamp >= since"""
+        lo = 0
+        hi = size
+        while hi - lo > self.CHUNK_SIZE:
+            mid = (lo + hi) // 2
+            ts = self.first_timestamp(f, mid)
+            if ts is None or ts >= since:
+                hi = mid
+            else:
+                lo = mid
+        if lo == 0:
+            return 0
+        f.seek(lo)
+        f.readline()
+        return f.tell()
 
     def watch_log(self):
-        yesterday = True
         logfile = Path(f'{self.path}/passivbot.log')
-        if logfile.exists():
-            seek = False
-            if not self.log_lp:
-                self.log_lp = 0
+        try:
+            stat = logfile.stat()
+        except OSError:
+            return
+        if self.log_lp is None:
+            self.load_monitor()
+        today = date.today()
+        today_ts = int(mktime(today.timetuple()))
+        # Log timestamps are local ISO strings and compare as strings
+        today_iso = f'{today.isoformat()}T00:00:00'
+        yesterday_iso = f'{(today - timedelta(days=1)).isoformat()}T00:00:00'
+        seek = False
+        if self.log_watch_ts != 0 and self.log_watch_ts < today_ts:
+            self.log_error = None
+            self.log_info = None
+            self.log_traceback = None
+            self.tb_found = False
+            self.errors_yesterday = self.errors_today
+            self.errors_today = 0
+            self.infos_yesterday = self.infos_today
+            self.infos_today = 0
+            self.tracebacks_yesterday = self.tracebacks_today
+            self.tracebacks_today = 0
+            self.pnl_yesterday = self.pnl_today
+            self.pnl_today = 0
+            self.pnl_counter_yesterday = self.pnl_counter_today
+            self.pnl_counter_today = 0
+        if self.log_lp is not None and self.log_inode is not None and self.log_inode != stat.st_ino:
+            # Log was rotated, the old segment is followed by its inode and read to the end first
+            rotated = Path(f'{logfile}.old')
+            try:
+                if rotated.stat().st_ino == self.log_inode:
+                    with open(rotated, "rb") as f:
+                        seek, done = self.read_log(f, seek, today_iso, yesterday_iso)
+                    if not done:
+                        self.log_watch_ts = int(datetime.now().timestamp())
+                        self.save_monitor()
+                        return
+            except OSError:
+                pass
+            self.log_lp = 0
+            self.log_inode = stat.st_ino
+        with open(logfile, "rb") as f:
+            stat = os.fstat(f.fileno())
+            if self.log_lp is None:
+                # First run: skip to the start of yesterday
+                self.log_lp = self.find_offset(f, stat.st_size, yesterday_iso)
                 seek = True
-            current_position = logfile.stat().st_size
-            with open(logfile, "r") as f:
-                f.seek(self.log_lp)
-                new_content = f.read().splitlines()
-            self.log_lp = current_position
-            tb_found = False
-            today_ts = int(mktime(date.today().timetuple()))
-            yesterday_ts = today_ts - 86400
-            if self.log_watch_ts != 0 and self.log_watch_ts < today_ts:
-                self.log_error = None
-                self.log_info = None
-                self.log_traceback = None
-                self.errors_yesterday = self.errors_today
-                self.errors_today = 0
-                self.infos_yesterday = self.infos_today
-                self.infos_today = 0
-                self.tracebacks_yesterday = self.tracebacks_today
-                self.tracebacks_today = 0
-                self.pnl_yesterday = self.pnl_today
-                self.pnl_today = 0
-                self.pnl_counter_yesterday = self.pnl_counter_today
-                self.pnl_counter_today = 0
-            for line in new_content:
-                elements = line.split()
-                if len(elements) > 1:
-                    if elements[1] == "ERROR" or elements[1] == "INFO":
-                        # check elements[0] for correct isoformat
-                        if len(elements[0]) == 19:
-                            if elements[0][4] == "-" and elements[0][7] == "-" and elements[0][10] == "T" and elements[0][13] == ":" and elements[0][16] == ":":
-                                ts = int(datetime.fromisoformat(elements[0]).timestamp())
-                                if ts < yesterday_ts:
-                                    continue
-                                else:
-                                    seek = False
-                                if ts < today_ts:
-                                    yesterday = True
-                                else:
-                                    yesterday = False
-                if seek:
+            elif self.log_inode != stat.st_ino or stat.st_size < self.log_lp:
+                # New or truncated log
+                self.log_lp = 0
+            self.log_inode = stat.st_ino
+            self.read_log(f, seek, today_iso, yesterday_iso)
+        self.log_watch_ts = int(datetime.now().timestamp())
+        self.save_monitor()
+
+    def read_log(self, f, seek: bool, today_iso: str, yesterday_iso: str):
+        """Parse f from log_lp in chunks. Returns seek and whether the end of the file was reached."""
+        f.seek(self.log_lp)
+        rest = b''
+        remaining = self.MAX_READ
+        done = False
+        while remaining > 0:
+            chunk = f.read(min(self.CHUNK_SIZE, remaining))
+            if not chunk:
+                done = True
+                break
+            remaining -= len(chunk)
+            data = rest + chunk
+            cut = data.rfind(b'\n')
+            if cut < 0:
+                if len(data) < self.CHUNK_SIZE:
+                    rest = data
                     continue
-                if tb_found:
-                    if not "ERROR" in line and not "INFO" in line and not "Traceback" in line:
-                        self.log_traceback.append(line)
-                    else:
-                        tb_found = False
-                        self.tracebacks_today += 1
-                if "ERROR" in line:
-                    if yesterday:
-                        self.errors_yesterday += 1
-                    else:
-                        self.log_error = line
-                        self.errors_today += 1
-                elif "INFO" in line:                 
-                    if yesterday:
-                        self.infos_yesterday += 1
-                    else:
-                        self.log_info = line
-                        self.infos_today += 1
-                    # Skip PNLs after restart bot
-                    if "initiating pnl" in line:
-                        self.init_found = True
-                    if "starting execution loop" in line or "done initiating bot" in line:
-                        self.init_found = False
-                    if self.init_found:
-                        continue
-                    if "new pnl" in line:
-                        if len(elements) == 7:
+                # Overlong line without newline, parse it as it is
+                cut = len(data)
+            rest = data[cut + 1:]
+            seek = self.parse_lines(data[:cut].decode('utf-8', errors='replace').split('\n'), seek, today_iso, yesterday_iso)
+        # A partial last line is parsed on the next call
+        self.log_lp = f.tell() - len(rest)
+        return seek, done
+
+    def parse_lines(self, lines: list, seek: bool, today_iso: str, yesterday_iso: str):
+        match = LOG_LINE.match
+        yesterday = self.yesterday
+        tb_found = self.tb_found
+        for line in lines:
+            if line.endswith('\r'):
+                line = line[:-1]
+            timestamp = match(line)
+            if timestamp:
+                ts = timestamp.group(1)
+                if ts < yesterday_iso:
+                    continue
+                seek = False
+                yesterday = ts < today_iso
+            if seek:
+                continue
+            if tb_found:
+                if not "ERROR" in line and not "INFO" in line and not "Traceback" in line:
+                    self.log_traceback.append(line)
+                else:
+                    tb_found = False
+                    self.tracebacks_today += 1
+            if "ERROR" in line:
+                if yesterday:
+                    self.errors_yesterday += 1
+                else:
+                    self.log_error = line
+                    self.errors_today += 1
+            elif "INFO" in line:
+                if yesterday:
+                    self.infos_yesterday += 1
+                else:
+                    self.log_info = line
+                    self.infos_today += 1
+                # Skip PNLs after restart bot
+                if "initiating pnl" in line:
+                    self.init_found = True
+                if "starting execution loop" in line or "done initiating bot" in line:
+                    self.init_found = False
+                if self.init_found:
+                    continue
+                if "new pnl" in line:
+                    elements = line.split()
+                    if len(elements) == 7:
+                        if yesterday:
+                            self.pnl_yesterday += float(elements[5])
+                            self.pnl_counter_yesterday += int(elements[2])
+                        else:
+                            self.pnl_today += float(elements[5])
+                            self.pnl_counter_today += int(elements[2])
+                if "balance" in line:
+                    elements = line.split()
+                    if len(elements) == 6:
+                        if elements[4] == "->":
                             if yesterday:
-                                self.pnl_yesterday += float(elements[5])
-                                self.pnl_counter_yesterday += int(elements[2])
+                                self.pnl_yesterday += (float(elements[5]) - float(elements[3]))
+                                self.pnl_counter_yesterday += 1
                             else:
-                                self.pnl_today += float(elements[5])
-                                self.pnl_counter_today += int(elements[2])
-                    if "balance" in line:
-                        if len(elements) == 6:
-                            if elements[4] == "->":
-                                if yesterday:
-                                    self.pnl_yesterday += (float(elements[5]) - float(elements[3]))
-                                    self.pnl_counter_yesterday += 1
-                                else:
-                                    self.pnl_today += (float(elements[5]) - float(elements[3]))
-                                    self.pnl_counter_today += 1
-                elif "Traceback" in line:
-                    if yesterday:
-                        self.tracebacks_yesterday += 1
-                    else:
-                        self.log_traceback = []
-                        self.log_traceback.append(line)
-                        tb_found = True
-            self.log_watch_ts = int(datetime.now().timestamp())
-            self.save_monitor()
+                                self.pnl_today += (float(elements[5]) - float(elements[3]))
+                                self.pnl_counter_today += 1
+            elif "Traceback" in line:
+                if yesterday:
+                    self.tracebacks_yesterday += 1
+                else:
+                    self.log_traceback = []
+                    self.log_traceback.append(line)
+                    tb_found = True
+        self.yesterday = yesterday
+        self.tb_found = tb_found
+        return seek
 
     def save_monitor(self):
         monitor_file = Path(f'{self.path}/monitor.json')
@@ -177,6 +687,8 @@ class Monitor():
             # py = pnl_yesterday
             # ct = pnl_counter_today
             # cy = pnl_counter_yesterday
+            # lp = log position, li = log inode, lw = log watch timestamp
+            # r = resources [[timestamp, cpu, rss, open files, threads], ...]
             "u": self.user,
             "p": self.pb_version,
             "v": self.version,
@@ -195,47 +707,58 @@ class Monitor():
             "pt": self.pnl_today,
             "py": self.pnl_yesterday,
             "ct": self.pnl_counter_today,
-            "cy": self.pnl_counter_yesterday
+            "cy": self.pnl_counter_yesterday,
+            "lp": self.log_lp,
+            "li": self.log_inode,
+            "lw": self.log_watch_ts,
+            "r": self.resources
             })
-        with open(monitor_file, "w", encoding='utf-8') as f:
-            json.dump(monitor, f)
+        coalescer.write_json(monitor_file, monitor)
 
 class DynamicIgnore():
     def __init__(self):
         self.path = None
-        self.coindata = CoinData()
+        self.exchange = None
+        self.market_cap = 0
+        self.vol_mcap = 10.0
+        self.only_cpt = False
+        self.notices_ignore = False
         self.ignored_coins = []
         self.ignored_coins_long = []
         self.ignored_coins_short = []
         self.approved_coins = []
         self.approved_coins_long = []
         self.approved_coins_short = []
-    
+
+    def coins(self):
+        """Approved and ignored coins for this instance from the CoinData snapshot shared by all instances"""
+        approved_coins, ignored_coins = CoinSnapshot.shared().filter(self.exchange, self.market_cap, self.vol_mcap, self.only_cpt, self.notices_ignore)
+        return list(approved_coins), list(ignored_coins)
+
     def watch(self):
-        if self.coindata.has_new_data():
-            self.coindata.list_symbols()
-        # create list of self.coindata.ignored_coins + self.ignored_coins_long + self.ignored_coins_short
-        ignored_coins = list(set(self.coindata.ignored_coins + self.ignored_coins_long + self.ignored_coins_short))
+        coin_approved, coin_ignored = self.coins()
+        # create list of coin_ignored + self.ignored_coins_long + self.ignored_coins_short
+        ignored_coins = list(set(coin_ignored + self.ignored_coins_long + self.ignored_coins_short))
         if not self.ignored_coins and self.ignored_coins != ignored_coins:
-            removed_coins = set(self.ignored_coins) - set(self.coindata.ignored_coins)
+            removed_coins = set(self.ignored_coins) - set(coin_ignored)
             removed_coins = [*removed_coins]
             removed_coins.sort()
-            added_coins = set(self.coindata.ignored_coins) - set(self.ignored_coins)
+            added_coins = set(coin_ignored) - set(self.ignored_coins)
             added_coins = [*added_coins]
             added_coins.sort()
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Change ignored_coins {self.path} Removed: {removed_coins} Added: {added_coins}')
-            self.ignored_coins = self.coindata.ignored_coins
-        # create list of self.coindata.approved_coins + self.approved_coins_long + self.approved_coins_short
-        approved_coins = list(set(self.coindata.approved_coins + self.approved_coins_long + self.approved_coins_short))
+            self.ignored_coins = coin_ignored
+        # create list of coin_approved + self.approved_coins_long + self.approved_coins_short
+        approved_coins = list(set(coin_approved + self.approved_coins_long + self.approved_coins_short))
         if not self.approved_coins and self.approved_coins != approved_coins:
-            removed_coins = set(self.approved_coins) - set(self.coindata.approved_coins)
+            removed_coins = set(self.approved_coins) - set(coin_approved)
             removed_coins = [*removed_coins]
             removed_coins.sort()
-            added_coins = set(self.coindata.approved_coins) - set(self.approved_coins)
+            added_coins = set(coin_approved) - set(self.approved_coins)
             added_coins = [*added_coins]
             added_coins.sort()
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Change approved_coins {self.path} Removed: {removed_coins} Added: {added_coins}')
-            self.approved_coins = self.coindata.approved_coins
+            self.approved_coins = coin_approved
             self.save()
             return True
         return False
@@ -257,8 +780,7 @@ class DynamicIgnore():
                 if symbol in self.approved_coins:
                     print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Change approved_coins {self.path} Removed: {symbol} because it is in ignored_coins_short')
                     self.approved_coins.remove(symbol)
-        with open(file, "w", encoding='utf-8') as f:
-            json.dump(ignored_coins, f)
+        coalescer.write_json(file, ignored_coins)
         file = Path(f'{self.path}/approved_coins.json')
         approved_coins = self.approved_coins
         if self.approved_coins_long:
@@ -275,8 +797,7 @@ class DynamicIgnore():
                 if symbol in self.ignored_coins:
                     print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Change ignored_coins {self.path} Removed: {symbol} because it is in approved_coins_short')
                     self.ignored_coins.remove(symbol)
-        with open(file, "w", encoding='utf-8') as f:
-            json.dump(approved_coins, f)
+        coalescer.write_json(file, approved_coins)
     
 class RunSingle():
     def __init__(self):
@@ -293,7 +814,7 @@ class RunSingle():
         self.pbgdir = None
     
     def watch(self):
-        if not self.is_running():
+        if not self.is_running() and not start_scheduler.pending("single", (self.user, self.symbol)):
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Start Single from watch: {self.user} {self.symbol}')
             self.start()
 
@@ -303,25 +824,28 @@ class RunSingle():
         return False
 
     def pid(self):
-        for process in psutil.process_iter():
+        process = process_table.find("single", (self.user, self.symbol))
+        if process:
             try:
-                cmdline = process.cmdline()
-            except psutil.NoSuchProcess:
-                pass
-            except psutil.AccessDenied:
-                pass
-            if self.user in cmdline and self.symbol in cmdline and any("passivbot.py" in sub for sub in cmdline):
                 self.monitor.start_time = process.create_time()
-                self.monitor.memory = process.memory_info()
-                self.monitor.cpu = process.cpu_percent()
-                return process
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+            return process
 
     def stop(self):
-        if self.is_running():
+        start_scheduler.cancel("single", (self.user, self.symbol))
+        process = self.pid()
+        if process:
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Stop: {self.user} {self.symbol}')
-            self.pid().kill()
+            process.kill()
+            process_table.forget("single", (self.user, self.symbol))
 
     def start(self):
+        """Queue the bot for start, StartScheduler launches it"""
+        if not self.is_running():
+            start_scheduler.request("single", (self.user, self.symbol), self)
+
+    def launch(self):
         if not self.is_running():
             self.create_parameters()
             config = PurePath(f'{self.path}/config.json')
@@ -330,24 +854,21 @@ class RunSingle():
             cmd.extend(shlex.split(cmd_end))
             cmd.extend([config])
             logfile = Path(f'{self.path}/passivbot.log')
-            log = open(logfile,"ab")
+            log = start_log_sink(logfile, process_table)
             if platform.system() == "Windows":
                 creationflags = subprocess.DETACHED_PROCESS
                 creationflags |= subprocess.CREATE_NO_WINDOW
-                subprocess.Popen(cmd, stdout=log, stderr=log, cwd=self.pbdir, text=True, creationflags=creationflags)
+                process_table.spawn("single", (self.user, self.symbol), cmd, stdout=log, stderr=log, cwd=self.pbdir, text=True, creationflags=creationflags)
             else:
-                subprocess.Popen(cmd, stdout=log, stderr=log, cwd=self.pbdir, text=True, start_new_session=True)
+                process_table.spawn("single", (self.user, self.symbol), cmd, stdout=log, stderr=log, cwd=self.pbdir, text=True, start_new_session=True)
+            os.close(log)
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Start Single: {cmd_end}')
-        # wait until passivbot is running
-        for i in range(10):
-            if self.is_running():
-                break
-            sleep(1)
 
     def clean_log(self):
+        """Rotate passivbot.log of bots started without LogSink (LogSink rotates by itself)"""
         logfile = Path(f'{self.path}/passivbot.log')
         if logfile.exists():
-            if logfile.stat().st_size >= 10485760:
+            if logfile.stat().st_size >= 10485760 and not process_table.find("sink", os.path.normpath(str(logfile))):
                 logfile_old = Path(f'{str(logfile)}.old')
                 copy(logfile,logfile_old)
                 with open(logfile,'r+') as file:
@@ -486,46 +1007,46 @@ class RunMulti():
         return False
 
     def pid(self):
-        for process in psutil.process_iter():
+        process = process_table.find("multi", self.user)
+        if process:
             try:
-                cmdline = process.cmdline()
-            except psutil.NoSuchProcess:
-                pass
-            except psutil.AccessDenied:
-                pass
-            if any(self.user in sub for sub in cmdline) and any("passivbot_multi.py" in sub for sub in cmdline):
                 self.monitor.start_time = process.create_time()
-                self.monitor.memory = process.memory_info()
-                self.monitor.cpu = process.cpu_percent()
-                return process
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+            return process
 
     def stop(self):
-        if self.is_running():
+        start_scheduler.cancel("multi", self.user)
+        process = self.pid()
+        if process:
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Stop: passivbot_multi.py {self.path}/multi_run.hjson')
-            self.pid().kill()
+            process.kill()
+            process_table.forget("multi", self.user)
 
     def start(self):
+        """Queue the bot for start, StartScheduler launches it"""
+        if not self.is_running():
+            start_scheduler.request("multi", self.user, self)
+
+    def launch(self):
         if not self.is_running():
             cmd = [self.pbvenv, '-u', PurePath(f'{self.pbdir}/passivbot_multi.py'), PurePath(f'{self.path}/multi_run.hjson')]
             logfile = Path(f'{self.path}/passivbot.log')
-            log = open(logfile,"ab")
+            log = start_log_sink(logfile, process_table)
             if platform.system() == "Windows":
                 creationflags = subprocess.DETACHED_PROCESS
                 creationflags |= subprocess.CREATE_NO_WINDOW
-                subprocess.Popen(cmd, stdout=log, stderr=log, cwd=self.pbdir, text=True, creationflags=creationflags)
+                process_table.spawn("multi", self.user, cmd, stdout=log, stderr=log, cwd=self.pbdir, text=True, creationflags=creationflags)
             else:
-                subprocess.Popen(cmd, stdout=log, stderr=log, cwd=self.pbdir, text=True, start_new_session=True)
+                process_table.spawn("multi", self.user, cmd, stdout=log, stderr=log, cwd=self.pbdir, text=True, start_new_session=True)
+            os.close(log)
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Start: passivbot_multi.py {self.path}/multi_run.hjson')
-        # wait until passivbot is running
-        for i in range(10):
-            if self.is_running():
-                break
-            sleep(1)
 
     def clean_log(self):
+        """Rotate passivbot.log of bots started without LogSink (LogSink rotates by itself)"""
         logfile = Path(f'{self.path}/passivbot.log')
         if logfile.exists():
-            if logfile.stat().st_size >= 10485760:
+            if logfile.stat().st_size >= 10485760 and not process_table.find("sink", os.path.normpath(str(logfile))):
                 logfile_old = Path(f'{str(logfile)}.old')
                 copy(logfile,logfile_old)
                 with open(logfile,'r+') as file:
@@ -559,9 +1080,10 @@ class RunMulti():
             if self._multi_config["default_config_path"] != "":
                 self._multi_config["default_config_path"] = f'{self.path}/default.json'
         if self.dynamic_ignore is not None:
-            self._multi_config["ignored_symbols"] = self.dynamic_ignore.coindata.ignored_coins
-            if self.dynamic_ignore.coindata.approved_coins:
-                for coin in self.dynamic_ignore.coindata.approved_coins:
+            approved_coins, ignored_coins = self.dynamic_ignore.coins()
+            self._multi_config["ignored_symbols"] = ignored_coins
+            if approved_coins:
+                for coin in approved_coins:
                     self._multi_config["approved_symbols"][coin] = ''
         run_config = hjson.dumps(self._multi_config)
         config_file = Path(f'{self.path}/multi_run.hjson')
@@ -588,19 +1110,19 @@ class RunMulti():
                             if self._multi_config["dynamic_ignore"]:
                                 self.dynamic_ignore = DynamicIgnore()
                                 self.dynamic_ignore.path = self.path
-                                self.dynamic_ignore.coindata.market_cap = self._multi_config["market_cap"]
-                                self.dynamic_ignore.coindata.vol_mcap = self._multi_config["vol_mcap"]
+                                self.dynamic_ignore.market_cap = self._multi_config["market_cap"]
+                                self.dynamic_ignore.vol_mcap = self._multi_config["vol_mcap"]
                                 if "only_cpt" in self._multi_config:
-                                    self.dynamic_ignore.coindata.only_cpt = self._multi_config["only_cpt"]
+                                    self.dynamic_ignore.only_cpt = self._multi_config["only_cpt"]
                                 if "notices_ignore" in self._multi_config:
-                                    self.dynamic_ignore.coindata.notices_ignore = self._multi_config["notices_ignore"]
+                                    self.dynamic_ignore.notices_ignore = self._multi_config["notices_ignore"]
                                 # Find Exchange from User
                                 api_path = f'{self.pbdir}/api-keys.json'
                                 if Path(api_path).exists():
                                     with open(api_path, "r", encoding='utf-8') as f:
                                         api_keys = json.load(f)
                                     if self.user in api_keys:
-                                        self.dynamic_ignore.coindata.exchange = api_keys[self.user]["exchange"]
+                                        self.dynamic_ignore.exchange = api_keys[self.user]["exchange"]
                                         self.dynamic_ignore.watch()
                         return True
                     else:                        
@@ -639,51 +1161,50 @@ class RunV7():
         return False
 
     def pid(self):
-        for process in psutil.process_iter():
+        process = process_table.find("v7", self.user)
+        if process:
             try:
-                cmdline = process.cmdline()
-            except psutil.NoSuchProcess:
-                pass
-            except psutil.AccessDenied:
+                self.monitor.start_time = process.create_time()
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
                 pass
-            if any(self.user in sub for sub in cmdline) and any("main.py" in sub for sub in cmdline):
-                if cmdline[-1].endswith(f'/{self.user}/config_run.json') or cmdline[-1].endswith(f'\{self.user}\config_run.json'):
-                    self.monitor.start_time = process.create_time()
-                    self.monitor.memory = process.memory_info()
-                    self.monitor.cpu = process.cpu_percent()
-                    return process
+            return process
 
     def stop(self):
-        if self.is_running():
+        start_scheduler.cancel("v7", self.user)
+        process = self.pid()
+        if process:
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Stop: passivbot v7 {self.path}/config_run.json')
-            self.pid().kill()
+            process.kill()
+            process_table.forget("v7", self.user)
 
     def start(self):
+        """Queue the bot for start, StartScheduler launches it"""
+        if not self.is_running():
+            start_scheduler.request("v7", self.user, self)
+
+    def launch(self):
         if not self.is_running():
             old_os_path = os.environ.get('PATH', '')
             new_os_path = os.path.dirname(self.pbvenv) + os.pathsep + old_os_path
             os.environ['PATH'] = new_os_path
             cmd = [self.pbvenv, '-u', PurePath(f'{self.pbdir}/src/main.py'), PurePath(f'{self.path}/config_run.json')]
             logfile = Path(f'{self.path}/passivbot.log')
-            log = open(logfile,"ab")
+            log = start_log_sink(logfile, process_table)
             if platform.system() == "Windows":
                 creationflags = subprocess.DETACHED_PROCESS
                 creationflags |= subprocess.CREATE_NO_WINDOW
-                subprocess.Popen(cmd, stdout=log, stderr=log, cwd=self.pbdir, text=True, creationflags=creationflags)
+                process_table.spawn("v7", self.user, cmd, stdout=log, stderr=log, cwd=self.pbdir, text=True, creationflags=creationflags)
             else:
-                subprocess.Popen(cmd, stdout=log, stderr=log, cwd=self.pbdir, text=True, start_new_session=True)
+                process_table.spawn("v7", self.user, cmd, stdout=log, stderr=log, cwd=self.pbdir, text=True, start_new_session=True)
+            os.close(log)
             os.environ['PATH'] = old_os_path
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Start: passivbot_v7 {self.path}/config_run.json')
-        # wait until passivbot is running
-        for i in range(10):
-            if self.is_running():
-                break
-            sleep(1)
 
     def clean_log(self):
+        """Rotate passivbot.log of bots started without LogSink (LogSink rotates by itself)"""
         logfile = Path(f'{self.path}/passivbot.log')
         if logfile.exists():
-            if logfile.stat().st_size >= 10485760:
+            if logfile.stat().st_size >= 10485760 and not process_table.find("sink", os.path.normpath(str(logfile))):
                 logfile_old = Path(f'{str(logfile)}.old')
                 copy(logfile,logfile_old)
                 with open(logfile,'r+') as file:
@@ -747,12 +1268,12 @@ class RunV7():
                         if self._v7_config["pbgui"]["dynamic_ignore"]:
                             self.dynamic_ignore = DynamicIgnore()
                             self.dynamic_ignore.path = self.path
-                            self.dynamic_ignore.coindata.market_cap = self._v7_config["pbgui"]["market_cap"]
-                            self.dynamic_ignore.coindata.vol_mcap = self._v7_config["pbgui"]["vol_mcap"]
+                            self.dynamic_ignore.market_cap = self._v7_config["pbgui"]["market_cap"]
+                            self.dynamic_ignore.vol_mcap = self._v7_config["pbgui"]["vol_mcap"]
                             if "only_cpt" in self._v7_config["pbgui"]:
-                                self.dynamic_ignore.coindata.only_cpt = self._v7_config["pbgui"]["only_cpt"]
+                                self.dynamic_ignore.only_cpt = self._v7_config["pbgui"]["only_cpt"]
                             if "notices_ignore" in self._v7_config["pbgui"]:
-                                self.dynamic_ignore.coindata.notices_ignore = self._v7_config["pbgui"]["notices_ignore"]
+                                self.dynamic_ignore.notices_ignore = self._v7_config["pbgui"]["notices_ignore"]
                             if "live" in self._v7_config:
                                 if "ignored_coins" in self._v7_config["live"]:
                                     if "long" in self._v7_config["live"]["ignored_coins"]:
@@ -774,7 +1295,7 @@ class RunV7():
                                 with open(api_path, "r", encoding='utf-8') as f:
                                     api_keys = json.load(f)
                                 if self.user in api_keys:
-                                    self.dynamic_ignore.coindata.exchange = api_keys[self.user]["exchange"]
+                                    self.dynamic_ignore.exchange = api_keys[self.user]["exchange"]
                                     self.dynamic_ignore.watch()
                     return True
                 else:                        
@@ -807,9 +1328,11 @@ class PBRun():
         self.pb7_commit_origin = "N/A"
         self.upgrades = 0
         self.reboot = False
+        self.system_info_thread = None
         self.run_multi = []
         self.run_single = []
         self.run_v7 = []
+        self.config_hashes = {}
         self.index = 0
         self.pbgdir = Path.cwd()
         pb_config = configparser.ConfigParser()
@@ -896,6 +1419,21 @@ class PBRun():
         self.pidfile = Path(f'{self.piddir}/pbrun.pid')
         self.my_pid = None
 
+    def load_system_info(self):
+        """Load git commits and available upgrades, both run external commands that can take seconds"""
+        try:
+            self.load_git_commits()
+            self.has_upgrades()
+        except Exception as e:
+            print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Warning: Can not load system info: {e}')
+
+    def load_system_info_background(self):
+        """Run load_system_info in a background thread, unless the previous run is still busy"""
+        if self.system_info_thread is not None and self.system_info_thread.is_alive():
+            return
+        self.system_info_thread = threading.Thread(target=self.load_system_info, daemon=True)
+        self.system_info_thread.start()
+
     def has_upgrades(self):
         """Check if apt-get dist-upgrade -s finds upgrades available"""
         my_env = os.environ.copy()
@@ -1074,6 +1612,18 @@ class PBRun():
                     self.run_single.remove(single)
                     return
 
+    def config_changed(self, config_file: Path):
+        """True if the content of an instance config changed since it was loaded the last time"""
+        try:
+            digest = hashlib.blake2b(config_file.read_bytes(), digest_size=16).digest()
+        except OSError:
+            self.config_hashes.pop(config_file, None)
+            return True
+        if self.config_hashes.get(config_file) == digest:
+            return False
+        self.config_hashes[config_file] = digest
+        return True
+
     def find_running_version(self, path: str):
         version = 0
         version_file = Path(f'{path}/running_version.txt')
@@ -1130,8 +1680,11 @@ class PBRun():
         new_status = InstancesStatus(status_file)
         if new_status.activate_ts > self.activate_v7_ts:
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Activate: from {new_status.activate_pbname} Date: {datetime.fromtimestamp(new_status.activate_ts).isoformat(sep=" ", timespec="seconds")}')
+            # Compare by name once, only new and changed instances are installed and loaded
+            current = {status.name: status for status in self.instances_status_v7}
+            new_names = set(instance.name for instance in new_status)
             for instance in new_status:
-                status = self.instances_status_v7.find_name(instance.name)
+                status = current.get(instance.name)
                 if status is not None:
                     if instance.version > status.version:
                         # Install new v7 version
@@ -1158,8 +1711,7 @@ class PBRun():
                         self.watch_v7([f'{self.v7_path}/{instance.name}'])
             remove_instances = []
             for instance in self.instances_status_v7:
-                status = new_status.find_name(instance.name)
-                if status is None:
+                if instance.name not in new_names:
                     # Remove v7 instance
                     print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Remove: V7 Instance {instance.name}')
                     if instance.running:
@@ -1385,6 +1937,8 @@ class PBRun():
         Args:
             v7_instances (list, optional): List of v7-instance paths. Defaults to None.
         """
+        # Only instances with a changed config are loaded again
+        previous = {status.name: status for status in self.instances_status_v7}
         if not v7_instances:
             p = str(Path(f'{self.v7_path}/*'))
             v7_instances = glob.glob(p)
@@ -1393,6 +1947,11 @@ class PBRun():
         for v7_instance in v7_instances:
             file = Path(f'{v7_instance}/config.json')
             if file.exists():
+                name = v7_instance.split('/')[-1]
+                if not self.config_changed(file) and name in previous:
+                    # Same config as on the last load, keep the instance as it is
+                    self.instances_status_v7.add(previous[name])
+                    continue
                 run_v7 = RunV7()
                 status = InstanceStatus()
                 run_v7.path = v7_instance
@@ -1434,6 +1993,8 @@ class PBRun():
         Args:
             single_instances (list, optional): List of single-instance paths. Defaults to None.
         """
+        # Only instances with a changed config are loaded again
+        previous = {status.name: status for status in self.instances_status_single}
         if not single_instances:
             p = str(Path(f'{self.single_path}/*'))
             single_instances = glob.glob(p)
@@ -1442,6 +2003,11 @@ class PBRun():
         for single_instance in single_instances:
             file = Path(f'{single_instance}/instance.cfg')
             if file.exists():
+                name = single_instance.split('/')[-1]
+                if not self.config_changed(file) and name in previous:
+                    # Same config as on the last load, keep the instance as it is
+                    self.instances_status_single.add(previous[name])
+                    continue
                 run_single = RunSingle()
                 status = InstanceStatus()
                 run_single.path = single_instance
@@ -1483,12 +2049,19 @@ class PBRun():
         Args:
             multi_instance (list, optional): List of muilti-instance paths. Defaults to None.
         """
+        # Only instances with a changed config are loaded again
+        previous = {status.name: status for status in self.instances_status}
         if not multi_instances:
             p = str(Path(f'{self.multi_path}/*'))
             multi_instances = glob.glob(p)
         for multi_instance in multi_instances:
             file = Path(f'{multi_instance}/multi.hjson')
             if file.exists():
+                name = multi_instance.split('/')[-1]
+                if not self.config_changed(file) and name in previous:
+                    # Same config as on the last load, keep the instance as it is
+                    self.instances_status.add(previous[name])
+                    continue
                 run_multi = RunMulti()
                 status = InstanceStatus()
                 status.multi = True
@@ -1525,6 +2098,13 @@ class PBRun():
                 self.instances_status.remove(instance)
         self.instances_status.save()
 
+    def watched_dirs(self):
+        """Directories PBRun reacts on: cmd path, the instance trees and the dirs of all active instances"""
+        dirs = [self.cmd_path, self.v7_path, self.multi_path, self.single_path]
+        for instance in self.run_v7 + self.run_multi + self.run_single:
+            dirs.append(instance.path)
+        return dirs
+
     def run(self):
         if not self.is_running():
             pbgdir = Path.cwd()
@@ -1604,7 +2184,14 @@ def main():
     run.watch_v7()
     run.watch_multi()
     run.watch_single()
+    run.has_activate()
+    run.has_update_status()
+    watcher = FileWatcher()
+    timer = LoopTimer(Path(f'{str(dest)}/PBRun_metrics.json'))
+    timer.start_watchdog()
+    cmd_path = Path(run.cmd_path)
     count = 0
+    next_tick = 0
     while True:
         try:
             if logfile.exists():
@@ -1612,31 +2199,53 @@ def main():
                     logfile.replace(f'{str(logfile)}.old')
                     sys.stdout = TextIOWrapper(open(logfile,"ab",0), write_through=True)
                     sys.stderr = TextIOWrapper(open(logfile,"ab",0), write_through=True)
-            run.has_activate()
-            run.has_update_status()
-            for run_v7 in run.run_v7:
-                run_v7.watch()
-                run_v7.watch_dynamic()
-                run_v7.monitor.watch_log()
-            for run_multi in run.run_multi:
-                run_multi.watch()
-                run_multi.watch_dynamic()
-                run_multi.monitor.watch_log()
-            for run_single in run.run_single:
-                run_single.watch()
-                run_single.monitor.watch_log()
-            if count%2 == 0:
-                for run_v7 in run.run_v7:
-                    run_v7.clean_log()
-                for run_multi in run.run_multi:
-                    run_multi.clean_log()
-                for run_single in run.run_single:
-                    run_single.clean_log()
-            sleep(5)
-            count += 1
+            watcher.sync(run.watched_dirs())
+            # Wake up every second while bots are starting, otherwise at the next tick
+            wake = min(next_tick, monotonic() + 1) if start_scheduler.busy() else next_tick
+            changed = watcher.wait(wake - monotonic())
+            # Files written during one pass are flushed together at the end, unchanged files are not rewritten
+            with coalescer.batch():
+                timer.begin()
+                # Activations and status updates only when something arrived in cmd path
+                if cmd_path in changed:
+                    with timer.phase("activate"):
+                        run.has_activate()
+                    with timer.phase("status"):
+                        run.has_update_status()
+                # Liveness and dynamic ignore every 5 seconds, parse passivbot.log when it changed or once a minute
+                tick = monotonic() >= next_tick
+                if tick:
+                    with timer.phase("watch"):
+                        process_table.refresh()
+                        next_tick = monotonic() + 5
+                        resource_sampler.step(run.run_v7 + run.run_multi + run.run_single)
+                for instance in run.run_v7 + run.run_multi + run.run_single:
+                    if tick:
+                        with timer.phase("watch"):
+                            instance.watch()
+                            if not isinstance(instance, RunSingle):
+                                instance.watch_dynamic()
+                    if Path(f'{instance.path}/passivbot.log') in changed or (tick and count%12 == 0):
+                        with timer.phase("log"):
+                            instance.monitor.watch_log()
+                # Launch queued bots and confirm the ones that are starting
+                with timer.phase("watch"):
+                    start_scheduler.step()
+                if tick and count%2 == 0:
+                    with timer.phase("clean"):
+                        for run_v7 in run.run_v7:
+                            run_v7.clean_log()
+                        for run_multi in run.run_multi:
+                            run_multi.clean_log()
+                        for run_single in run.run_single:
+                            run_single.clean_log()
+                if tick:
+                    count += 1
+                timer.end()
         except Exception as e:
             print(f'Something went wrong, but continue {e}')
             traceback.print_exc()
+            sleep(5)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
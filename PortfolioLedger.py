@@ -0,0 +1,199 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Union, Any
+from datetime import datetime
+
+
+class PortfolioLedger:
+    """
+    Учет портфеля в бэктесте с комиссиями и проскальзыванием.
+
+    Сделки исполняются по цене сигнала с проскальзыванием slippage_pct (покупка
+    дороже, продажа дешевле) и комиссией fee_pct от объема сделки. Каждое
+    исполнение записывается в журнал (время, пара, размер позиции, баланс),
+    по которому equity_curve() считает стоимость портфеля на каждой свече
+    векторно: цена на свече берется индексом в уже загруженном массиве, без
+    обращений к MarketDataManager.
+
+    self.portfolio сохраняет прежний формат: balance, positions, trades, equity_curve.
+    """
+
+    def __init__(self, initial_balance: float = 10000.0, fee_pct: float = 0.0, slippage_pct: float = 0.0):
+        self.initial_balance = initial_balance
+        self.fee_pct = fee_pct
+        self.slippage_pct = slippage_pct
+        self.portfolio = {
+            "balance": initial_balance,
+            "positions": {},
+            "trades": [],
+            "equity_curve": []
+        }
+        # Журнал исполнений
+        self._fill_ts = []
+        self._fill_pair = []
+        self._fill_size = []
+        self._fill_balance = []
+        self._fill_side = []
+        self._fill_notional = []
+        self._fill_fee = []
+        self._fill_pnl = []
+        self.fees_paid = 0.0
+        self.exposure = None
+        self.marks = {}
+
+    def execute(self, signal: Dict, timestamp: int) -> bool:
+        """
+        Исполняет торговый сигнал
+
+        Returns:
+            True, если сделка исполнена
+        """
+        portfolio = self.portfolio
+        exchange = signal["exchange"]
+        symbol = signal["symbol"]
+        side = signal["side"]
+        amount = float(signal["amount"])
+        if amount <= 0 or not signal["price"]:
+            return False
+
+        # Создаем ключ для позиции
+        position_key = f"{exchange}_{symbol}"
+        position = portfolio["positions"].get(position_key)
+        if position is None:
+            position = portfolio["positions"][position_key] = {
+                "exchange": exchange,
+                "symbol": symbol,
+                "size": 0,
+                "entry_price": 0,
+                "cost": 0
+            }
+
+        trade = {
+            "timestamp": timestamp,
+            "datetime": datetime.fromtimestamp(timestamp / 1000).strftime('%Y-%m-%d %H:%M:%S'),
+            "exchange": exchange,
+            "symbol": symbol,
+            "side": side
+        }
+        if side == "buy":
+            price = signal["price"] * (1 + self.slippage_pct / 100)
+            trade_cost = price * amount
+            fee = trade_cost * self.fee_pct / 100
+            if portfolio["balance"] < trade_cost + fee:
+                return False
+            new_size = position["size"] + amount
+            position["cost"] += trade_cost
+            position["entry_price"] = position["cost"] / new_size
+            position["size"] = new_size
+            portfolio["balance"] -= trade_cost + fee
+            trade.update({"price": price, "amount": amount, "cost": trade_cost, "fee": fee})
+            notional, pnl = trade_cost, 0.0
+        elif side == "sell":
+            # Допуск на погрешность дробных размеров
+            if amount > position["size"] * (1 + 1e-9):
+                return False
+            amount = min(amount, position["size"])
+            price = signal["price"] * (1 - self.slippage_pct / 100)
+            trade_value = price * amount
+            fee = trade_value * self.fee_pct / 100
+            pnl = trade_value - position["entry_price"] * amount - fee
+            new_size = position["size"] - amount
+            position["size"] = new_size
+            if new_size <= 0:
+                position["size"] = 0
+                position["entry_price"] = 0
+                position["cost"] = 0
+            else:
+                position["cost"] = position["entry_price"] * new_size
+            portfolio["balance"] += trade_value - fee
+            trade.update({"price": price, "amount": amount, "cost": trade_value, "fee": fee, "pnl": pnl})
+            notional = trade_value
+        else:
+            return False
+
+        trade["balance_after"] = portfolio["balance"]
+        portfolio["trades"].append(trade)
+        self.fees_paid += fee
+        self._fill_ts.append(timestamp)
+        self._fill_pair.append((exchange, symbol))
+        self._fill_size.append(position["size"])
+        self._fill_balance.append(portfolio["balance"])
+        self._fill_side.append(1 if side == "buy" else -1)
+        self._fill_notional.append(notional)
+        self._fill_fee.append(fee)
+        self._fill_pnl.append(pnl)
+        return True
+
+    def equity(self, prices: Dict[tuple, float]) -> float:
+        """Текущая стоимость портфеля по ценам {(exchange, symbol): price}"""
+        value = self.portfolio["balance"]
+        for position in self.portfolio["positions"].values():
+            if position["size"]:
+                value += position["size"] * prices.get((position["exchange"], position["symbol"]), position["entry_price"])
+        return value
+
+    @staticmethod
+    def _step(xs: np.ndarray, ys: np.ndarray, at: np.ndarray, default: float) -> np.ndarray:
+        """Значение ступенчатой функции (xs, ys) в точках at"""
+        if len(xs) == 0:
+            return np.full(len(at), default, dtype=float)
+        idx = np.searchsorted(xs, at, "right") - 1
+        return np.where(idx >= 0, ys[np.maximum(idx, 0)], default)
+
+    def equity_curve(self, timestamps: np.ndarray, closes: Dict[tuple, np.ndarray]) -> np.ndarray:
+        """
+        Стоимость портфеля на каждой свече
+
+        Args:
+            timestamps: Время свечей по возрастанию
+            closes: {(exchange, symbol): цены закрытия, выровненные по timestamps}
+
+        Returns:
+            Массив стоимости портфеля той же длины, что timestamps;
+            стоимость открытых позиций на каждой свече сохраняется в self.exposure,
+            последние цены пар - в self.marks
+        """
+        fill_ts = np.asarray(self._fill_ts, dtype=float)
+        value = self._step(fill_ts, np.asarray(self._fill_balance, dtype=float), timestamps, self.initial_balance)
+        pairs = np.array([f"{e}\x00{s}" for e, s in self._fill_pair]) if self._fill_pair else np.array([])
+        sizes = np.asarray(self._fill_size, dtype=float)
+        exposure = np.zeros(len(timestamps))
+        self.marks = {}
+        for pair in set(self._fill_pair):
+            mask = pairs == f"{pair[0]}\x00{pair[1]}"
+            size = self._step(fill_ts[mask], sizes[mask], timestamps, 0.0)
+            close = np.nan_to_num(closes.get(pair, np.zeros(len(timestamps))))
+            exposure += np.abs(size * close)
+            if len(close):
+                self.marks[pair] = close[-1]
+        self.exposure = exposure
+        return value + exposure
+
+    def fills(self) -> Dict[str, np.ndarray]:
+        """Журнал исполнений в виде массивов (для BacktestMetrics)"""
+        return {
+            "timestamp": np.asarray(self._fill_ts, dtype=float),
+            "pair": np.array([f"{e}_{s}" for e, s in self._fill_pair], dtype=object),
+            "side": np.asarray(self._fill_side, dtype=np.int8),
+            "notional": np.asarray(self._fill_notional, dtype=float),
+            "fee": np.asarray(self._fill_fee, dtype=float),
+            "pnl": np.asarray(self._fill_pnl, dtype=float)
+        }
+
+    def unrealized(self) -> Dict[str, float]:
+        """Нереализованный результат открытых позиций по последним ценам"""
+        result = {}
+        for key, position in self.portfolio["positions"].items():
+            mark = self.marks.get((position["exchange"], position["symbol"]), position["entry_price"])
+            result[key] = position["size"] * mark - position["cost"]
+        return result
+
+    def finalize(self, timestamps: np.ndarray, values: np.ndarray):
+        """Записывает кривую капитала и журнал исполнений в portfolio"""
+        exposure = self.exposure if self.exposure is not None and len(self.exposure) == len(values) else np.zeros(len(values))
+        self.portfolio["equity"] = {"timestamp": timestamps, "value": values, "exposure": exposure}
+        self.portfolio["fills"] = self.fills()
+        self.portfolio["unrealized"] = self.unrealized()
+        df = pd.DataFrame({"timestamp": timestamps.astype("int64"), "value": values})
+        df["datetime"] = pd.to_datetime(df["timestamp"], unit="ms").dt.strftime('%Y-%m-%d %H:%M')
+        self.portfolio["equity_curve"] = df.to_dict("records")
@@ -9,6 +9,7 @@ This status list is then sent through PBRemote to the remote storage, enabling u
 """
 from pathlib import Path
 import json
+from WriteCoalescer import coalescer
 
 class InstanceStatus():
     """Stores information about one passivbot configuration."""
@@ -153,8 +154,7 @@ class InstancesStatus():
             "instances": instances
         }
         file = Path(self.status_file)
-        with open(file, "w", encoding='utf-8') as f:
-            json.dump(status, f, indent=4)
+        coalescer.write_json(file, status, indent=4)
 
 
 def main():
@@ -0,0 +1,134 @@
+import hashlib
+import threading
+import time
+import types
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from typing import Dict, List, Optional, Union, Any, Callable
+from datetime import datetime, timedelta
+
+try:
+    import talib
+except ImportError:
+    talib = None
+
+
+class CompiledStrategy:
+    """Скомпилированный код стратегии и ее вид"""
+
+    def __init__(self, code: types.CodeType, code_hash: str, compile_seconds: float):
+        self.code = code
+        self.code_hash = code_hash
+        self.compile_seconds = compile_seconds
+        if self.defines("vector_signals"):
+            self.mode = "vector"
+        elif self.defines("on_bar"):
+            self.mode = "callbacks"
+        else:
+            self.mode = "script"
+
+    def defines(self, name: str) -> bool:
+        """Проверяет, определяет ли стратегия функцию name на верхнем уровне"""
+        return any(isinstance(c, types.CodeType) and c.co_name == name for c in self.code.co_consts)
+
+
+class StrategyCompiler:
+    """
+    Кэш скомпилированных стратегий по хэшу кода.
+
+    Код стратегии компилируется через compile() один раз; данные, параметры и
+    вспомогательные функции передаются при выполнении через словарь глобальных
+    переменных (см. strategy_namespace), а не вставляются в текст программы.
+    Поэтому ключом кэша достаточно хэша кода: разные параметры используют один
+    и тот же объект кода.
+    """
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "compile_seconds": 0.0}
+
+    @staticmethod
+    def hash_code(code: str) -> str:
+        return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+    def compile(self, code: str, name: str = "") -> CompiledStrategy:
+        """
+        Возвращает скомпилированную стратегию из кэша или компилирует ее
+
+        Raises:
+            SyntaxError: Ошибка в коде стратегии
+        """
+        code_hash = self.hash_code(code)
+        with self._lock:
+            compiled = self._cache.get(code_hash)
+            if compiled is not None:
+                self._cache.move_to_end(code_hash)
+                self.stats["hits"] += 1
+                return compiled
+        started = time.perf_counter()
+        code_object = compile(code, f"<strategy {name}>", "exec")
+        compiled = CompiledStrategy(code_object, code_hash, time.perf_counter() - started)
+        with self._lock:
+            self._cache[code_hash] = compiled
+            self.stats["misses"] += 1
+            self.stats["compile_seconds"] += compiled.compile_seconds
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return compiled
+
+
+# Общий кэш процесса
+compiler = StrategyCompiler()
+
+
+def strategy_namespace(name: str, params: Dict, data: Dict[str, pd.DataFrame], signals: List, logs: List,
+                       indicator: Callable, signal_time: Optional[Callable] = None) -> Dict:
+    """
+    Глобальные переменные, доступные коду стратегии
+
+    Args:
+        name: Имя модуля стратегии
+        params: Параметры стратегии
+        data: {"<exchange>_<symbol>_<timeframe>": DataFrame}
+        signals: Список, в который add_signal добавляет сигналы
+        logs: Список сообщений log
+        indicator: Функция indicator(exchange, symbol, timeframe, name, **params)
+        signal_time: Функция времени сигнала в секундах; если None, время
+            проставляет вызывающий код
+    """
+    def log(message):
+        logs.append(str(message))
+
+    def add_signal(exchange, symbol, side, price=None, amount=0, reason="", timeframe=""):
+        signals.append({
+            "exchange": exchange,
+            "symbol": symbol,
+            "side": side,  # "buy" или "sell"
+            "price": price,
+            "amount": amount,
+            "reason": reason,
+            "timeframe": timeframe,
+            "timestamp": signal_time() if signal_time else None
+        })
+
+    namespace = {
+        "__name__": name,
+        "pd": pd,
+        "np": np,
+        "talib": talib,
+        "datetime": datetime,
+        "timedelta": timedelta,
+        "params": params,
+        "data": data,
+        "signals": signals,
+        "logs": logs,
+        "log": log,
+        "add_signal": add_signal,
+        "indicator": indicator
+    }
+    for key, df in data.items():
+        namespace[f"df_{key}".replace("-", "_").replace(".", "_")] = df
+    return namespace
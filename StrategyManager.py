@@ -1,13 +1,18 @@
 import json
 import os
+import time
 import uuid
-import importlib.util
 import pandas as pd
 import numpy as np
 from pathlib import Path
 from typing import Dict, List, Optional, Union, Any, Callable
 from datetime import datetime
 from MarketDataManager import MarketDataManager
+from BacktestEngine import BacktestEngine
+from BacktestMetrics import calculate_metrics
+from StrategyCompiler import compiler, strategy_namespace
+from StrategyRunner import StrategyRunner, StrategyJob
+from StrategyStore import StrategyStore
 from pbgui_func import PBGDIR
 
 class Strategy:
@@ -94,29 +99,21 @@ class StrategyManager:
         self.strategies_dir = Path(f'{PBGDIR}/data/strategies')
         if not self.strategies_dir.exists():
             self.strategies_dir.mkdir(parents=True, exist_ok=True)
-        self.strategies = self._load_strategies()
+        self.store = StrategyStore(self.strategies_dir / "strategies.db", self.strategies_dir)
         self.current_strategy = None
-        
-    def _load_strategies(self) -> Dict[str, Strategy]:
-        """Загружает все стратегии из директории стратегий"""
-        strategies = {}
-        for file in self.strategies_dir.glob("*.json"):
-            try:
-                with open(file, "r") as f:
-                    data = json.load(f)
-                strategy = Strategy.from_dict(data)
-                strategies[strategy.id] = strategy
-            except Exception as e:
-                print(f"Ошибка при загрузке стратегии {file}: {str(e)}")
-        return strategies
+        self._runner = None
+    
+    @property
+    def runner(self) -> StrategyRunner:
+        """Пул процессов для выполнения стратегий вне процесса GUI (создается при первом обращении)"""
+        if self._runner is None:
+            self._runner = StrategyRunner()
+        return self._runner
     
     def save_strategy(self, strategy: Strategy) -> bool:
-        """Сохраняет стратегию в файл"""
+        """Сохраняет стратегию в хранилище"""
         try:
-            file_path = self.strategies_dir / f"{strategy.id}.json"
-            with open(file_path, "w") as f:
-                json.dump(strategy.to_dict(), f, indent=4)
-            self.strategies[strategy.id] = strategy
+            self.store.save(strategy.to_dict())
             return True
         except Exception as e:
             print(f"Ошибка при сохранении стратегии {strategy.name}: {str(e)}")
@@ -129,29 +126,58 @@ class StrategyManager:
         return strategy
     
     def delete_strategy(self, strategy_id: str) -> bool:
-        """Удаляет стратегию"""
+        """Удаляет стратегию вместе с результатами бэктестов"""
         try:
-            file_path = self.strategies_dir / f"{strategy_id}.json"
-            if file_path.exists():
-                file_path.unlink()
-            if strategy_id in self.strategies:
-                del self.strategies[strategy_id]
+            self.store.delete(strategy_id)
             return True
         except Exception as e:
             print(f"Ошибка при удалении стратегии {strategy_id}: {str(e)}")
             return False
     
     def get_strategy(self, strategy_id: str) -> Optional[Strategy]:
-        """Получает стратегию по ID"""
-        return self.strategies.get(strategy_id)
+        """Загружает стратегию по ID (вместе с кодом)"""
+        data = self.store.load(strategy_id)
+        return Strategy.from_dict(data) if data else None
+    
+    def list_strategies(self, search: str = "", offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Возвращает метаданные стратегий без кода (последние измененные первыми)
+        
+        Args:
+            search: Подстрока для поиска в названии, описании, авторе и символах
+            offset: Смещение страницы
+            limit: Размер страницы (None - все)
+        """
+        return self.store.list(search, offset, limit)
+    
+    def count_strategies(self, search: str = "") -> int:
+        """Количество стратегий, подходящих под поиск"""
+        return self.store.count(search)
+    
+    def save_backtest_result(self, strategy_id: str, result: Dict, start_date: str = "", end_date: str = "",
+                             params: Optional[Dict] = None) -> Optional[int]:
+        """Сохраняет результат бэктеста стратегии"""
+        try:
+            return self.store.add_result(strategy_id, result, start_date, end_date, params)
+        except Exception as e:
+            print(f"Ошибка при сохранении результата бэктеста {strategy_id}: {str(e)}")
+            return None
+    
+    def list_backtest_results(self, strategy_id: str, offset: int = 0, limit: int = 50) -> List[Dict]:
+        """Метрики сохраненных бэктестов стратегии без тела результата"""
+        return self.store.list_results(strategy_id, offset, limit)
     
-    def list_strategies(self) -> List[Strategy]:
-        """Возвращает список всех стратегий"""
-        return list(self.strategies.values())
+    def load_backtest_result(self, result_id: int) -> Optional[Dict]:
+        """Загружает сохраненный результат бэктеста"""
+        return self.store.load_result(result_id)
     
     def execute_strategy(self, strategy: Strategy, params: Optional[Dict] = None) -> Dict:
         """
-        Выполняет стратегию с возможностью переопределения параметров
+        Выполняет стратегию с возможностью переопределения параметров и ждет результата
+        
+        Код стратегии выполняется не в процессе GUI, а в StrategyRunner
+        (см. submit_execution); здесь только проверяется синтаксис и
+        загружаются данные.
         
         Returns:
             Dict с результатами: {
@@ -159,114 +185,177 @@ class StrategyManager:
                 "signals": List[Dict],
                 "data": Dict,
                 "logs": List[str],
-                "error": Optional[str]
+                "error": Optional[str],
+                "stats": Dict
             }
         """
-        # Объединяем параметры стратегии с переопределенными
-        strategy_params = {**strategy.parameters}
-        if params:
-            strategy_params.update(params)
-        
-        # Создаем временный модуль для выполнения кода стратегии
-        spec = importlib.util.spec_from_loader(f"strategy_{strategy.id}", loader=None)
-        module = importlib.util.module_from_spec(spec)
-        
-        # Добавляем необходимые импорты и контекст
-        setup_code = """
-import pandas as pd
-import numpy as np
-import talib
-from datetime import datetime, timedelta
-
-# Глобальные переменные для стратегии
-signals = []
-logs = []
-data = {}
-
-def log(message):
-    logs.append(str(message))
-
-def add_signal(exchange, symbol, side, price, amount, reason="", timeframe=""):
-    signals.append({
-        "exchange": exchange,
-        "symbol": symbol,
-        "side": side,  # "buy" или "sell"
-        "price": price,
-        "amount": amount,
-        "reason": reason,
-        "timeframe": timeframe,
-        "timestamp": datetime.now().timestamp()
-    })
-"""
-        
-        # Подготавливаем данные для стратегии
-        data_prep_code = "try:\n"
-        
-        # Загружаем данные для каждой комбинации биржи, символа и таймфрейма
-        for exchange in strategy.exchanges:
-            for symbol in strategy.symbols:
-                for timeframe in strategy.timeframes:
-                    var_name = f"df_{exchange}_{symbol}_{timeframe}".replace("-", "_").replace(".", "_")
-                    data_prep_code += f"""
-    # Загружаем данные для {exchange} {symbol} {timeframe}
-    ohlcv_{exchange}_{symbol}_{timeframe} = mdm.get_ohlcv("{exchange}", "{symbol}", "{timeframe}", {strategy.limit})
-    {var_name} = pd.DataFrame(ohlcv_{exchange}_{symbol}_{timeframe}, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-    {var_name}['datetime'] = pd.to_datetime({var_name}['timestamp'], unit='ms')
-    data["{exchange}_{symbol}_{timeframe}"] = {var_name}
-"""
-                    
-        data_prep_code += """
-except Exception as e:
-    logs.append(f"Ошибка при загрузке данных: {str(e)}")
-    success = False
-    error = str(e)
-"""
-        
-        # Добавляем выполнение стратегии
-        execution_code = f"""
-# Параметры стратегии
-params = {json.dumps(strategy_params)}
-
-# Код стратегии
-success = True
-error = None
-try:
-{strategy.code}
-except Exception as e:
-    logs.append(f"Ошибка при выполнении стратегии: {{str(e)}}")
-    success = False
-    error = str(e)
-"""
-        
-        # Объединяем весь код
-        full_code = setup_code + data_prep_code + execution_code
-        
-        # Выполняем код
-        global_vars = {
-            "mdm": self.mdm,
-            "__name__": module.__name__
-        }
+        stats = {"cached": False, "compile_seconds": 0.0, "load_seconds": 0.0, "exec_seconds": 0.0}
         
+        # Компиляция без выполнения: синтаксические ошибки сообщаются сразу
         try:
-            exec(full_code, global_vars)
-            # Получаем результаты
-            return {
-                "success": global_vars.get("success", False),
-                "signals": global_vars.get("signals", []),
-                "data": global_vars.get("data", {}),
-                "logs": global_vars.get("logs", []),
-                "error": global_vars.get("error")
-            }
-        except Exception as e:
+            misses = compiler.stats["misses"]
+            compiled = compiler.compile(strategy.code, strategy.name)
+            stats["cached"] = compiler.stats["misses"] == misses
+            if not stats["cached"]:
+                stats["compile_seconds"] = compiled.compile_seconds
+        except SyntaxError as e:
             return {
                 "success": False,
                 "signals": [],
                 "data": {},
                 "logs": [],
-                "error": f"Критическая ошибка при выполнении стратегии: {str(e)}"
+                "error": f"Ошибка синтаксиса в стратегии: {str(e)}",
+                "stats": stats
             }
+        
+        try:
+            job = self.submit_execution(strategy, params)
+        except Exception as e:
+            return {"success": False, "signals": [], "data": {}, "logs": [f"Ошибка при загрузке данных: {str(e)}"],
+                    "error": str(e), "stats": stats}
+        result = job.wait()
+        if job.status != "done":
+            return {"success": False, "signals": [], "data": {}, "logs": [], "error": job.error, "stats": stats}
+        result["stats"] = {**stats, **result["stats"]}
+        return result
+    
+    def _load_live_data(self, strategy: Strategy) -> Dict[str, pd.DataFrame]:
+        """Последние strategy.limit свечей каждой серии стратегии"""
+        data = {}
+        for exchange in strategy.exchanges:
+            for symbol in strategy.symbols:
+                for timeframe in strategy.timeframes:
+                    ohlcv = self.mdm.get_ohlcv(exchange, symbol, timeframe, strategy.limit)
+                    df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+                    df['datetime'] = pd.to_datetime(df['timestamp'], unit='ms')
+                    data[f"{exchange}_{symbol}_{timeframe}"] = df
+        return data
+    
+    @classmethod
+    def _run_live(cls, strategy: Strategy, params: Dict, data: Dict, signals: List, logs: List, indicator: Callable):
+        """
+        Выполняет стратегию на загруженных данных (в процессе StrategyRunner)
+        
+        Returns:
+            (success, error)
+        """
+        namespace = strategy_namespace(f"strategy_{strategy.id}", params, data, signals, logs,
+                                       indicator, lambda: datetime.now().timestamp())
+        try:
+            compiled = compiler.compile(strategy.code, strategy.name)
+            exec(compiled.code, namespace)
+            if compiled.mode == "vector":
+                cls._vector_live_signals(strategy, namespace, data, signals, params)
+            elif compiled.mode == "callbacks":
+                # Для живого выполнения on_bar вызывается на последней свече каждой серии
+                for key, df in data.items():
+                    if df.empty:
+                        continue
+                    exchange, symbol, timeframe = cls._split_key(strategy, key)
+                    row = df.iloc[-1]
+                    namespace["on_bar"]({
+                        "key": key, "exchange": exchange, "symbol": symbol, "timeframe": timeframe,
+                        "index": len(df) - 1, "timestamp": int(row["timestamp"]),
+                        "open": row["open"], "high": row["high"], "low": row["low"],
+                        "close": row["close"], "volume": row["volume"]
+                    })
+            success = True
+            error = None
+        except Exception as e:
+            logs.append(f"Ошибка при выполнении стратегии: {str(e)}")
+            success = False
+            error = str(e)
+        
+        # Сигналы без цены получают последнюю цену закрытия
+        for signal in signals:
+            if signal["price"] is None:
+                df = data.get(f"{signal['exchange']}_{signal['symbol']}_{signal['timeframe']}")
+                signal["price"] = float(df["close"].iloc[-1]) if df is not None and not df.empty else 0
+        return success, error
+    
+    def submit_execution(self, strategy: Strategy, params: Optional[Dict] = None) -> StrategyJob:
+        """
+        Выполняет стратегию в StrategyRunner: данные загружаются здесь, код
+        стратегии выполняется в отдельном процессе с ограничениями
+        
+        Returns:
+            StrategyJob; результат имеет тот же вид, что у execute_strategy
+        """
+        strategy_params = {**strategy.parameters}
+        if params:
+            strategy_params.update(params)
+        started = time.perf_counter()
+        data = self._load_live_data(strategy)
+        return self.runner.submit("execute", {
+            "strategy": strategy.to_dict(),
+            "params": strategy_params,
+            "data": data,
+            "stats": {"load_seconds": time.perf_counter() - started}
+        })
+    
+    def submit_backtest(self, strategy: Strategy, start_date: str, end_date: str, initial_balance: float = 10000.0,
+                        params: Optional[Dict] = None, fee_pct: float = 0.0, slippage_pct: float = 0.0) -> StrategyJob:
+        """
+        Выполняет бэктест в StrategyRunner: серии загружаются здесь, движок
+        работает в отдельном процессе с ограничениями
+        
+        Returns:
+            StrategyJob; результат имеет тот же вид, что у backtest_strategy
+        """
+        start_ts = int(datetime.strptime(start_date, '%Y-%m-%d').timestamp() * 1000)
+        end_ts = int(datetime.strptime(end_date, '%Y-%m-%d').timestamp() * 1000)
+        strategy_params = {**strategy.parameters}
+        if params:
+            strategy_params.update(params)
+        started = time.perf_counter()
+        series = BacktestEngine.load_series(self.mdm, strategy, start_ts, end_ts)
+        return self.runner.submit("backtest", {
+            "strategy": strategy.to_dict(),
+            "series": series,
+            "params": strategy_params,
+            "initial_balance": initial_balance,
+            "fee_pct": fee_pct,
+            "slippage_pct": slippage_pct,
+            "start_ts": start_ts,
+            "end_ts": end_ts,
+            "load_seconds": time.perf_counter() - started
+        })
+    
+    @staticmethod
+    def _split_key(strategy: Strategy, key: str):
+        """Возвращает (exchange, symbol, timeframe) для ключа данных стратегии"""
+        for exchange in strategy.exchanges:
+            for symbol in strategy.symbols:
+                for timeframe in strategy.timeframes:
+                    if key == f"{exchange}_{symbol}_{timeframe}":
+                        return exchange, symbol, timeframe
+        return None, None, None
+    
+    @classmethod
+    def _vector_live_signals(cls, strategy: Strategy, namespace: Dict, data: Dict, signals: List, params: Dict):
+        """Сигнал векторной стратегии по изменению целевой позиции на последней свече"""
+        size = float(params.get("position_size", 1.0))
+        for key, df in data.items():
+            if len(df) < 2:
+                continue
+            exchange, symbol, timeframe = cls._split_key(strategy, key)
+            market = {"exchange": exchange, "symbol": symbol, "timeframe": timeframe}
+            target = BacktestEngine.target_position(namespace["vector_signals"](df, market), len(df), size)
+            delta = target[-1] - target[-2]
+            if delta != 0:
+                signals.append({
+                    "exchange": exchange,
+                    "symbol": symbol,
+                    "side": "buy" if delta > 0 else "sell",
+                    "price": float(df["close"].iloc[-1]),
+                    "amount": abs(float(delta)),
+                    "reason": "vector",
+                    "timeframe": timeframe,
+                    "timestamp": datetime.now().timestamp()
+                })
     
-    def backtest_strategy(self, strategy: Strategy, start_date: str, end_date: str, initial_balance: float = 10000.0, params: Optional[Dict] = None) -> Dict:
+    def backtest_strategy(self, strategy: Strategy, start_date: str, end_date: str, initial_balance: float = 10000.0, params: Optional[Dict] = None,
+                          fee_pct: float = 0.0, slippage_pct: float = 0.0) -> Dict:
         """
         Выполняет бэктестинг стратегии на историческом периоде
         
@@ -276,234 +365,59 @@ except Exception as e:
             end_date: Дата окончания в формате 'YYYY-MM-DD'
             initial_balance: Начальный баланс
             params: Параметры для переопределения
+            fee_pct: Комиссия в процентах от объема сделки
+            slippage_pct: Проскальзывание в процентах от цены
             
         Returns:
             Dict с результатами бэктестинга
         """
-        # Конвертируем даты в UNIX timestamp
-        start_ts = int(datetime.strptime(start_date, '%Y-%m-%d').timestamp() * 1000)
-        end_ts = int(datetime.strptime(end_date, '%Y-%m-%d').timestamp() * 1000)
-        
-        # Определяем период для тестирования
-        period_days = (end_ts - start_ts) // (1000 * 60 * 60 * 24)
-        
-        # Портфель для отслеживания позиций и баланса
-        portfolio = {
-            "balance": initial_balance,
-            "positions": {},
-            "trades": [],
-            "equity_curve": []
-        }
-        
-        # Дневная петля для симуляции торговли
-        current_ts = start_ts
-        
-        while current_ts <= end_ts:
-            # Устанавливаем стратегии ограничение по времени
-            strategy.since = current_ts
-            strategy.limit = 100
-            
-            # Выполняем стратегию на текущую дату
-            result = self.execute_strategy(strategy, params)
-            
-            if result["success"]:
-                # Обрабатываем сигналы
-                for signal in result["signals"]:
-                    # Проверяем, что сигнал в пределах текущего временного окна
-                    signal_ts = signal["timestamp"] * 1000
-                    if start_ts <= signal_ts <= current_ts:
-                        # Обрабатываем торговый сигнал
-                        self._process_trade_signal(portfolio, signal, current_ts)
-                
-                # Обновляем стоимость портфеля
-                portfolio_value = portfolio["balance"]
-                for symbol, position in portfolio["positions"].items():
-                    if position["size"] != 0:
-                        # Получаем текущую цену
-                        exchange = position["exchange"]
-                        current_price = self._get_latest_price(exchange, symbol, current_ts)
-                        position_value = position["size"] * current_price
-                        portfolio_value += position_value
-                
-                # Добавляем точку в кривую капитала
-                portfolio["equity_curve"].append({
-                    "timestamp": current_ts,
-                    "value": portfolio_value,
-                    "datetime": datetime.fromtimestamp(current_ts / 1000).strftime('%Y-%m-%d')
-                })
-            
-            # Переходим к следующему дню
-            current_ts += 24 * 60 * 60 * 1000
-        
-        # Рассчитываем метрики
-        metrics = self._calculate_metrics(portfolio, initial_balance, start_ts, end_ts)
-        
-        return {
-            "portfolio": portfolio,
-            "metrics": metrics,
-            "logs": result.get("logs", [])
-        }
-    
-    def _process_trade_signal(self, portfolio: Dict, signal: Dict, current_ts: int):
-        """Обрабатывает торговый сигнал в симуляции"""
-        symbol = signal["symbol"]
-        exchange = signal["exchange"]
-        side = signal["side"]
-        price = signal["price"]
-        amount = signal["amount"]
-        
-        # Создаем ключ для позиции
-        position_key = f"{exchange}_{symbol}"
-        
-        # Инициализируем позицию, если она не существует
-        if position_key not in portfolio["positions"]:
-            portfolio["positions"][position_key] = {
-                "exchange": exchange,
-                "symbol": symbol,
-                "size": 0,
-                "entry_price": 0,
-                "cost": 0
+        # Движок с кодом стратегии работает в StrategyRunner, а не в процессе GUI
+        job = self.submit_backtest(strategy, start_date, end_date, initial_balance, params, fee_pct, slippage_pct)
+        result = job.wait()
+        if job.status != "done":
+            start_ts = int(datetime.strptime(start_date, '%Y-%m-%d').timestamp() * 1000)
+            end_ts = int(datetime.strptime(end_date, '%Y-%m-%d').timestamp() * 1000)
+            portfolio = {"balance": initial_balance, "positions": {}, "trades": [], "equity_curve": []}
+            return {
+                "portfolio": portfolio,
+                "metrics": self._calculate_metrics(portfolio, initial_balance, start_ts, end_ts),
+                "logs": [f"Ошибка при выполнении стратегии: {job.error}"],
+                "stats": {}
             }
-        
-        position = portfolio["positions"][position_key]
-        
-        # Рассчитываем стоимость сделки
-        trade_cost = price * amount
-        
-        # Обрабатываем покупку
-        if side == "buy":
-            if portfolio["balance"] >= trade_cost:
-                # Обновляем позицию
-                new_size = position["size"] + amount
-                new_cost = position["cost"] + trade_cost
-                position["entry_price"] = new_cost / new_size if new_size > 0 else 0
-                position["size"] = new_size
-                position["cost"] = new_cost
-                
-                # Уменьшаем баланс
-                portfolio["balance"] -= trade_cost
-                
-                # Записываем сделку
-                portfolio["trades"].append({
-                    "timestamp": current_ts,
-                    "datetime": datetime.fromtimestamp(current_ts / 1000).strftime('%Y-%m-%d %H:%M:%S'),
-                    "exchange": exchange,
-                    "symbol": symbol,
-                    "side": side,
-                    "price": price,
-                    "amount": amount,
-                    "cost": trade_cost,
-                    "balance_after": portfolio["balance"]
-                })
-        
-        # Обрабатываем продажу
-        elif side == "sell":
-            if position["size"] >= amount:
-                # Рассчитываем прибыль/убыток
-                trade_value = price * amount
-                cost_basis = position["entry_price"] * amount
-                pnl = trade_value - cost_basis
-                
-                # Обновляем позицию
-                new_size = position["size"] - amount
-                position["size"] = new_size
-                if new_size == 0:
-                    position["entry_price"] = 0
-                    position["cost"] = 0
-                else:
-                    position["cost"] = position["entry_price"] * new_size
-                
-                # Увеличиваем баланс
-                portfolio["balance"] += trade_value
-                
-                # Записываем сделку
-                portfolio["trades"].append({
-                    "timestamp": current_ts,
-                    "datetime": datetime.fromtimestamp(current_ts / 1000).strftime('%Y-%m-%d %H:%M:%S'),
-                    "exchange": exchange,
-                    "symbol": symbol,
-                    "side": side,
-                    "price": price,
-                    "amount": amount,
-                    "cost": trade_value,
-                    "pnl": pnl,
-                    "balance_after": portfolio["balance"]
-                })
+        return result
     
-    def _get_latest_price(self, exchange: str, symbol: str, timestamp: int) -> float:
-        """Получает последнюю доступную цену до указанного timestamp"""
+    @classmethod
+    def _run_backtest(cls, strategy: Strategy, series: Dict[str, np.ndarray], params: Dict, initial_balance: float,
+                      fee_pct: float, slippage_pct: float, start_ts: int, end_ts: int, logs: Optional[List] = None) -> Dict:
+        """Бэктест на загруженных сериях и метрики (в процессе StrategyRunner)"""
         try:
-            ohlcv = self.mdm.get_ohlcv(exchange, symbol, "1d", 1, timestamp - 24*60*60*1000)
-            if ohlcv and len(ohlcv) > 0:
-                return ohlcv[0][4]  # Close price
-            return 0
-        except:
-            return 0
-    
-    def _calculate_metrics(self, portfolio: Dict, initial_balance: float, start_ts: int, end_ts: int) -> Dict:
-        """Рассчитывает метрики производительности портфеля"""
-        if not portfolio["equity_curve"]:
-            return {
-                "total_return_pct": 0,
-                "annualized_return_pct": 0,
-                "max_drawdown_pct": 0,
-                "sharpe_ratio": 0,
-                "win_rate_pct": 0,
-                "profit_factor": 0,
-                "total_trades": 0
+            engine = BacktestEngine(strategy, series, params, initial_balance, fee_pct, slippage_pct)
+            if logs is not None:
+                engine.logs = logs
+            result = engine.run(start_ts, end_ts)
+        except Exception as e:
+            result = {
+                "portfolio": {"balance": initial_balance, "positions": {}, "trades": [], "equity_curve": []},
+                "logs": [f"Ошибка при выполнении стратегии: {str(e)}"],
+                "stats": {}
             }
         
-        # Создаем DataFrame с кривой капитала
-        equity_df = pd.DataFrame(portfolio["equity_curve"])
-        
-        # Рассчитываем общую доходность
-        initial_value = initial_balance
-        final_value = equity_df["value"].iloc[-1]
-        total_return = (final_value - initial_value) / initial_value
-        
-        # Рассчитываем годовую доходность
-        days = (end_ts - start_ts) / (1000 * 60 * 60 * 24)
-        annualized_return = ((1 + total_return) ** (365 / days)) - 1 if days > 0 else 0
-        
-        # Рассчитываем максимальную просадку
-        equity_df["prev_peak"] = equity_df["value"].cummax()
-        equity_df["drawdown"] = (equity_df["value"] - equity_df["prev_peak"]) / equity_df["prev_peak"]
-        max_drawdown = equity_df["drawdown"].min()
-        
-        # Рассчитываем коэффициент Шарпа (если достаточно данных)
-        if len(equity_df) > 1:
-            equity_df["daily_return"] = equity_df["value"].pct_change()
-            avg_return = equity_df["daily_return"].mean()
-            std_return = equity_df["daily_return"].std()
-            sharpe_ratio = (avg_return / std_return) * np.sqrt(252) if std_return > 0 else 0
-        else:
-            sharpe_ratio = 0
-        
-        # Рассчитываем процент выигрышных сделок и фактор прибыли
-        trades_df = pd.DataFrame(portfolio["trades"])
-        if not trades_df.empty and "pnl" in trades_df.columns:
-            winning_trades = trades_df[trades_df["pnl"] > 0]
-            win_rate = len(winning_trades) / len(trades_df) if len(trades_df) > 0 else 0
-            
-            # Фактор прибыли
-            gross_profit = winning_trades["pnl"].sum() if not winning_trades.empty else 0
-            losing_trades = trades_df[trades_df["pnl"] < 0]
-            gross_loss = abs(losing_trades["pnl"].sum()) if not losing_trades.empty else 0
-            profit_factor = gross_profit / gross_loss if gross_loss > 0 else float('inf')
-        else:
-            win_rate = 0
-            profit_factor = 0
+        # Рассчитываем метрики
+        metrics = cls._calculate_metrics(result["portfolio"], initial_balance, start_ts, end_ts)
         
         return {
-            "total_return_pct": total_return * 100,
-            "annualized_return_pct": annualized_return * 100,
-            "max_drawdown_pct": max_drawdown * 100,
-            "sharpe_ratio": sharpe_ratio,
-            "win_rate_pct": win_rate * 100,
-            "profit_factor": profit_factor,
-            "total_trades": len(portfolio["trades"])
+            "portfolio": result["portfolio"],
+            "metrics": metrics,
+            "logs": result["logs"],
+            "stats": result["stats"]
         }
     
+    @staticmethod
+    def _calculate_metrics(portfolio: Dict, initial_balance: float, start_ts: int, end_ts: int) -> Dict:
+        """Рассчитывает метрики производительности портфеля"""
+        return calculate_metrics(portfolio.get("equity", {}), portfolio.get("fills", {}), initial_balance,
+                                 start_ts, end_ts, portfolio.get("unrealized"))
+    
     def export_strategy(self, strategy_id: str, file_path: str) -> bool:
         """Экспортирует стратегию в файл"""
         strategy = self.get_strategy(strategy_id)
@@ -0,0 +1,421 @@
+import gc
+import multiprocessing
+import queue
+import signal
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Union, Any, Iterator, Tuple
+from pbgui_purefunc import load_ini
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class CpuLimitExceeded(BaseException):
+    """
+    Задача исчерпала лимит процессорного времени (SIGXCPU).
+    Наследуется от BaseException, чтобы код стратегии и движок не перехватили
+    его через except Exception.
+    """
+
+
+def _on_cpu_limit(signum, frame):
+    raise CpuLimitExceeded()
+
+
+def _limit_cpu(seconds: Optional[int]):
+    """Ограничивает процессорное время текущей задачи seconds секундами (None - снять)"""
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if seconds:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        soft = int(usage.ru_utime + usage.ru_stime) + int(seconds)
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+    else:
+        soft = hard
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+class TimeLimitExceeded(BaseException):
+    """Задача превысила время выполнения (SIGALRM), в том числе без нагрузки на процессор"""
+
+
+def _on_time_limit(signum, frame):
+    raise TimeLimitExceeded()
+
+
+def _limit_time(seconds: Optional[float]):
+    """Ограничивает время выполнения текущей задачи seconds секундами (None - снять)"""
+    if hasattr(signal, "setitimer"):
+        signal.setitimer(signal.ITIMER_REAL, seconds or 0)
+
+
+def _limit_memory(memory_mb: Optional[int]):
+    """Ограничивает адресное пространство процесса memory_mb мегабайтами"""
+    if resource is None or not memory_mb:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = memory_mb * 1024 * 1024
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _install_limits(memory_mb: Optional[int]):
+    """Настройка процесса-исполнителя: обработчики SIGXCPU/SIGALRM и лимит памяти"""
+    if resource is not None:
+        signal.signal(signal.SIGXCPU, _on_cpu_limit)
+    if hasattr(signal, "SIGALRM"):
+        signal.signal(signal.SIGALRM, _on_time_limit)
+    _limit_memory(memory_mb)
+
+
+def _run_limited(func, limits: Tuple[int, int, int], *args) -> Tuple[Any, Optional[str]]:
+    """
+    Выполняет func(*args) с лимитами (cpu_seconds, memory_mb, timeout) на один вызов.
+    Процесс должен быть настроен через _install_limits.
+
+    Returns:
+        (результат, None) или (None, текст ошибки лимита)
+    """
+    cpu_seconds, memory_mb, timeout = limits
+    try:
+        _limit_cpu(cpu_seconds)
+        _limit_time(timeout)
+        return func(*args), None
+    except CpuLimitExceeded:
+        return None, f"Превышен лимит процессорного времени ({cpu_seconds} s)"
+    except TimeLimitExceeded:
+        return None, f"Превышено время выполнения ({timeout} s)"
+    except MemoryError:
+        return None, f"Превышен лимит памяти ({memory_mb} MB)"
+    finally:
+        _limit_time(None)
+        _limit_cpu(None)
+
+
+class _StreamList(list):
+    """Список, каждый новый элемент которого сразу отправляется в GUI"""
+
+    def __init__(self, conn, kind: str):
+        super().__init__()
+        self._conn = conn
+        self._kind = kind
+
+    def append(self, item):
+        super().append(item)
+        self._conn.send((self._kind, item))
+
+
+# Кэш индикаторов процесса-исполнителя, общий для всех задач
+_indicators = None
+
+
+def _task_execute(conn, payload: Dict) -> Dict:
+    """Живое выполнение стратегии на переданных из GUI данных"""
+    global _indicators
+    from BacktestEngine import COLUMNS
+    from IndicatorCache import IndicatorCache
+    from StrategyManager import Strategy, StrategyManager
+    if _indicators is None:
+        _indicators = IndicatorCache()
+    strategy = Strategy.from_dict(payload["strategy"])
+    data = payload["data"]
+    signals = _StreamList(conn, "signal")
+    logs = _StreamList(conn, "log")
+
+    def indicator(exchange, symbol, timeframe, name, **indicator_params):
+        df = data[f"{exchange}_{symbol}_{timeframe}"]
+        # Версия серии по содержимому последней свечи: она может быть еще не
+        # закрыта, и ее close/volume меняются при том же времени
+        version = zlib.crc32(df[COLUMNS].iloc[-1].to_numpy(dtype=float).tobytes()) if not df.empty else 0
+        return _indicators.get((exchange, symbol, timeframe), version, df, name, indicator_params)
+
+    started = time.perf_counter()
+    success, error = StrategyManager._run_live(strategy, payload["params"], data, signals, logs, indicator)
+    return {
+        "success": success,
+        "signals": list(signals),
+        "data": data,
+        "logs": list(logs),
+        "error": error,
+        "stats": {**payload["stats"], "exec_seconds": time.perf_counter() - started}
+    }
+
+
+def _task_backtest(conn, payload: Dict) -> Dict:
+    """Бэктест на переданных из GUI сериях"""
+    from StrategyManager import Strategy, StrategyManager
+    strategy = Strategy.from_dict(payload["strategy"])
+    logs = _StreamList(conn, "log")
+    result = StrategyManager._run_backtest(
+        strategy, payload["series"], payload["params"], payload["initial_balance"], payload["fee_pct"],
+        payload["slippage_pct"], payload["start_ts"], payload["end_ts"], logs
+    )
+    result["logs"] = list(result["logs"])
+    result["stats"]["load_seconds"] = payload["load_seconds"]
+    return result
+
+
+_TASKS = {
+    "execute": _task_execute,
+    "backtest": _task_backtest
+}
+
+
+def _worker_main(conn, cpu_seconds: int, memory_mb: int):
+    """Цикл процесса-исполнителя: задачи приходят по conn, события и результат уходят обратно"""
+    # Тяжелые модули импортируются один раз при запуске процесса
+    import StrategyManager
+    if resource is not None:
+        signal.signal(signal.SIGXCPU, _on_cpu_limit)
+    _limit_memory(memory_mb)
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError):
+            break
+        if task is None:
+            break
+        job_id, kind, payload = task
+        try:
+            _limit_cpu(cpu_seconds)
+            result = _TASKS[kind](conn, payload)
+            _limit_cpu(None)
+            conn.send(("result", result))
+        except CpuLimitExceeded:
+            _limit_cpu(None)
+            conn.send(("error", f"Превышен лимит процессорного времени ({cpu_seconds} s)"))
+        except MemoryError:
+            _limit_cpu(None)
+            conn.send(("error", f"Превышен лимит памяти ({memory_mb} MB)"))
+        except Exception as e:
+            _limit_cpu(None)
+            conn.send(("error", str(e)))
+        finally:
+            task = payload = None
+            gc.collect()
+
+
+class StrategyJob:
+    """
+    Задача выполнения стратегии в StrategyRunner.
+
+    Статусы: queued, running, done, error, cancelled. События выполнения
+    (("log", str), ("signal", dict)) доступны через stream() по мере появления.
+    """
+
+    FINAL = ("done", "error", "cancelled")
+
+    def __init__(self, kind: str, payload: Dict, timeout: Optional[float] = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.payload = payload
+        self.timeout = timeout
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.events = queue.Queue()
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+
+    def cancel(self):
+        """Отменяет задачу; выполняющийся процесс будет остановлен"""
+        self._cancel.set()
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[Dict]:
+        """Ожидает завершения и возвращает результат (None при ошибке или отмене)"""
+        self._done.wait(timeout)
+        return self.result
+
+    def stream(self, timeout: Optional[float] = None) -> Iterator[Tuple[str, Any]]:
+        """
+        Выдает события задачи до ее завершения; последнее событие -
+        (status, result или error)
+        """
+        while True:
+            try:
+                kind, value = self.events.get(timeout=timeout)
+            except queue.Empty:
+                return
+            yield kind, value
+            if kind in self.FINAL:
+                return
+
+    def _finish(self, status: str, result: Optional[Dict] = None, error: Optional[str] = None):
+        self.status = status
+        self.result = result
+        self.error = error
+        self.payload = None
+        self.finished = time.time()
+        self.events.put((status, result if status == "done" else error))
+        self._done.set()
+
+
+class StrategyRunner:
+    """
+    Пул прогретых процессов для выполнения пользовательских стратегий.
+
+    Код стратегии выполняется не в процессе GUI, а в отдельных процессах с
+    ограничением процессорного времени на задачу (RLIMIT_CPU) и памяти
+    (RLIMIT_AS). Процессы запускаются заранее и переиспользуются; процесс,
+    превысивший время выполнения, отмененный или упавший, перезапускается.
+    Логи и сигналы передаются в GUI по мере выполнения (StrategyJob.stream).
+
+    Настройки берутся из секции [strategy] файла pbgui.ini.
+    """
+
+    DEFAULTS = {
+        "runner_workers": 2,
+        "runner_cpu_seconds": 300,
+        "runner_memory_mb": 4096,
+        "runner_timeout": 900
+    }
+    MAX_JOBS = 100
+
+    def __init__(self, workers: Optional[int] = None, cpu_seconds: Optional[int] = None,
+                 memory_mb: Optional[int] = None, timeout: Optional[int] = None):
+        for key, default in self.DEFAULTS.items():
+            value = load_ini("strategy", key)
+            setattr(self, key, int(value) if value != "" else default)
+        self.workers = workers or self.runner_workers
+        self.cpu_seconds = cpu_seconds if cpu_seconds is not None else self.runner_cpu_seconds
+        self.memory_mb = memory_mb if memory_mb is not None else self.runner_memory_mb
+        self.timeout = timeout if timeout is not None else self.runner_timeout
+        self.jobs = OrderedDict()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._context = multiprocessing.get_context("spawn")
+        self._threads = []
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._slot, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    @classmethod
+    def limits(cls) -> Tuple[int, int, int]:
+        """Лимиты одной задачи из pbgui.ini: (cpu_seconds, memory_mb, timeout)"""
+        values = []
+        for key in ("runner_cpu_seconds", "runner_memory_mb", "runner_timeout"):
+            value = load_ini("strategy", key)
+            values.append(int(value) if value != "" else cls.DEFAULTS[key])
+        return tuple(values)
+
+    def submit(self, kind: str, payload: Dict, timeout: Optional[float] = None) -> StrategyJob:
+        """Ставит задачу в очередь и сразу возвращает StrategyJob"""
+        job = StrategyJob(kind, payload, timeout if timeout is not None else self.timeout)
+        with self._lock:
+            self.jobs[job.id] = job
+            # Храним только последние MAX_JOBS задач
+            while len(self.jobs) > self.MAX_JOBS:
+                oldest = next(iter(self.jobs.values()))
+                if not oldest.done():
+                    break
+                self.jobs.popitem(last=False)
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[StrategyJob]:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.jobs.get(job_id)
+        if job is None or job.done():
+            return False
+        job.cancel()
+        return True
+
+    def shutdown(self):
+        """Останавливает все процессы-исполнители"""
+        for _ in self._threads:
+            self._queue.put(None)
+        for job in list(self.jobs.values()):
+            job.cancel()
+
+    def _spawn(self):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main, args=(child_conn, self.cpu_seconds, self.memory_mb), daemon=True
+        )
+        process.start()
+        child_conn.close()
+        return process, parent_conn
+
+    @staticmethod
+    def _kill(process, conn):
+        if process is not None:
+            process.kill()
+            process.join(5)
+        if conn is not None:
+            conn.close()
+
+    def _slot(self):
+        """Поток, обслуживающий один процесс-исполнитель"""
+        process, conn = self._spawn()
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            if job._cancel.is_set():
+                job._finish("cancelled", error="Выполнение отменено")
+                continue
+            if process is None or not process.is_alive():
+                self._kill(process, conn)
+                process, conn = self._spawn()
+            job.status = "running"
+            job.started = time.time()
+            try:
+                conn.send((job.id, job.kind, job.payload))
+            except (OSError, ValueError) as e:
+                self._kill(process, conn)
+                process, conn = None, None
+                job._finish("error", error=f"Ошибка передачи задачи: {str(e)}")
+                continue
+            job.payload = None
+            deadline = job.started + job.timeout if job.timeout else None
+            while True:
+                if job._cancel.is_set():
+                    self._kill(process, conn)
+                    process, conn = None, None
+                    job._finish("cancelled", error="Выполнение отменено")
+                    break
+                if deadline and time.time() > deadline:
+                    self._kill(process, conn)
+                    process, conn = None, None
+                    job._finish("error", error=f"Превышено время выполнения ({job.timeout} s)")
+                    break
+                try:
+                    if not conn.poll(0.1):
+                        if not process.is_alive():
+                            job._finish("error", error=f"Процесс стратегии завершился (код {process.exitcode})")
+                            self._kill(process, conn)
+                            process, conn = None, None
+                            break
+                        continue
+                    kind, value = conn.recv()
+                except (EOFError, OSError):
+                    job._finish("error", error=f"Процесс стратегии завершился (код {process.exitcode})")
+                    self._kill(process, conn)
+                    process, conn = None, None
+                    break
+                if kind == "result":
+                    job._finish("done", result=value)
+                    break
+                if kind == "error":
+                    job._finish("error", error=value)
+                    break
+                job.events.put((kind, value))
+        self._kill(process, conn)
@@ -0,0 +1,298 @@
+import json
+import pickle
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Union, Any
+
+# Колонки метаданных, которые читаются для списка стратегий (без кода)
+META_COLUMNS = ["id", "name", "description", "author", "created_at", "updated_at",
+                "exchanges", "symbols", "timeframes", "market_type", "bar_limit"]
+JSON_COLUMNS = ("exchanges", "symbols", "timeframes", "parameters")
+
+
+class StrategyStore:
+    """
+    Хранилище стратегий в SQLite.
+
+    Метаданные стратегий лежат в индексированной таблице strategies, код - в
+    отдельной таблице strategy_code, результаты бэктестов - в strategy_results
+    (метрики отдельно от сжатого тела результата). Список и поиск читают только
+    метаданные; код и результаты загружаются при открытии стратегии или
+    конкретного результата.
+
+    При первом открытии базы стратегии из JSON файлов каталога переносятся в
+    базу; сами файлы остаются на месте как резервная копия. При удалении
+    стратегии ее JSON файл переименовывается в <id>.json.deleted, чтобы при
+    повторном создании базы удаленная стратегия не вернулась.
+
+    Тело результата хранится как сжатый JSON; результаты, сохраненные раньше
+    через pickle, один раз перекодируются при обновлении схемы.
+    """
+
+    SCHEMA_VERSION = 2
+
+    def __init__(self, db_path: Path, json_dir: Optional[Path] = None):
+        self.db_path = Path(db_path)
+        self.json_dir = Path(json_dir) if json_dir else self.db_path.parent
+        self._initialize_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    def _initialize_db(self):
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS strategies (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                description TEXT,
+                author TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                exchanges TEXT,
+                symbols TEXT,
+                timeframes TEXT,
+                market_type TEXT,
+                bar_limit INTEGER,
+                parameters TEXT
+            )
+            ''')
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS strategy_code (
+                strategy_id TEXT PRIMARY KEY REFERENCES strategies(id) ON DELETE CASCADE,
+                code TEXT NOT NULL
+            )
+            ''')
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS strategy_results (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                strategy_id TEXT NOT NULL REFERENCES strategies(id) ON DELETE CASCADE,
+                created_at REAL NOT NULL,
+                start_date TEXT,
+                end_date TEXT,
+                params TEXT,
+                metrics TEXT,
+                body BLOB
+            )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_strategies_updated ON strategies(updated_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_strategies_name ON strategies(name COLLATE NOCASE)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_results_strategy ON strategy_results(strategy_id, created_at)")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < 1:
+                self._migrate_json(conn)
+            if version < 2:
+                self._migrate_result_bodies(conn)
+            if version < self.SCHEMA_VERSION:
+                conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _migrate_json(self, conn: sqlite3.Connection):
+        """Переносит стратегии из JSON файлов в базу"""
+        migrated = 0
+        for file in self.json_dir.glob("*.json"):
+            try:
+                with open(file, "r") as f:
+                    data = json.load(f)
+                if not all(key in data for key in ("id", "name", "code")):
+                    continue
+                self._upsert(conn, data)
+                migrated += 1
+            except Exception as e:
+                print(f"Ошибка при переносе стратегии {file}: {str(e)}")
+        if migrated:
+            print(f"Перенесено стратегий в {self.db_path.name}: {migrated}")
+
+    def _migrate_result_bodies(self, conn: sqlite3.Connection):
+        """Перекодирует тела результатов из pickle (схема 1) в JSON"""
+        rows = conn.execute("SELECT id, body FROM strategy_results").fetchall()
+        for result_id, body in rows:
+            data = zlib.decompress(body)
+            if data[:1] != b"\x80":
+                continue
+            try:
+                # Данные схемы 1, записанные этим же хранилищем
+                result = pickle.loads(data)
+                conn.execute("UPDATE strategy_results SET body = ? WHERE id = ?", (self._encode_body(result), result_id))
+            except Exception as e:
+                print(f"Ошибка при перекодировании результата {result_id}: {str(e)}")
+
+    @staticmethod
+    def _encode_body(result: Dict) -> bytes:
+        # Числа и массивы NumPy сохраняются как обычные числа и списки
+        return zlib.compress(json.dumps(result, default=lambda o: o.tolist() if hasattr(o, "tolist") else str(o)).encode())
+
+    @staticmethod
+    def _upsert(conn: sqlite3.Connection, data: Dict):
+        conn.execute('''
+        INSERT INTO strategies (id, name, description, author, created_at, updated_at,
+                                exchanges, symbols, timeframes, market_type, bar_limit, parameters)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(id) DO UPDATE SET
+            name = excluded.name, description = excluded.description, author = excluded.author,
+            updated_at = excluded.updated_at, exchanges = excluded.exchanges, symbols = excluded.symbols,
+            timeframes = excluded.timeframes, market_type = excluded.market_type,
+            bar_limit = excluded.bar_limit, parameters = excluded.parameters
+        ''', (
+            data["id"], data["name"], data.get("description", ""), data.get("author", ""),
+            data.get("created_at", time.time()), data.get("updated_at", time.time()),
+            json.dumps(data.get("exchanges", [])), json.dumps(data.get("symbols", [])),
+            json.dumps(data.get("timeframes", [])), data.get("market_type", "swap"),
+            data.get("limit", 100), json.dumps(data.get("parameters", {}))
+        ))
+        conn.execute('''
+        INSERT INTO strategy_code (strategy_id, code) VALUES (?, ?)
+        ON CONFLICT(strategy_id) DO UPDATE SET code = excluded.code
+        ''', (data["id"], data.get("code", "")))
+
+    @staticmethod
+    def _row_to_dict(columns: List[str], row) -> Dict:
+        item = dict(zip(columns, row))
+        for column in JSON_COLUMNS:
+            if column in item:
+                item[column] = json.loads(item[column]) if item[column] else ([] if column != "parameters" else {})
+        if "bar_limit" in item:
+            item["limit"] = item.pop("bar_limit")
+        return item
+
+    @staticmethod
+    def _search_clause(search: str):
+        if not search:
+            return "", []
+        # % и _ в строке поиска ищутся буквально
+        escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        pattern = f"%{escaped}%"
+        return (" WHERE name LIKE ? ESCAPE '\\' OR description LIKE ? ESCAPE '\\'"
+                " OR author LIKE ? ESCAPE '\\' OR symbols LIKE ? ESCAPE '\\'"), [pattern] * 4
+
+    def save(self, data: Dict):
+        """Сохраняет стратегию (словарь Strategy.to_dict())"""
+        conn = self._connect()
+        try:
+            self._upsert(conn, data)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def load(self, strategy_id: str) -> Optional[Dict]:
+        """Загружает стратегию целиком, вместе с кодом"""
+        columns = META_COLUMNS + ["parameters", "code"]
+        conn = self._connect()
+        try:
+            row = conn.execute(f'''
+            SELECT {", ".join("s." + c for c in columns[:-1])}, c.code
+            FROM strategies s LEFT JOIN strategy_code c ON c.strategy_id = s.id
+            WHERE s.id = ?
+            ''', (strategy_id,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        data = self._row_to_dict(columns, row)
+        data["code"] = data["code"] or ""
+        return data
+
+    def delete(self, strategy_id: str) -> bool:
+        """Удаляет стратегию, ее код и результаты; JSON файл стратегии помечается удаленным"""
+        conn = self._connect()
+        try:
+            deleted = conn.execute("DELETE FROM strategies WHERE id = ?", (strategy_id,)).rowcount
+            conn.commit()
+        finally:
+            conn.close()
+        json_file = self.json_dir / f"{strategy_id}.json"
+        if json_file.exists():
+            json_file.replace(json_file.with_name(f"{json_file.name}.deleted"))
+        return deleted > 0
+
+    def list(self, search: str = "", offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Метаданные стратегий без кода, последние измененные первыми
+
+        Args:
+            search: Подстрока для поиска в названии, описании, авторе и символах
+            offset: Смещение для постраничного вывода
+            limit: Размер страницы (None - все)
+        """
+        where, args = self._search_clause(search)
+        query = f"SELECT {', '.join(META_COLUMNS)} FROM strategies{where} ORDER BY updated_at DESC"
+        if limit is not None:
+            query += " LIMIT ? OFFSET ?"
+            args += [limit, offset]
+        conn = self._connect()
+        try:
+            rows = conn.execute(query, args).fetchall()
+        finally:
+            conn.close()
+        return [self._row_to_dict(META_COLUMNS, row) for row in rows]
+
+    def count(self, search: str = "") -> int:
+        where, args = self._search_clause(search)
+        conn = self._connect()
+        try:
+            return conn.execute(f"SELECT COUNT(*) FROM strategies{where}", args).fetchone()[0]
+        finally:
+            conn.close()
+
+    def add_result(self, strategy_id: str, result: Dict, start_date: str = "", end_date: str = "",
+                   params: Optional[Dict] = None) -> int:
+        """Сохраняет результат бэктеста; метрики хранятся отдельно от сжатого тела"""
+        conn = self._connect()
+        try:
+            cursor = conn.execute('''
+            INSERT INTO strategy_results (strategy_id, created_at, start_date, end_date, params, metrics, body)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                strategy_id, time.time(), start_date, end_date, json.dumps(params or {}, default=str),
+                json.dumps(result.get("metrics", {}), default=str),
+                self._encode_body(result)
+            ))
+            conn.commit()
+            return cursor.lastrowid
+        finally:
+            conn.close()
+
+    def list_results(self, strategy_id: str, offset: int = 0, limit: int = 50) -> List[Dict]:
+        """Список результатов стратегии без тела, последние первыми"""
+        columns = ["id", "created_at", "start_date", "end_date", "params", "metrics"]
+        conn = self._connect()
+        try:
+            rows = conn.execute(f'''
+            SELECT {", ".join(columns)} FROM strategy_results
+            WHERE strategy_id = ? ORDER BY created_at DESC LIMIT ? OFFSET ?
+            ''', (strategy_id, limit, offset)).fetchall()
+        finally:
+            conn.close()
+        results = []
+        for row in rows:
+            item = dict(zip(columns, row))
+            item["params"] = json.loads(item["params"]) if item["params"] else {}
+            item["metrics"] = json.loads(item["metrics"]) if item["metrics"] else {}
+            results.append(item)
+        return results
+
+    def load_result(self, result_id: int) -> Optional[Dict]:
+        """Загружает полный результат бэктеста"""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT body FROM strategy_results WHERE id = ?", (result_id,)).fetchone()
+        finally:
+            conn.close()
+        return json.loads(zlib.decompress(row[0])) if row else None
+
+    def delete_result(self, result_id: int) -> bool:
+        conn = self._connect()
+        try:
+            deleted = conn.execute("DELETE FROM strategy_results WHERE id = ?", (result_id,)).rowcount
+            conn.commit()
+        finally:
+            conn.close()
+        return deleted > 0
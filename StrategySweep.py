@@ -0,0 +1,276 @@
+import bisect
+import itertools
+import multiprocessing
+import os
+import random
+import signal
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Union, Any, Iterator, Callable
+from datetime import datetime
+from StrategyRunner import StrategyRunner, _install_limits, _run_limited
+
+# Состояние процесса-исполнителя: серии в общей памяти и стратегия
+_worker = {}
+
+
+def _attach(shm_name: str, layout: Dict[str, tuple], strategy_data: Dict, initial_balance: float,
+            start_ts: int, end_ts: int, abandon_drawdown_pct: Optional[float], costs: tuple, limits: tuple,
+            pids=None):
+    """
+    Инициализация процесса: подключение к общей памяти без копирования данных.
+    limits - (cpu_seconds, memory_mb, timeout) как у StrategyRunner: лимит памяти
+    на процесс, лимиты процессорного времени и времени выполнения на один бэктест.
+    В pids процесс сообщает свой PID для shutdown_pool.
+    """
+    from StrategyManager import Strategy
+    if pids is not None:
+        pids.put(os.getpid())
+    _install_limits(limits[1])
+    shm = shared_memory.SharedMemory(name=shm_name)
+    buffer = np.ndarray((shm.size // 8,), dtype=np.float64, buffer=shm.buf)
+    series = {}
+    for key, (offset, rows) in layout.items():
+        view = buffer[offset:offset + rows * 6].reshape(rows, 6)
+        view.flags.writeable = False
+        series[key] = view
+    _worker.update({
+        "shm": shm,
+        "series": series,
+        "strategy": Strategy.from_dict(strategy_data),
+        "initial_balance": initial_balance,
+        "start_ts": start_ts,
+        "end_ts": end_ts,
+        "abandon_drawdown_pct": abandon_drawdown_pct,
+        "costs": costs,
+        "limits": limits
+    })
+
+
+def _run_combination(params: Dict) -> Dict:
+    """Бэктест одной комбинации параметров в процессе-исполнителе"""
+    from BacktestEngine import BacktestEngine
+    from StrategyManager import StrategyManager
+    strategy = _worker["strategy"]
+    started = time.perf_counter()
+
+    def backtest():
+        engine = BacktestEngine(strategy, _worker["series"], {**strategy.parameters, **params},
+                                _worker["initial_balance"], *_worker["costs"],
+                                abandon_drawdown_pct=_worker["abandon_drawdown_pct"])
+        return engine.run(_worker["start_ts"], _worker["end_ts"])
+
+    try:
+        result, error = _run_limited(backtest, _worker["limits"])
+        if error:
+            return {"params": params, "metrics": {}, "abandoned": False, "error": error,
+                    "seconds": time.perf_counter() - started}
+        metrics = StrategyManager._calculate_metrics(result["portfolio"], _worker["initial_balance"],
+                                                     _worker["start_ts"], _worker["end_ts"])
+        return {
+            "params": params,
+            "metrics": metrics,
+            "abandoned": result["stats"]["abandoned"],
+            "error": None,
+            "seconds": time.perf_counter() - started
+        }
+    except Exception as e:
+        return {"params": params, "metrics": {}, "abandoned": False, "error": str(e),
+                "seconds": time.perf_counter() - started}
+
+
+def share_series(series: Dict[str, np.ndarray]):
+    """
+    Копирует серии подряд в один блок общей памяти
+
+    Returns:
+        (SharedMemory, {key: (смещение, количество свечей)}) для _attach;
+        блок освобождает вызывающий код (close и unlink)
+    """
+    layout = {}
+    total = 0
+    for key, array in series.items():
+        layout[key] = (total, len(array))
+        total += array.size
+    shm = shared_memory.SharedMemory(create=True, size=max(total, 1) * 8)
+    buffer = np.ndarray((max(total, 1),), dtype=np.float64, buffer=shm.buf)
+    for key, array in series.items():
+        offset, rows = layout[key]
+        buffer[offset:offset + rows * 6] = array.ravel()
+    del buffer
+    return shm, layout
+
+
+def iter_completed(futures: List, heartbeat: Optional[Callable[[], None]] = None, interval: float = 1.0):
+    """
+    Выдает futures по мере завершения, как as_completed. Пока ни одна задача не
+    завершилась, раз в interval секунд вызывается heartbeat: через него GUI
+    может прервать ожидание (например, Streamlit при нажатии кнопки остановки).
+    """
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=interval, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield future
+        if not done and heartbeat is not None:
+            heartbeat()
+
+
+def start_pool(workers: int, initargs: tuple):
+    """
+    Запускает пул процессов-исполнителей с _attach(*initargs)
+
+    Returns:
+        (ProcessPoolExecutor, очередь PID процессов) для shutdown_pool
+    """
+    context = multiprocessing.get_context("spawn")
+    pids = context.SimpleQueue()
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_attach,
+                                   initargs=(*initargs, pids))
+    return executor, pids
+
+
+def shutdown_pool(executor: ProcessPoolExecutor, pids, finished: bool):
+    """Останавливает пул; если перебор прерван, процессы с незавершенными задачами завершаются сразу"""
+    if not finished:
+        while not pids.empty():
+            try:
+                os.kill(pids.get(), signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    executor.shutdown(wait=True, cancel_futures=True)
+
+
+class ParameterSweep:
+    """
+    Параллельный перебор параметров стратегии (grid или random search).
+
+    Свечи загружаются один раз и кладутся в общую память (SharedMemory);
+    процессы-исполнители читают их без копирования. Комбинации выполняются на
+    всех ядрах, результаты выдаются по мере готовности и поддерживаются в
+    отсортированном по objective списке self.results. Комбинации с просадкой
+    больше abandon_drawdown_pct прерываются досрочно. Каждая комбинация
+    выполняется с лимитами процессорного времени, памяти и времени выполнения
+    из [strategy] pbgui.ini (как задачи StrategyRunner).
+    """
+
+    def __init__(self, sm, strategy, ranges: Dict[str, Any], start_date: str, end_date: str,
+                 initial_balance: float = 10000.0, mode: str = "grid", samples: int = 50,
+                 objective: str = "total_return_pct", abandon_drawdown_pct: Optional[float] = None,
+                 workers: Optional[int] = None, seed: Optional[int] = None,
+                 fee_pct: float = 0.0, slippage_pct: float = 0.0):
+        """
+        Args:
+            sm: StrategyManager (для загрузки данных)
+            strategy: Стратегия
+            ranges: Диапазоны параметров: список значений, либо [min, max] или
+                [min, max, step] для числовых параметров
+            start_date: Дата начала в формате 'YYYY-MM-DD'
+            end_date: Дата окончания в формате 'YYYY-MM-DD'
+            initial_balance: Начальный баланс
+            mode: "grid" - все комбинации, "random" - samples случайных комбинаций
+            samples: Количество комбинаций для random
+            objective: Метрика для ранжирования (чем больше, тем лучше)
+            abandon_drawdown_pct: Порог просадки для досрочного прерывания
+            workers: Количество процессов (по умолчанию все ядра)
+            seed: Зерно генератора для random
+            fee_pct: Комиссия в процентах от объема сделки
+            slippage_pct: Проскальзывание в процентах от цены
+        """
+        self.sm = sm
+        self.strategy = strategy
+        self.ranges = ranges
+        self.start_ts = int(datetime.strptime(start_date, '%Y-%m-%d').timestamp() * 1000)
+        self.end_ts = int(datetime.strptime(end_date, '%Y-%m-%d').timestamp() * 1000)
+        self.initial_balance = initial_balance
+        self.mode = mode
+        self.samples = samples
+        self.objective = objective
+        self.abandon_drawdown_pct = abandon_drawdown_pct
+        self.workers = workers or os.cpu_count() or 1
+        self.random = random.Random(seed)
+        self.costs = (fee_pct, slippage_pct)
+        self.limits = StrategyRunner.limits()
+        self.results = []
+        self._scores = []
+        self.stats = {}
+
+    @staticmethod
+    def _values(spec) -> List:
+        """Все значения параметра для grid search"""
+        if isinstance(spec, (list, tuple)) and len(spec) in (2, 3) and all(isinstance(v, (int, float)) for v in spec):
+            start, stop = spec[0], spec[1]
+            step = spec[2] if len(spec) == 3 else (1 if isinstance(start, int) and isinstance(stop, int) else (stop - start) / 10)
+            values = list(np.arange(start, stop + step / 2, step))
+            return [int(v) if isinstance(start, int) and isinstance(step, int) else float(v) for v in values]
+        if isinstance(spec, (list, tuple)):
+            return list(spec)
+        return [spec]
+
+    def _sample(self, spec):
+        """Случайное значение параметра для random search"""
+        if isinstance(spec, (list, tuple)) and len(spec) in (2, 3) and all(isinstance(v, (int, float)) for v in spec):
+            if isinstance(spec[0], int) and isinstance(spec[1], int):
+                return self.random.randint(spec[0], spec[1])
+            return self.random.uniform(spec[0], spec[1])
+        if isinstance(spec, (list, tuple)):
+            return self.random.choice(list(spec))
+        return spec
+
+    def combinations(self) -> List[Dict]:
+        names = list(self.ranges.keys())
+        if self.mode == "random":
+            return [{name: self._sample(self.ranges[name]) for name in names} for _ in range(self.samples)]
+        grids = [self._values(self.ranges[name]) for name in names]
+        return [dict(zip(names, values)) for values in itertools.product(*grids)]
+
+    def _rank(self, result: Dict):
+        """Вставляет результат в отсортированный список (лучшие первыми)"""
+        score = result["metrics"].get(self.objective) if not result["abandoned"] and not result["error"] else None
+        key = -score if score is not None and np.isfinite(score) else float("inf")
+        position = bisect.bisect_right(self._scores, key)
+        self._scores.insert(position, key)
+        self.results.insert(position, result)
+
+    def run(self, heartbeat: Optional[Callable[[], None]] = None) -> Iterator[Dict]:
+        """
+        Выполняет перебор, выдавая результаты по мере готовности.
+        Текущий рейтинг всегда доступен в self.results. heartbeat вызывается
+        раз в секунду во время ожидания (см. iter_completed); если перебор
+        прерван, процессы-исполнители завершаются.
+        """
+        from BacktestEngine import BacktestEngine
+        started = time.perf_counter()
+        combinations = self.combinations()
+        series = BacktestEngine.load_series(self.sm.mdm, self.strategy, self.start_ts, self.end_ts)
+        load_seconds = time.perf_counter() - started
+
+        shm, layout = share_series(series)
+        try:
+            executor, pids = start_pool(self.workers, (
+                shm.name, layout, self.strategy.to_dict(), self.initial_balance,
+                self.start_ts, self.end_ts, self.abandon_drawdown_pct, self.costs, self.limits
+            ))
+            finished = False
+            try:
+                futures = [executor.submit(_run_combination, params) for params in combinations]
+                for future in iter_completed(futures, heartbeat):
+                    result = future.result()
+                    self._rank(result)
+                    yield result
+                finished = True
+            finally:
+                shutdown_pool(executor, pids, finished)
+        finally:
+            shm.close()
+            shm.unlink()
+            seconds = time.perf_counter() - started
+            self.stats = {
+                "combinations": len(combinations),
+                "completed": len(self.results),
+                "abandoned": sum(1 for r in self.results if r["abandoned"]),
+                "load_seconds": load_seconds,
+                "seconds": seconds
+            }
@@ -0,0 +1,199 @@
+import itertools
+import os
+import time
+import numpy as np
+from collections import Counter
+from typing import Dict, List, Optional, Union, Any, Iterator, Callable
+from datetime import datetime
+from StrategyRunner import StrategyRunner, _run_limited
+from StrategySweep import ParameterSweep, share_series, iter_completed, start_pool, shutdown_pool, _worker
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+def _run_window(window: Dict, ranges: Dict, objective: str) -> Dict:
+    """Окно walk-forward в процессе-исполнителе: подбор параметров на train, проверка на test"""
+    from BacktestEngine import BacktestEngine
+    from StrategyManager import StrategyManager
+    strategy = _worker["strategy"]
+    initial_balance = _worker["initial_balance"]
+    started = time.perf_counter()
+
+    def backtest(params, start_ts, end_ts):
+        engine = BacktestEngine(strategy, _worker["series"], {**strategy.parameters, **params},
+                                initial_balance, *_worker["costs"])
+        return engine.run(start_ts, end_ts)
+
+    def evaluate(params, start_ts, end_ts):
+        # Лимиты StrategyRunner на каждый бэктест окна
+        result, error = _run_limited(backtest, _worker["limits"], params, start_ts, end_ts)
+        if error:
+            raise RuntimeError(error)
+        return StrategyManager._calculate_metrics(result["portfolio"], initial_balance, start_ts, end_ts)
+
+    try:
+        names = list(ranges.keys())
+        combinations = [dict(zip(names, values))
+                        for values in itertools.product(*[ParameterSweep._values(ranges[name]) for name in names])]
+        best_params, best_score, train_metrics = combinations[0], None, None
+        for params in combinations:
+            metrics = evaluate(params, window["train_start"], window["train_end"])
+            score = metrics.get(objective)
+            if train_metrics is None or (score is not None and np.isfinite(score) and (best_score is None or score > best_score)):
+                best_params, train_metrics = params, metrics
+                if score is not None and np.isfinite(score):
+                    best_score = score
+        test_metrics = evaluate(best_params, window["test_start"], window["test_end"])
+        return {**window, "params": best_params, "train_metrics": train_metrics, "test_metrics": test_metrics,
+                "combinations": len(combinations), "error": None, "seconds": time.perf_counter() - started}
+    except Exception as e:
+        return {**window, "params": {}, "train_metrics": {}, "test_metrics": {}, "combinations": 0,
+                "error": str(e), "seconds": time.perf_counter() - started}
+
+
+class WalkForward:
+    """
+    Walk-forward проверка стратегии на скользящих окнах train/test.
+
+    История загружается один раз и кладется в общую память, код стратегии
+    компилируется один раз на процесс-исполнитель (кэш StrategyCompiler),
+    окна выполняются параллельно. В каждом окне параметры из ranges
+    подбираются на train-периоде по objective и проверяются на следующем за
+    ним test-периоде. summary() сводит результаты test-периодов в метрики
+    устойчивости. Каждый бэктест выполняется с лимитами StrategyRunner
+    из [strategy] pbgui.ini.
+    """
+
+    def __init__(self, sm, strategy, start_date: str, end_date: str, train_days: int, test_days: int,
+                 step_days: Optional[int] = None, anchored: bool = False, ranges: Optional[Dict[str, Any]] = None,
+                 objective: str = "total_return_pct", initial_balance: float = 10000.0,
+                 fee_pct: float = 0.0, slippage_pct: float = 0.0, workers: Optional[int] = None):
+        """
+        Args:
+            sm: StrategyManager (для загрузки данных)
+            strategy: Стратегия
+            start_date: Дата начала истории в формате 'YYYY-MM-DD'
+            end_date: Дата окончания истории в формате 'YYYY-MM-DD'
+            train_days: Длина train-периода в днях
+            test_days: Длина test-периода в днях
+            step_days: Сдвиг окна в днях (по умолчанию test_days)
+            anchored: Train-период всегда начинается с start_date
+            ranges: Диапазоны параметров для подбора (как в ParameterSweep);
+                без них на всех окнах используются параметры стратегии
+            objective: Метрика для подбора (чем больше, тем лучше)
+            initial_balance: Начальный баланс каждого окна
+            fee_pct: Комиссия в процентах от объема сделки
+            slippage_pct: Проскальзывание в процентах от цены
+            workers: Количество процессов (по умолчанию все ядра)
+        """
+        self.sm = sm
+        self.strategy = strategy
+        self.start_ts = int(datetime.strptime(start_date, '%Y-%m-%d').timestamp() * 1000)
+        self.end_ts = int(datetime.strptime(end_date, '%Y-%m-%d').timestamp() * 1000)
+        self.train_ms = int(train_days * DAY_MS)
+        self.test_ms = int(test_days * DAY_MS)
+        self.step_ms = int((step_days or test_days) * DAY_MS)
+        self.anchored = anchored
+        self.ranges = ranges or {}
+        self.objective = objective
+        self.initial_balance = initial_balance
+        self.costs = (fee_pct, slippage_pct)
+        self.workers = workers or os.cpu_count() or 1
+        self.limits = StrategyRunner.limits()
+        self.results = []
+        self.stats = {}
+
+    def windows(self) -> List[Dict]:
+        """Окна train/test, умещающиеся в историю"""
+        windows = []
+        offset = 0
+        while True:
+            train_start = self.start_ts if self.anchored else self.start_ts + offset
+            train_end = self.start_ts + offset + self.train_ms
+            test_end = train_end + self.test_ms
+            if test_end > self.end_ts or self.step_ms <= 0:
+                break
+            windows.append({
+                "index": len(windows),
+                "train_start": train_start,
+                "train_end": train_end,
+                "test_start": train_end,
+                "test_end": test_end
+            })
+            offset += self.step_ms
+        return windows
+
+    def run(self, heartbeat: Optional[Callable[[], None]] = None) -> Iterator[Dict]:
+        """
+        Выполняет окна параллельно, выдавая результаты по мере готовности.
+        self.results упорядочены по номеру окна. heartbeat вызывается раз в
+        секунду во время ожидания; если проверка прервана, процессы-исполнители
+        завершаются.
+        """
+        from BacktestEngine import BacktestEngine
+        started = time.perf_counter()
+        windows = self.windows()
+        series = BacktestEngine.load_series(self.sm.mdm, self.strategy, self.start_ts, self.end_ts)
+        load_seconds = time.perf_counter() - started
+
+        shm, layout = share_series(series)
+        try:
+            executor, pids = start_pool(min(self.workers, max(len(windows), 1)), (
+                shm.name, layout, self.strategy.to_dict(), self.initial_balance,
+                self.start_ts, self.end_ts, None, self.costs, self.limits
+            ))
+            finished = False
+            try:
+                futures = [executor.submit(_run_window, window, self.ranges, self.objective) for window in windows]
+                for future in iter_completed(futures, heartbeat):
+                    result = future.result()
+                    self.results.append(result)
+                    self.results.sort(key=lambda r: r["index"])
+                    yield result
+                finished = True
+            finally:
+                shutdown_pool(executor, pids, finished)
+        finally:
+            shm.close()
+            shm.unlink()
+            self.stats = {
+                "windows": len(windows),
+                "completed": len(self.results),
+                "load_seconds": load_seconds,
+                "seconds": time.perf_counter() - started
+            }
+
+    def summary(self) -> Dict:
+        """
+        Метрики устойчивости по test-периодам
+
+        oos_return_pct - сложная доходность последовательных test-периодов
+        (имеет смысл при step_days == test_days); efficiency - отношение средней
+        годовой доходности на test к средней на train; param_stability - доля
+        окон, в которых выбрано самое частое значение параметра.
+        """
+        done = [r for r in self.results if not r["error"]]
+        if not done:
+            return {"windows": len(self.results), "failed": len(self.results)}
+        test_returns = np.array([r["test_metrics"]["total_return_pct"] for r in done])
+        test_annual = np.array([r["test_metrics"]["annualized_return_pct"] for r in done])
+        train_annual = np.array([r["train_metrics"]["annualized_return_pct"] for r in done])
+        test_sharpe = np.array([r["test_metrics"]["sharpe_ratio"] for r in done])
+        test_drawdown = np.array([r["test_metrics"]["max_drawdown_pct"] for r in done])
+        param_stability = {}
+        for name in self.ranges:
+            counts = Counter(str(r["params"].get(name)) for r in done)
+            param_stability[name] = counts.most_common(1)[0][1] / len(done) * 100
+        return {
+            "windows": len(self.results),
+            "failed": len(self.results) - len(done),
+            "oos_return_pct": float((np.prod(1 + test_returns / 100) - 1) * 100),
+            "mean_test_return_pct": float(test_returns.mean()),
+            "std_test_return_pct": float(test_returns.std(ddof=1)) if len(done) > 1 else 0.0,
+            "worst_test_return_pct": float(test_returns.min()),
+            "profitable_windows_pct": float(np.count_nonzero(test_returns > 0) / len(done) * 100),
+            "mean_test_sharpe": float(test_sharpe.mean()),
+            "worst_test_drawdown_pct": float(test_drawdown.min()),
+            "efficiency": float(test_annual.mean() / train_annual.mean()) if train_annual.mean() > 0 else 0.0,
+            "param_stability_pct": param_stability
+        }
@@ -0,0 +1,95 @@
+"""
+WriteCoalescer writes small state files (monitor.json, ignored_coins.json, approved_coins.json, status*.json) only
+when their content changed, and always atomically.
+
+Each file is written to a temp file next to it and renamed over the target, so readers and rclone never see a half
+written file. Inside batch() writes are collected and flushed together at the end, a file written several times in
+one PBRun tick is written once. Unchanged content is detected by a digest of the last written content, together
+with the size and mtime of the file, so a file changed or deleted by someone else is written again. rclone only sees
+files that really changed.
+"""
+import os
+import json
+import hashlib
+from pathlib import Path
+from contextlib import contextmanager
+from datetime import datetime
+
+class WriteCoalescer():
+    def __init__(self):
+        self.pending = {}
+        self.digests = {}
+        self.depth = 0
+        self.written = 0
+        self.skipped = 0
+
+    @staticmethod
+    def digest(content: bytes):
+        return hashlib.blake2b(content, digest_size=16).digest()
+
+    @staticmethod
+    def signature(path: Path):
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        return (stat.st_size, stat.st_mtime_ns)
+
+    def write(self, path, content):
+        """Write content (str or bytes) to path, now or at the end of the current batch"""
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        path = Path(path)
+        self.pending[path] = content
+        if self.depth == 0:
+            self.flush()
+
+    def write_json(self, path, data, **kwargs):
+        self.write(path, json.dumps(data, **kwargs))
+
+    @contextmanager
+    def batch(self):
+        """Collect all writes until the end of the block"""
+        self.depth += 1
+        try:
+            yield self
+        finally:
+            self.depth -= 1
+            if self.depth == 0:
+                self.flush()
+
+    def flush(self):
+        pending = self.pending
+        self.pending = {}
+        for path, content in pending.items():
+            digest = self.digest(content)
+            signature = self.signature(path)
+            known = self.digests.get(path)
+            if known is None or known[1] != signature:
+                # First write of this file in this process or changed by someone else: compare with what is on disk
+                known = None
+                if signature is not None:
+                    try:
+                        known = (self.digest(path.read_bytes()), signature)
+                    except OSError:
+                        pass
+            if known is not None and known[0] == digest:
+                self.digests[path] = known
+                self.skipped += 1
+                continue
+            tmp = path.with_name(f'.{path.name}.tmp')
+            try:
+                with open(tmp, "wb") as f:
+                    f.write(content)
+                os.replace(tmp, path)
+                self.digests[path] = (digest, self.signature(path))
+                self.written += 1
+            except OSError as e:
+                print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: Can not write {path}: {e}')
+                self.digests.pop(path, None)
+                try:
+                    tmp.unlink()
+                except OSError:
+                    pass
+
+coalescer = WriteCoalescer()
@@ -296,24 +296,44 @@ with tabs[3]:
     with col3:
         export_timeframe = st.selectbox("Таймфрейм:", ["1m", "5m", "15m", "30m", "1h", "4h", "1d"], key="export_timeframe")
     
-    col1, col2 = st.columns(2)
+    col1, col2, col3 = st.columns(3)
     with col1:
-        export_days = st.number_input("Количество дней:", min_value=1, max_value=365, value=30)
+        export_days = st.number_input("Количество дней:", min_value=1, max_value=3650, value=30)
     with col2:
+        export_format = st.selectbox("Формат:", ["csv", "parquet"], key="export_format")
+    with col3:
         export_filename = st.text_input("Имя файла (оставьте пустым для автоматического):", "")
     
-    if st.button("Экспортировать в CSV", type="primary", key="export_csv_btn"):
+    if st.button("Экспортировать", type="primary", key="export_csv_btn"):
         with st.spinner("Экспорт данных..."):
             try:
                 filename = None if not export_filename else export_filename
-                filepath = mdm.export_data_to_csv(
-                    export_exchange, export_symbol, export_timeframe, export_days, filename)
+                filepath = mdm.export_data(
+                    export_exchange, export_symbol, export_timeframe, export_days, filename, export_format)
                 
+                stats = mdm.last_export_stats
                 st.success(f"Данные успешно экспортированы в: {filepath}")
+                st.info(f"Строк: {stats['rows']}, время: {stats['seconds']:.2f}s, скорость: {stats['rows_per_sec']:.0f} строк/с")
                 
-                # Загрузка и отображение данных
+                # Загрузка и отображение последних данных
                 try:
-                    df = pd.read_csv(filepath)
+                    # Читаем только последние 5000 строк, а не весь экспорт
+                    tail = 5000
+                    if export_format == "csv":
+                        df = pd.read_csv(filepath, skiprows=range(1, max(stats['rows'] - tail, 0) + 1))
+                    else:
+                        import pyarrow as pa
+                        import pyarrow.parquet as pq
+                        parquet_file = pq.ParquetFile(filepath)
+                        tables = []
+                        tail_rows = 0
+                        for group in reversed(range(parquet_file.num_row_groups)):
+                            tables.insert(0, parquet_file.read_row_group(group))
+                            tail_rows += tables[0].num_rows
+                            if tail_rows >= tail:
+                                break
+                        df = pa.concat_tables(tables).to_pandas() if tables else pd.DataFrame()
+                    df = df.tail(tail)
                     st.dataframe(df, use_container_width=True)
                     
                     # Создание графика
@@ -334,13 +354,14 @@ with tabs[3]:
                     
                     st.plotly_chart(fig, use_container_width=True)
                     
-                    # Добавляем кнопку для скачивания CSV
-                    st.download_button(
-                        label="Скачать CSV файл",
-                        data=open(filepath, 'rb').read(),
-                        file_name=os.path.basename(filepath),
-                        mime="text/csv",
-                    )
+                    # Добавляем кнопку для скачивания файла
+                    with open(filepath, 'rb') as f:
+                        st.download_button(
+                            label="Скачать файл",
+                            data=f,
+                            file_name=os.path.basename(filepath),
+                            mime="text/csv" if export_format == "csv" else "application/octet-stream",
+                        )
                 except Exception as e:
                     st.error(f"Ошибка при отображении данных: {str(e)}")
             except Exception as e:
@@ -369,6 +390,24 @@ if st.sidebar.button("Обновить все рыночные данные"):
             st.sidebar.write("Обновление завершено")
         except Exception as e:
             st.sidebar.error(f"Ошибка: {str(e)}")
+
+# Обслуживание базы по политике хранения ([market_data] в pbgui.ini)
+if st.sidebar.button("Очистить и сжать базу данных"):
+    with st.sidebar.status("Обслуживание базы..."):
+        try:
+            stats = mdm.apply_retention()
+            st.sidebar.write(stats)
+        except Exception as e:
+            st.sidebar.error(f"Ошибка: {str(e)}")
+
+# Перевод старой базы в режим инкрементального сжатия: полный VACUUM, только вручную
+if st.sidebar.button("Перевести базу в инкрементальное сжатие", help="Полный VACUUM: база переписывается целиком, блокируется на время выполнения и временно требует вдвое больше места на диске"):
+    with st.sidebar.status("Перевод базы..."):
+        try:
+            stats = mdm.convert_database()
+            st.sidebar.write(stats)
+        except Exception as e:
+            st.sidebar.error(f"Ошибка: {str(e)}")
             
 # Добавим информацию о модуле
 st.sidebar.divider()
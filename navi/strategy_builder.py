@@ -5,9 +5,12 @@ import plotly.graph_objects as go
 import plotly.express as px
 import json
 import os
+import time
 from datetime import datetime, timedelta
 from MarketDataManager import MarketDataManager
 from StrategyManager import StrategyManager, Strategy
+from StrategySweep import ParameterSweep
+from WalkForward import WalkForward
 from pbgui_purefunc import save_ini, load_ini
 
 # Инициализация менеджеров
@@ -57,9 +60,14 @@ def create_new_strategy():
 
 # Боковая панель с выбором стратегии
 with st.sidebar:
-    # Список стратегий
-    strategies = sm.list_strategies()
-    strategy_options = {s.id: f"{s.name} ({s.author})" for s in strategies}
+    # Список стратегий: только метаданные, постранично
+    strategy_search = st.text_input("Поиск стратегии:", key="strategy_search")
+    strategy_count = sm.count_strategies(strategy_search)
+    page_size = 50
+    pages = max(1, (strategy_count + page_size - 1) // page_size)
+    page = st.number_input(f"Страница (из {pages}):", min_value=1, max_value=pages, value=1, key="strategy_page") if pages > 1 else 1
+    strategies = sm.list_strategies(strategy_search, (page - 1) * page_size, page_size)
+    strategy_options = {s["id"]: f"{s['name']} ({s['author']})" for s in strategies}
     
     if strategy_options:
         st.selectbox(
@@ -98,6 +106,7 @@ default_code = """# Стратегия бота
 # params - словарь с параметрами стратегии
 # Доступные функции:
 # log(message) - Запись сообщения в лог
+# indicator(exchange, symbol, timeframe, name, **params) - Индикатор talib из кэша, например indicator(exchange, symbol, timeframe, "RSI", timeperiod=14)
 # add_signal(exchange, symbol, side, price, amount, reason, timeframe) - Добавить торговый сигнал
 
 # Пример: Простая стратегия пересечения скользящих средних
@@ -150,6 +159,30 @@ for exchange in params["exchanges"]:
                     )
 """
 
+# Векторный шаблон: сигналы считаются сразу по всему DataFrame
+default_vector_code = """# Векторная стратегия
+# vector_signals(df, market) вызывается один раз для каждой серии данных и возвращает
+# колонки на весь DataFrame:
+#   {"entries": bool, "exits": bool, "size": float (необязательно)} - вход/выход из позиции
+#   или колонку float - целевой размер позиции на каждой свече
+# market - словарь с ключами exchange, symbol, timeframe
+# Размер позиции для entries/exits по умолчанию берется из params["position_size"]
+
+def vector_signals(df, market):
+    sma_fast = df['close'].rolling(window=params["fast_period"]).mean()
+    sma_slow = df['close'].rolling(window=params["slow_period"]).mean()
+    above = sma_fast > sma_slow
+    return {
+        "entries": above & ~above.shift(1, fill_value=False),
+        "exits": ~above & above.shift(1, fill_value=False)
+    }
+"""
+
+code_templates = {
+    "Скрипт (сигналы через add_signal)": default_code,
+    "Векторная (колонки сигналов)": default_vector_code
+}
+
 # Вкладка редактора
 with tabs[0]:
     if current_strategy:
@@ -159,10 +192,15 @@ with tabs[0]:
         with col2:
             save_btn = st.button("Сохранить изменения", type="primary", use_container_width=True)
         
+        # Шаблон для новой стратегии
+        template = default_code
+        if not current_strategy.code:
+            template = code_templates[st.selectbox("Шаблон кода:", list(code_templates.keys()), key="code_template")]
+        
         # Редактор кода
         code = st.text_area(
             "Код стратегии:",
-            value=current_strategy.code if current_strategy.code else default_code,
+            value=current_strategy.code if current_strategy.code else template,
             height=st.session_state.editor_height,
             key="strategy_code",
             on_change=on_code_change
@@ -198,10 +236,10 @@ with tabs[1]:
                 # Получаем символы для выбранных бирж
                 all_symbols = []
                 for exchange_name in selected_exchanges:
-                    if exchange_name in mdm.exchanges:
-                        exchange = mdm.exchanges[exchange_name]
+                    exchange = mdm.exchanges.get(exchange_name)
+                    if exchange is not None:
                         try:
-                            exchange.load_market()
+                            mdm.get_markets(exchange_name)
                             symbols = [s for s in exchange.swap]
                             all_symbols.extend(symbols)
                         except:
@@ -321,6 +359,12 @@ with tabs[2]:
                 step=1000.0
             )
         
+        col1, col2 = st.columns(2)
+        with col1:
+            fee_pct = st.number_input("Комиссия (%):", min_value=0.0, max_value=5.0, value=0.1, step=0.01, format="%.3f")
+        with col2:
+            slippage_pct = st.number_input("Проскальзывание (%):", min_value=0.0, max_value=5.0, value=0.05, step=0.01, format="%.3f")
+        
         # Параметры для переопределения
         with st.expander("Переопределить параметры для теста"):
             # Создаем копию текущих параметров
@@ -334,30 +378,169 @@ with tabs[2]:
         
         # Кнопка запуска бэктеста
         if st.button("Запустить бэктест", type="primary", key="run_backtest_btn"):
-            with st.spinner("Выполняется бэктест..."):
+            with st.spinner("Загрузка данных..."):
                 # Форматируем даты
                 start_date_str = start_date.strftime("%Y-%m-%d")
                 end_date_str = end_date.strftime("%Y-%m-%d")
                 
-                # Запускаем бэктест
-                backtest_result = sm.backtest_strategy(
+                # Бэктест выполняется в отдельном процессе, GUI не блокируется
+                job = sm.submit_backtest(
                     current_strategy,
                     start_date_str,
                     end_date_str,
                     initial_balance,
-                    override_params
+                    override_params,
+                    fee_pct,
+                    slippage_pct
                 )
-                
-                # Сохраняем результаты в сессию
-                st.session_state.backtest_result = backtest_result
-                
-                # Переходим на вкладку результатов
+                st.session_state.backtest_job_id = job.id
+                st.session_state.backtest_job_logs = []
+        
+        job = sm.runner.get(st.session_state.get("backtest_job_id", ""))
+        if job:
+            if st.button("Отменить бэктест", key="cancel_backtest_btn"):
+                job.cancel()
+            status = st.empty()
+            log_area = st.empty()
+            logs = st.session_state.backtest_job_logs
+            # События забираются без ожидания; пока задача выполняется, страница
+            # перезапускается раз в секунду и не блокирует GUI
+            for kind, value in job.stream(timeout=0):
+                if kind == "log":
+                    logs.append(value)
+            if logs:
+                log_area.code("\n".join(logs[-20:]))
+            if not job.done():
+                status.info("Выполняется бэктест...")
+                time.sleep(1)
                 st.rerun()
+            st.session_state.backtest_job_id = None
+            if job.status == "done":
+                # Сохраняем результаты в хранилище и в сессию, переходим на вкладку результатов
+                sm.save_backtest_result(current_strategy.id, job.result, start_date.strftime("%Y-%m-%d"),
+                                        end_date.strftime("%Y-%m-%d"), override_params)
+                st.session_state.backtest_result = job.result
+                st.rerun()
+            elif job.status == "cancelled":
+                status.warning("Бэктест отменен")
+            else:
+                status.error(f"Ошибка бэктеста: {job.error}")
+        
+        # Перебор параметров на всех ядрах
+        with st.expander("Перебор параметров"):
+            ranges_text = st.text_area(
+                "Диапазоны параметров (JSON: список значений или [min, max, step]):",
+                value=json.dumps({k: [v, v * 3, v] for k, v in current_strategy.parameters.items()
+                                  if isinstance(v, int) and not isinstance(v, bool) and v > 0}),
+                key="sweep_ranges"
+            )
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                sweep_mode = st.selectbox("Режим:", ["grid", "random"], key="sweep_mode")
+            with col2:
+                sweep_samples = st.number_input("Комбинаций (random):", min_value=1, value=50, key="sweep_samples")
+            with col3:
+                sweep_abandon = st.number_input("Прервать при просадке (%):", min_value=0.0, max_value=100.0, value=50.0, key="sweep_abandon")
+            if st.button("Запустить перебор", key="run_sweep_btn"):
+                try:
+                    ranges = json.loads(ranges_text)
+                except Exception as e:
+                    st.error(f"Ошибка в диапазонах: {str(e)}")
+                    ranges = None
+                if ranges:
+                    sweep = ParameterSweep(
+                        sm, current_strategy, ranges,
+                        start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"),
+                        initial_balance, sweep_mode, int(sweep_samples),
+                        abandon_drawdown_pct=sweep_abandon if sweep_abandon > 0 else None,
+                        fee_pct=fee_pct, slippage_pct=slippage_pct
+                    )
+                    # Любое действие в GUI (в том числе кнопка остановки) перезапускает скрипт;
+                    # heartbeat обращается к Streamlit, перебор прерывается и процессы завершаются
+                    st.button("Остановить перебор", key="stop_sweep_btn")
+                    progress = st.progress(0.0)
+                    table = st.empty()
+                    total = len(sweep.combinations()) if sweep_mode == "grid" else int(sweep_samples)
+                    completed = [0]
+                    heartbeat = lambda: progress.progress(min(completed[0] / total, 1.0))
+                    for done, _ in enumerate(sweep.run(heartbeat), start=1):
+                        completed[0] = done
+                        progress.progress(min(done / total, 1.0))
+                        table.dataframe(pd.DataFrame([
+                            {**r["params"], **{k: v for k, v in r["metrics"].items() if k != "attribution"},
+                             "abandoned": r["abandoned"], "error": r["error"]}
+                            for r in sweep.results[:50]
+                        ]), use_container_width=True)
+                    st.caption(f"Комбинаций: {sweep.stats['combinations']}, прервано: {sweep.stats['abandoned']}, время: {sweep.stats['seconds']:.1f}s")
+        
+        # Walk-forward: подбор на train, проверка на test по скользящим окнам
+        with st.expander("Walk-forward анализ"):
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                wf_train = st.number_input("Train (дней):", min_value=1, value=60, key="wf_train")
+            with col2:
+                wf_test = st.number_input("Test (дней):", min_value=1, value=14, key="wf_test")
+            with col3:
+                wf_step = st.number_input("Шаг (дней):", min_value=1, value=14, key="wf_step")
+            with col4:
+                wf_anchored = st.checkbox("Якорный train", key="wf_anchored")
+            wf_ranges_text = st.text_area(
+                "Диапазоны параметров для подбора на train (JSON, пусто - без подбора):",
+                value="", key="wf_ranges"
+            )
+            if st.button("Запустить walk-forward", key="run_wf_btn"):
+                try:
+                    wf_ranges = json.loads(wf_ranges_text) if wf_ranges_text.strip() else {}
+                except Exception as e:
+                    st.error(f"Ошибка в диапазонах: {str(e)}")
+                    wf_ranges = None
+                if wf_ranges is not None:
+                    wf = WalkForward(
+                        sm, current_strategy, start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"),
+                        int(wf_train), int(wf_test), int(wf_step), wf_anchored, wf_ranges,
+                        initial_balance=initial_balance, fee_pct=fee_pct, slippage_pct=slippage_pct
+                    )
+                    total = len(wf.windows())
+                    if total == 0:
+                        st.warning("Период слишком короткий для заданных окон")
+                    else:
+                        st.button("Остановить walk-forward", key="stop_wf_btn")
+                        progress = st.progress(0.0)
+                        table = st.empty()
+                        completed = [0]
+                        heartbeat = lambda: progress.progress(completed[0] / total)
+                        for done, _ in enumerate(wf.run(heartbeat), start=1):
+                            completed[0] = done
+                            progress.progress(done / total)
+                            table.dataframe(pd.DataFrame([{
+                                "test_start": datetime.fromtimestamp(r["test_start"] / 1000).strftime("%Y-%m-%d"),
+                                "test_end": datetime.fromtimestamp(r["test_end"] / 1000).strftime("%Y-%m-%d"),
+                                **r["params"],
+                                "train_return_pct": r["train_metrics"].get("total_return_pct"),
+                                "test_return_pct": r["test_metrics"].get("total_return_pct"),
+                                "test_max_drawdown_pct": r["test_metrics"].get("max_drawdown_pct"),
+                                "error": r["error"]
+                            } for r in wf.results]), use_container_width=True)
+                        st.json(wf.summary())
+                        st.caption(f"Окон: {wf.stats['windows']}, загрузка: {wf.stats['load_seconds']:.2f}s, время: {wf.stats['seconds']:.1f}s")
     else:
         st.info("Выберите стратегию или создайте новую для запуска бэктеста.")
 
 # Вкладка результатов
 with tabs[3]:
+    if current_strategy:
+        # Сохраненные бэктесты: тело результата загружается только при выборе
+        saved_results = sm.list_backtest_results(current_strategy.id)
+        if saved_results:
+            result_options = {r["id"]: f"{datetime.fromtimestamp(r['created_at']).strftime('%Y-%m-%d %H:%M')} "
+                                       f"{r['start_date']} - {r['end_date']}: {r['metrics'].get('total_return_pct', 0):.2f}%"
+                              for r in saved_results}
+            selected_result = st.selectbox("История бэктестов:", [None] + list(result_options.keys()),
+                                           format_func=lambda x: "—" if x is None else result_options[x],
+                                           key="saved_result_selector")
+            if selected_result is not None and st.session_state.get("loaded_result_id") != selected_result:
+                st.session_state.backtest_result = sm.load_backtest_result(selected_result)
+                st.session_state.loaded_result_id = selected_result
     if current_strategy and "backtest_result" in st.session_state:
         st.write(f"### Результаты бэктеста: {current_strategy.name}")
         
@@ -384,6 +567,27 @@ with tabs[3]:
         with metric_cols[2]:
             st.metric("Всего сделок", f"{metrics['total_trades']}")
         
+        metric_cols = st.columns(4)
+        with metric_cols[0]:
+            st.metric("Коэф. Сортино", f"{metrics.get('sortino_ratio', 0):.2f}")
+        with metric_cols[1]:
+            st.metric("Коэф. Калмара", f"{metrics.get('calmar_ratio', 0):.2f}")
+        with metric_cols[2]:
+            st.metric("Время в позиции", f"{metrics.get('exposure_pct', 0):.1f}%")
+        with metric_cols[3]:
+            st.metric("Длит. просадки (дней)", f"{metrics.get('max_drawdown_days', 0):.1f}")
+        
+        if metrics.get("attribution"):
+            st.caption(f"Оборот: {metrics.get('turnover', 0):.2f}x, комиссии: {metrics.get('fees', 0):.2f}")
+            st.dataframe(
+                pd.DataFrame(sorted(metrics["attribution"].items(), key=lambda x: -x[1]), columns=["Пара", "PnL"]),
+                use_container_width=True
+            )
+        
+        stats = result.get("stats", {})
+        if stats:
+            st.caption(f"Свечей: {stats.get('bars', 0)}, загрузка: {stats.get('load_seconds', 0):.2f}s, выполнение: {stats.get('run_seconds', 0):.2f}s, комиссии: {stats.get('fees', 0):.2f}")
+        
         # График кривой капитала
         if result["portfolio"]["equity_curve"]:
             equity_curve = pd.DataFrame(result["portfolio"]["equity_curve"])
@@ -0,0 +1,77 @@
+import threading
+
+from MarketDataManager import TickerCache
+
+
+def run_in_thread(target):
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault("value", target()))
+    thread.start()
+    return thread, result
+
+
+def test_forced_load_does_not_join_cached_flight():
+    cache = TickerCache()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def cached_loader():
+        calls.append("cached")
+        started.set()
+        release.wait(5)
+        return {"last": 1}
+
+    def forced_loader():
+        calls.append("forced")
+        return {"last": 2}
+
+    cached, cached_result = run_in_thread(lambda: cache.get_or_load("BTC", cached_loader))
+    assert started.wait(5)
+    forced, forced_result = run_in_thread(lambda: cache.get_or_load("BTC", forced_loader, use_cache=False))
+    forced.join(5)
+    release.set()
+    cached.join(5)
+
+    assert forced_result["value"] == {"last": 2}
+    assert cached_result["value"] == {"last": 1}
+    assert calls == ["cached", "forced"]
+
+
+class JoinedEvent(threading.Event):
+    """Event полета, который сообщает, что второй запрос начал его ждать"""
+
+    def __init__(self, joined):
+        super().__init__()
+        self.joined = joined
+
+    def wait(self, timeout=None):
+        self.joined.set()
+        return super().wait(timeout)
+
+
+def test_unforced_loads_share_one_flight():
+    cache = TickerCache()
+    started = threading.Event()
+    release = threading.Event()
+    joined = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append("load")
+        started.set()
+        release.wait(5)
+        return {"last": 1}
+
+    first, first_result = run_in_thread(lambda: cache.get_or_load("BTC", loader))
+    assert started.wait(5)
+    cache._inflight[("BTC", True)].event = JoinedEvent(joined)
+    second, second_result = run_in_thread(lambda: cache.get_or_load("BTC", loader))
+    # Отпускаем загрузку только после того, как второй запрос присоединился к полету
+    assert joined.wait(5)
+    release.set()
+    first.join(5)
+    second.join(5)
+
+    assert first_result["value"] == second_result["value"] == {"last": 1}
+    assert calls == ["load"]